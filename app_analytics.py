@@ -0,0 +1,194 @@
+"""Аналитика по сводкам: сдвиг просрочки и свёртки на клиенте (нагрузка, просрочка, ФОТ)."""
+from dataclasses import dataclass
+from typing import List, Dict, Any, Sequence
+from datetime import date, datetime
+from array import array
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен: без него сортировка в памяти просто медленнее
+    np = None
+
+# ===== SQLAlchemy =====
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app_base import log_event
+from app_models import ColumnStore, fetch_rows, format_bool, format_money
+from app_schema import TASK_STATUSES
+
+
+# -------------------------------
+# Сводки для аналитики: просрочка и свёртки на клиенте
+# -------------------------------
+def advance_overdue(engine: Engine) -> int:
+    """Пакетное задание: задачи, чей срок прошёл с прошлого запуска, добавляются к просроченным.
+
+    Читает только задачи со сроком в [прошлая дата, сегодня) по индексу (status, deadline),
+    заодно убирает обнулившиеся пары project_staff. Возвращает число новых просроченных задач.
+    """
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        as_of = conn.execute(text("SELECT overdue_as_of FROM analytics_state WHERE id = 1 FOR UPDATE")).scalar()
+        today = conn.execute(text("SELECT current_date")).scalar()
+        if as_of is None or as_of >= today:
+            return 0
+        params = {"old": as_of, "new": today, "statuses": list(TASK_STATUSES[:-1])}
+        became = conn.execute(text(
+            "CREATE TEMP TABLE overdue_delta ON COMMIT DROP AS "
+            "SELECT task_id, employee_id FROM task "
+            "WHERE status = ANY(:statuses) AND deadline >= :old AND deadline < :new"), params).rowcount
+        conn.exec_driver_sql(
+            "UPDATE employee_summary s SET overdue_tasks = s.overdue_tasks + d.n "
+            "FROM (SELECT employee_id, count(*) AS n FROM overdue_delta GROUP BY employee_id) AS d "
+            "WHERE s.employee_id = d.employee_id")
+        conn.exec_driver_sql(
+            "UPDATE project_summary s SET overdue_tasks = s.overdue_tasks + d.n "
+            "FROM (SELECT l.project_id, count(*) AS n FROM overdue_delta o "
+            "      JOIN project_task l ON l.task_id = o.task_id GROUP BY l.project_id) AS d "
+            "WHERE s.project_id = d.project_id")
+        conn.exec_driver_sql("DELETE FROM project_staff WHERE open_tasks = 0")
+        conn.execute(text("UPDATE analytics_state SET overdue_as_of = :new WHERE id = 1"), params)
+    log_event(f"Просрочка пересчитана на {today}", op="advance_overdue", rows=became,
+              elapsed=time.perf_counter() - started)
+    return became
+
+
+class AnalyticsCube:
+    """Строки сводки по столбцам; свёртка по измерению — np.bincount по кодам значений.
+
+    Коды измерения считаются один раз (np.unique), поэтому смена группировки — только bincount.
+    Без numpy то же делается словарём.
+    """
+    def __init__(self, store: ColumnStore, names: Sequence[str]):
+        self.columns = dict(zip(names, store.columns))
+        self.length = len(store)
+        self._codes: Dict[str, tuple] = {}
+
+    def codes(self, dim: str) -> tuple:
+        """(значения измерения, код каждой строки)."""
+        cached = self._codes.get(dim)
+        if cached is None:
+            values = ["" if v is None else v for v in self.columns[dim]]
+            if np is not None:
+                labels, codes = np.unique(np.asarray(values), return_inverse=True)
+                cached = (labels.tolist(), codes.reshape(-1))
+            else:
+                index: Dict[Any, int] = {}
+                codes = [index.setdefault(v, len(index)) for v in values]
+                cached = (list(index), codes)
+            self._codes[dim] = cached
+        return cached
+
+    def measure(self, name: str):
+        col = self.columns[name]
+        if np is not None:
+            return np.frombuffer(col, dtype=np.int64) if isinstance(col, array) else np.asarray(col, dtype=np.int64)
+        return col
+
+    def rollup(self, dim: str, measures: Sequence[str]) -> List[tuple]:
+        """[(значение измерения, сумма measure, ...), ...]"""
+        labels, codes = self.codes(dim)
+        sums = [_bincount(codes, self.measure(m), len(labels)) for m in measures]
+        return list(zip(labels, *sums))
+
+
+def _bincount(codes, weights, length: int) -> list:
+    if np is not None:
+        return np.bincount(codes, weights=weights, minlength=length).astype(np.int64).tolist()
+    sums = [0] * length
+    for code, w in zip(codes, weights):
+        sums[code] += w
+    return sums
+
+
+@dataclass
+class AnalyticsSnapshot:
+    employees: AnalyticsCube  # строка — сотрудник: измерения employee, duty; меры salary и счётчики задач
+    projects: AnalyticsCube  # строка — проект: измерения project, customer, finished; меры prize и счётчики
+    staff: ColumnStore  # пары (project_id, employee_id) с открытыми задачами
+    as_of: date
+    loaded_at: datetime
+
+
+EMPLOYEE_CUBE_COLUMNS = ("employee_id", "employee", "duty", "salary", "open_tasks", "overdue_tasks", "done_tasks")
+
+
+PROJECT_CUBE_COLUMNS = ("project_id", "project", "customer", "finished", "prize",
+                        "open_tasks", "overdue_tasks", "done_tasks")
+
+
+def load_analytics(engine: Engine) -> AnalyticsSnapshot:
+    """Читает сводки вместе с небольшими таблицами измерений (employee, project); task не сканируется."""
+    advance_overdue(engine)
+    counts = ", ".join(f"coalesce(s.{c}, 0)" for c in ("open_tasks", "overdue_tasks", "done_tasks"))
+    with engine.connect() as conn:
+        employees = fetch_rows(conn.execute(text(
+            f"SELECT e.employee_id, e.full_name || ' #' || e.employee_id, e.duty, e.salary, {counts} "
+            f"FROM employee e LEFT JOIN employee_summary s ON s.employee_id = e.employee_id "
+            f"ORDER BY e.employee_id")), ["q", None, None, "q", "q", "q", "q"], "employee_summary")
+        projects = fetch_rows(conn.execute(text(
+            f"SELECT p.project_id, p.name || ' #' || p.project_id, p.customer, p.finished, p.prize, {counts} "
+            f"FROM project p LEFT JOIN project_summary s ON s.project_id = p.project_id "
+            f"ORDER BY p.project_id")), ["q", None, None, None, "q", "q", "q", "q"], "project_summary")
+        staff = fetch_rows(conn.execute(text(
+            "SELECT project_id, employee_id FROM project_staff WHERE open_tasks > 0")), ["q", "q"], "project_staff")
+        as_of = conn.execute(text("SELECT overdue_as_of FROM analytics_state WHERE id = 1")).scalar()
+    return AnalyticsSnapshot(AnalyticsCube(employees, EMPLOYEE_CUBE_COLUMNS),
+                             AnalyticsCube(projects, PROJECT_CUBE_COLUMNS), staff, as_of, datetime.now())
+
+
+def payroll_rollup(snapshot: AnalyticsSnapshot, dim: str) -> List[tuple]:
+    """[(проект или заказчик, сумма призов, ФОТ, сотрудников), ...]
+
+    ФОТ — зарплаты сотрудников с открытыми задачами в группе; сотрудник в группе считается один раз.
+    """
+    projects, employees = snapshot.projects, snapshot.employees
+    labels, group_codes = projects.codes(dim)
+    prize = _bincount(group_codes, projects.measure("prize"), len(labels))
+    staff_projects, staff_employees = snapshot.staff.columns
+    if np is not None:
+        project_ids = np.frombuffer(projects.columns["project_id"], dtype=np.int64)
+        employee_ids = np.frombuffer(employees.columns["employee_id"], dtype=np.int64)
+        groups = group_codes[np.searchsorted(project_ids, np.frombuffer(staff_projects, dtype=np.int64))]
+        people = np.searchsorted(employee_ids, np.frombuffer(staff_employees, dtype=np.int64))
+        pairs = np.unique(groups * max(len(employee_ids), 1) + people)  # (группа, сотрудник) без повторов
+        groups, people = np.divmod(pairs, max(len(employee_ids), 1))
+        payroll = _bincount(groups, employees.measure("salary")[people], len(labels))
+        headcount = _bincount(groups, np.ones(len(groups), dtype=np.int64), len(labels))
+    else:
+        project_row = {pid: i for i, pid in enumerate(projects.columns["project_id"])}
+        salary = dict(zip(employees.columns["employee_id"], employees.columns["salary"]))
+        pairs = {(group_codes[project_row[p]], e) for p, e in zip(staff_projects, staff_employees)}
+        payroll, headcount = [0] * len(labels), [0] * len(labels)
+        for group, employee_id in pairs:
+            payroll[group] += salary[employee_id]
+            headcount[group] += 1
+    return list(zip(labels, prize, payroll, headcount))
+
+
+# (название, куб, измерения {столбец: подпись}, меры [(столбец, подпись)]); payroll считается payroll_rollup
+ANALYTICS_REPORTS = {
+    "workload": ("Открытые задачи по сотрудникам", "employees", {"employee": "Сотрудник", "duty": "Должность"},
+                 [("open_tasks", "Открытые"), ("overdue_tasks", "Просроченные"), ("done_tasks", "Завершённые")]),
+    "overdue": ("Просроченные задачи по проектам", "projects",
+                {"project": "Проект", "customer": "Заказчик", "finished": "Проект завершён"},
+                [("overdue_tasks", "Просроченные"), ("open_tasks", "Открытые"), ("done_tasks", "Завершённые")]),
+    "payroll": ("ФОТ и призы по заказчикам", "projects", {"customer": "Заказчик", "project": "Проект"},
+                [("prize", "Призы"), ("payroll", "ФОТ"), ("employees", "Сотрудников")]),
+}
+
+
+def analytics_report(snapshot: AnalyticsSnapshot, report: str, dim: str) -> tuple:
+    """(заголовки, форматтеры, строки по убыванию первой меры) отчёта ANALYTICS_REPORTS."""
+    title, cube, dims, measures = ANALYTICS_REPORTS[report]
+    if report == "payroll":
+        rows = payroll_rollup(snapshot, dim)
+    else:
+        rows = getattr(snapshot, cube).rollup(dim, [m for m, _ in measures])
+    rows.sort(key=lambda r: r[1], reverse=True)
+    money = {"prize", "payroll"}
+    formatters = [format_bool if dim == "finished" else (lambda v: str(v) if v != "" else "(не указан)")]
+    formatters += [format_money if m in money else str for m, _ in measures]
+    return [dims[dim]] + [label for _, label in measures], formatters, rows
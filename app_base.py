@@ -0,0 +1,302 @@
+"""Основа приложения без SQLAlchemy: журнал, параметры подключения, фоновое выполнение запросов.
+
+Нужна окну с первого кадра, поэтому здесь только стандартная библиотека и QtCore.
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Optional, Dict, Any
+
+from PySide6.QtCore import QObject, Signal, QRunnable, QThreadPool
+
+# -------------------------------
+# Журнал (log.txt)
+# -------------------------------
+@dataclass
+class LogConfig:
+    path: str = "log.txt"
+    max_bytes: int = 5 * 1024 * 1024  # ротация по размеру
+    rotate_when: Optional[str] = None  # ротация по времени вместо размера, например "midnight"
+    backup_count: int = 5
+    json_lines: bool = False
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{datetime.fromtimestamp(record.created)}: {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " [" + " ".join(f"{k}={v}" for k, v in fields.items()) + "]"
+        return line
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname.lower(),
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_log = logging.getLogger("outsource")
+_log.propagate = False
+_log_listener: Optional[QueueListener] = None
+_log_lock = threading.Lock()
+
+
+def setup_logging(cfg: Optional[LogConfig] = None):
+    """Запускает фоновую запись журнала: log_event() только кладёт запись в очередь."""
+    global _log_listener
+    cfg = cfg or LogConfig()
+    if cfg.rotate_when:
+        handler = TimedRotatingFileHandler(cfg.path, when=cfg.rotate_when, backupCount=cfg.backup_count,
+                                           encoding="utf-8")
+    else:
+        handler = RotatingFileHandler(cfg.path, maxBytes=cfg.max_bytes, backupCount=cfg.backup_count,
+                                      encoding="utf-8")
+    handler.setFormatter(_JsonFormatter() if cfg.json_lines else _TextFormatter())
+    records = queue.SimpleQueue()
+    with _log_lock:
+        _stop_listener()
+        _log.handlers[:] = [QueueHandler(records)]
+        _log.setLevel(logging.INFO)
+        _log_listener = QueueListener(records, handler)
+        _log_listener.start()
+
+
+def _stop_listener():
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()  # дописывает очередь до конца
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+        _log.handlers.clear()
+
+
+def flush_logging():
+    """Дописывает накопленные записи в файл (поток записи перезапускается)."""
+    with _log_lock:
+        if _log_listener is not None:
+            _log_listener.stop()
+            for handler in _log_listener.handlers:
+                handler.flush()
+            _log_listener.start()
+
+
+def shutdown_logging():
+    with _log_lock:
+        _stop_listener()
+
+
+atexit.register(shutdown_logging)
+
+
+def log_event(message: str, level: int = logging.INFO, **fields):
+    """Запись журнала из любого потока; fields — op, table, rows, elapsed (None не пишутся)."""
+    if _log_listener is None:
+        setup_logging()
+    if isinstance(fields.get("elapsed"), float):
+        fields["elapsed"] = round(fields["elapsed"], 3)
+    _log.log(level, message, extra={"fields": {k: v for k, v in fields.items() if v is not None}})
+# -------------------------------
+# Конфигурация подключения
+# -------------------------------
+WRITE_DRIVERS = ("psycopg2", "psycopg")  # psycopg — psycopg 3, пакетная запись в режиме конвейера (pipeline)
+
+
+@dataclass
+class PgConfig:
+    host: str = "localhost"
+    port: int = 5432
+    dbname: str = "outsource"
+    user: str = "postgres"
+    password: str = "root"
+    sslmode: str = "prefer"
+    connect_timeout: int = 5
+    pool_size: int = 5  # соединений, которые пул держит открытыми
+    max_overflow: int = 10  # сверх pool_size в пике; закрываются при возврате в пул
+    pool_timeout: int = 30  # с ожидания свободного соединения
+    pool_recycle: int = 1800  # с; более старое соединение переоткрывается при выдаче из пула
+    pool_prewarm: int = 2  # соединений, открываемых сразу при подключении
+    liveness_idle: int = 30  # с простоя в пуле, после которых соединение проверяется SELECT 1; 0 — при каждой выдаче
+    statement_timeout_ms: int = 0  # statement_timeout сервера; 0 — без ограничения
+    write_driver: str = "psycopg2"  # драйвер WriteRepository, см. WRITE_DRIVERS
+    snapshot_mb: int = 0  # предел локального снимка SQLite для окна данных (app_models.SnapshotStore); 0 — без снимка
+
+
+CLI_COMMANDS = ("export", "import", "refresh-views", "serve")  # app_cli.run_cli; main() узнаёт их без загрузки SQLAlchemy
+
+
+# -------------------------------
+# Фоновое выполнение запросов
+# -------------------------------
+class QueryCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """Позволяет прервать запрос, выполняющийся в фоновом потоке (connection.cancel() драйвера)."""
+    def __init__(self):
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._dbapi_conn = None
+
+    @contextmanager
+    def bind(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelled()
+            self._dbapi_conn = conn.connection.dbapi_connection
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._dbapi_conn = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._dbapi_conn is not None and hasattr(self._dbapi_conn, "cancel"):
+                try:
+                    self._dbapi_conn.cancel()
+                except Exception:
+                    pass
+
+
+class _JobSignals(QObject):
+    finished = Signal(int, object)
+    failed = Signal(int, object)
+
+
+class _DbJob(QRunnable):
+    def __init__(self, job_id: int, fn, token: CancelToken, signals: _JobSignals):
+        super().__init__()
+        self.job_id = job_id
+        self.fn = fn
+        self.token = token
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = self.fn(self.token)
+        except Exception as e:
+            signal, payload = self.signals.failed, e
+        else:
+            signal, payload = self.signals.finished, result
+        try:
+            signal.emit(self.job_id, payload)
+        except RuntimeError:
+            pass  # получатель уже удалён (окно закрыто)
+
+
+class DbWorker(QObject):
+    """Пул потоков для запросов к БД: fn(token) выполняется в фоне, колбэки вызываются в GUI-потоке.
+
+    Новая задача с тем же key отменяет предыдущую: её результат отбрасывается,
+    а выполняющийся запрос прерывается на сервере.
+    """
+    busyChanged = Signal(bool)
+
+    def __init__(self, parent=None, pool: Optional[QThreadPool] = None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self._signals = _JobSignals(self)
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        self._jobs: Dict[int, tuple] = {}  # job_id -> (on_done, on_error, key, token)
+        self._active: Dict[Any, int] = {}  # key -> job_id
+        self._next_id = 0
+
+    def submit(self, fn, on_done=None, on_error=None, key=None) -> CancelToken:
+        if key is not None:
+            self.cancel(key)
+        self._next_id += 1
+        job_id = self._next_id
+        token = CancelToken()
+        self._jobs[job_id] = (on_done, on_error, key, token)
+        if key is not None:
+            self._active[key] = job_id
+        if len(self._jobs) == 1:
+            self.busyChanged.emit(True)
+        self.pool.start(_DbJob(job_id, fn, token, self._signals))
+        return token
+
+    def cancel(self, key):
+        job_id = self._active.pop(key, None)
+        if job_id is not None:
+            self._pop(job_id)[3].cancel()
+
+    def cancel_all(self):
+        for job_id in list(self._jobs):
+            self._pop(job_id)[3].cancel()
+        self._active.clear()
+
+    def is_busy(self) -> bool:
+        return bool(self._jobs)
+
+    def wait(self, msecs: int = -1) -> bool:
+        return self.pool.waitForDone(msecs)
+
+    def _pop(self, job_id: int):
+        entry = self._jobs.pop(job_id)
+        if not self._jobs:
+            self.busyChanged.emit(False)
+        return entry
+
+    def _take(self, job_id: int):
+        if job_id not in self._jobs:
+            return None  # задача была отменена более новой
+        entry = self._pop(job_id)
+        if entry[2] is not None and self._active.get(entry[2]) == job_id:
+            del self._active[entry[2]]
+        return entry
+
+    def _on_finished(self, job_id: int, result):
+        entry = self._take(job_id)
+        if entry is not None and entry[0] is not None:
+            entry[0](result)
+
+    def _on_failed(self, job_id: int, error):
+        entry = self._take(job_id)
+        if entry is None:
+            return
+        if entry[1] is not None:
+            entry[1](error)
+        else:
+            log_event(f"Ошибка фонового запроса: {error}", logging.ERROR)
+
+
+class ProgressRelay(QObject):
+    """Передаёт прогресс фоновой задачи в GUI-поток: сигнал доставляется через очередь событий."""
+    progressed = Signal(int)
+
+
+class RowsRelay(QObject):
+    """Порции строк из фоновой задачи в GUI-поток: (номер запроса, список строк)."""
+    rows = Signal(int, object)
+
+
+def run_db_job(worker: Optional[DbWorker], fn, on_done=None, on_error=None, key=None):
+    """Запускает fn(token) через worker, а без него — синхронно в текущем потоке."""
+    if worker is not None:
+        return worker.submit(fn, on_done, on_error, key)
+    try:
+        result = fn(CancelToken())
+    except Exception as e:
+        if on_error is None:
+            raise
+        on_error(e)
+        return None
+    if on_done is not None:
+        on_done(result)
+    return None
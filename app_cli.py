@@ -0,0 +1,116 @@
+"""Командная строка без окон: export, import, refresh-views и serve (служба — app_service).
+
+Команды перечислены в app_base.CLI_COMMANDS; main() передаёт их в run_cli.
+"""
+import sys
+import os
+import argparse
+from typing import Optional, List
+
+# ===== SQLAlchemy =====
+from sqlalchemy.exc import SQLAlchemyError
+
+from app_base import LogConfig, setup_logging, PgConfig, WRITE_DRIVERS
+from app_engine import make_engine
+from app_schema import build_metadata
+from app_transfer import EXPORT_FORMATS, export_data, export_sources, import_file
+from app_views import join_views, refresh_due_join_views, refresh_join_view
+
+
+# -------------------------------
+# Командная строка (без окон)
+# -------------------------------
+def connection_arguments(dbname: Optional[str] = None) -> argparse.ArgumentParser:
+    """Общие параметры подключения для командной строки (parents= у argparse)."""
+    defaults = PgConfig()
+    conn = argparse.ArgumentParser(add_help=False)
+    conn.add_argument("--host", default=defaults.host)
+    conn.add_argument("--port", type=int, default=defaults.port)
+    conn.add_argument("--dbname", default=dbname or defaults.dbname)
+    conn.add_argument("--user", default=defaults.user)
+    conn.add_argument("--password", default=os.environ.get("PGPASSWORD", defaults.password))
+    conn.add_argument("--sslmode", default=defaults.sslmode)
+    conn.add_argument("--pool-size", type=int, default=defaults.pool_size)
+    conn.add_argument("--pool-prewarm", type=int, default=defaults.pool_prewarm)
+    conn.add_argument("--liveness-idle", type=int, default=defaults.liveness_idle,
+                      help="с простоя, после которых соединение пула проверяется; 0 — при каждой выдаче")
+    conn.add_argument("--statement-timeout", type=int, default=defaults.statement_timeout_ms,
+                      help="мс; 0 — без ограничения")
+    conn.add_argument("--write-driver", choices=WRITE_DRIVERS, default=defaults.write_driver)
+    conn.add_argument("--log-json", action="store_true", help="писать журнал в формате JSON lines")
+    return conn
+
+
+def config_from_args(args: argparse.Namespace) -> PgConfig:
+    return PgConfig(host=args.host, port=args.port, dbname=args.dbname, user=args.user,
+                    password=args.password, sslmode=args.sslmode, pool_size=args.pool_size,
+                    pool_prewarm=args.pool_prewarm, liveness_idle=args.liveness_idle,
+                    statement_timeout_ms=args.statement_timeout, write_driver=args.write_driver)
+
+
+def _cli_parser() -> argparse.ArgumentParser:
+    _, tables = build_metadata()
+    conn = connection_arguments()
+
+    parser = argparse.ArgumentParser(prog="main_app_file.py", description="Выгрузка, загрузка данных и служба JSON API без окон")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", parents=[conn], help="выгрузить таблицу или задачи с проектами")
+    export.add_argument("source", choices=export_sources(tables))
+    export.add_argument("path")
+    export.add_argument("--format", choices=EXPORT_FORMATS, help="по умолчанию — по расширению файла")
+    load = commands.add_parser("import", parents=[conn], help="загрузить CSV/JSONL в таблицу")
+    load.add_argument("table", choices=list(tables))
+    load.add_argument("path")
+    load.add_argument("--rejects", help="файл отклонённых строк (по умолчанию PATH.rejected.jsonl)")
+    refresh = commands.add_parser("refresh-views", parents=[conn],
+                                  help="обновить материализованные представления соединений (например, из cron)")
+    refresh.add_argument("--due", action="store_true", help="только те, у которых подошёл срок по расписанию")
+    serve = commands.add_parser("serve", parents=[conn], help="служба JSON API без окон (app_service)")
+    serve.add_argument("--listen", default="127.0.0.1", help="только локальный адрес")
+    serve.add_argument("--http-port", type=int, default=8765)
+    serve.add_argument("--max-concurrent", type=int, default=8, help="запросов к БД одновременно")
+    serve.add_argument("--max-waiting", type=int, default=64, help="запросов в очереди; сверх — ответ 503")
+    return parser
+
+
+def run_cli(argv: List[str]) -> int:
+    args = _cli_parser().parse_args(argv)
+    setup_logging(LogConfig(json_lines=args.log_json))
+    cfg = config_from_args(args)
+
+    def progress(rows: int):
+        print(f"\r{rows} строк", end="", file=sys.stderr, flush=True)
+
+    if args.command == "serve":
+        from app_service import ServiceConfig, serve  # asyncio-движок нужен только службе
+        try:
+            return serve(cfg, ServiceConfig(host=args.listen, port=args.http_port,
+                                            max_concurrent=args.max_concurrent, max_waiting=args.max_waiting))
+        except (SQLAlchemyError, OSError, ValueError) as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            return 1
+    try:
+        engine = make_engine(cfg)
+        _, tables = build_metadata()
+        if args.command == "export":
+            result = export_data(engine, tables, args.source, args.path, args.format, progress=progress)
+            print(f"\n{result.source} -> {result.path}: {result.rows} строк за {result.elapsed:.1f} c")
+        elif args.command == "refresh-views":
+            if args.due:
+                names = refresh_due_join_views(engine, tables)
+            else:
+                names = [spec.name for spec, _ in join_views(engine, tables)]
+                for name in names:
+                    refresh_join_view(engine, tables, name)
+            print(f"Обновлено представлений: {len(names)}")
+        else:
+            result = import_file(engine, tables, args.table, args.path, args.rejects, progress=progress)
+            print(f"\n{result.table}: добавлено {result.inserted}, связей {result.linked}, "
+                  f"отклонено {result.rejected} за {result.elapsed:.1f} c")
+            if result.rejected:
+                print(f"Отклонённые строки: {result.reject_path}")
+    except (SQLAlchemyError, OSError, ValueError) as e:
+        print(f"\nОшибка: {e}", file=sys.stderr)
+        return 1
+    engine.dispose()
+    return 0
@@ -0,0 +1,327 @@
+"""Движок и пул соединений SQLAlchemy, замеры запросов и ожиданий ответа сервера."""
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Sequence
+from datetime import datetime
+import json
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from collections import deque
+
+# ===== SQLAlchemy =====
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import ExecuteStyle
+from sqlalchemy.engine.url import URL
+from sqlalchemy.exc import DisconnectionError
+
+from app_base import PgConfig, WRITE_DRIVERS
+
+
+# -------------------------------
+# Движок и пул соединений
+# -------------------------------
+_WRITE_ENGINES: "weakref.WeakKeyDictionary[Engine, Engine]" = weakref.WeakKeyDictionary()
+
+
+def engine_url(cfg: PgConfig, driver: str) -> URL:
+    """URL подключения из PgConfig для драйвера driver ("psycopg2", "psycopg"); общий для всех движков."""
+    query = {
+        "sslmode": cfg.sslmode,
+        "application_name": "QtEduDemo",
+        "connect_timeout": str(cfg.connect_timeout),
+    }
+    if cfg.statement_timeout_ms:
+        # параметр стартового пакета: отдельный SET на каждое соединение не нужен
+        query["options"] = f"-c statement_timeout={cfg.statement_timeout_ms}"
+
+    return URL.create(
+        drivername=f"postgresql+{driver}",
+        username=cfg.user,
+        password=cfg.password,
+        host=cfg.host,
+        port=cfg.port,
+        database=cfg.dbname,
+        query=query,
+    )
+
+
+def attach_liveness(engine: Engine, idle: int):
+    """Проверка соединений пула по времени простоя вместо pool_pre_ping (SELECT 1 на каждую выдачу).
+
+    Соединение, пролежавшее в пуле дольше idle секунд, проверяется перед выдачей; оборванное
+    пул закрывает и открывает новое (DisconnectionError). idle=0 — проверка при каждой выдаче.
+    """
+    def checkin(dbapi_conn, record):
+        if record is not None:
+            record.info["idle_since"] = time.monotonic()
+
+    def checkout(dbapi_conn, record, proxy):
+        since = record.info.pop("idle_since", None)
+        if since is None or (idle and time.monotonic() - since < idle):
+            return  # только что открыто или простаивало недолго
+        ROUND_TRIPS.add("ping")
+        autocommit = dbapi_conn.autocommit
+        try:
+            dbapi_conn.autocommit = True  # иначе SELECT 1 открыл бы транзакцию с момента выдачи
+            cursor = dbapi_conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            dbapi_conn.autocommit = autocommit
+        except Exception as e:
+            raise DisconnectionError(str(e)) from e
+
+    event.listen(engine, "checkin", checkin)
+    event.listen(engine, "checkout", checkout)
+
+
+def _pooled_engine(cfg: PgConfig, driver: str) -> Engine:
+    engine = create_engine(engine_url(cfg, driver), future=True, pool_size=cfg.pool_size,
+                           max_overflow=cfg.max_overflow, pool_timeout=cfg.pool_timeout,
+                           pool_recycle=cfg.pool_recycle)
+    attach_liveness(engine, cfg.liveness_idle)
+    QUERY_STATS.attach(engine)
+    ROUND_TRIPS.attach(engine)
+    return engine
+
+
+def prewarm_pool(engine: Engine, connections: int):
+    """Открывает connections соединений заранее (первое заодно проверяется) и возвращает их в пул."""
+    opened = []
+    try:
+        for _ in range(max(connections, 1)):
+            opened.append(engine.connect())
+        opened[0].exec_driver_sql("SELECT 1")
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+def make_engine(cfg: PgConfig) -> Engine:
+    if cfg.write_driver not in WRITE_DRIVERS:
+        raise ValueError(f"неизвестный драйвер записи: {cfg.write_driver}")
+    engine = _pooled_engine(cfg, "psycopg2")
+    prewarm_pool(engine, min(cfg.pool_prewarm, cfg.pool_size))
+    if cfg.write_driver != "psycopg2":
+        # COPY, LISTEN и отмена запросов написаны для psycopg2, поэтому psycopg 3 — отдельный движок только для записи
+        writer = _pooled_engine(cfg, cfg.write_driver)
+        prewarm_pool(writer, 1)
+        _WRITE_ENGINES[engine] = writer
+        event.listen(engine, "engine_disposed", lambda _: writer.dispose())
+    return engine
+
+
+def write_engine(engine: Engine) -> Engine:
+    """Движок для WriteRepository: отдельный, если в PgConfig.write_driver выбран psycopg 3."""
+    return _WRITE_ENGINES.get(engine, engine)
+
+
+# -------------------------------
+# Замеры запросов
+# -------------------------------
+QUERY_STATS_SIZE = 5000  # сколько последних замеров держит кольцевой буфер
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)  # границы корзин гистограммы
+
+
+@dataclass
+class QueryTiming:
+    statement: str
+    params: str  # форма параметров, без значений: "dict[5]", "1000 x dict[3]"
+    rows: int
+    elapsed: float  # секунды
+    kind: str = "sql"  # "sql" — сеть и сервер (cursor.execute), иначе этап на клиенте: "build", "sort", "diff"
+    at: float = field(default_factory=time.time)
+    error: str = ""  # тип исключения, если оператор завершился ошибкой (тайм-аут, отмена, конфликт)
+
+
+def _params_shape(parameters, executemany: bool) -> str:
+    def shape(p):
+        if isinstance(p, dict):
+            return f"dict[{len(p)}]"
+        if isinstance(p, (list, tuple)):
+            return f"tuple[{len(p)}]"
+        return "-" if p is None else type(p).__name__
+    if executemany and isinstance(parameters, (list, tuple)):
+        return f"{len(parameters)} x {shape(parameters[0]) if parameters else '-'}"
+    return shape(parameters)
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class QueryStats:
+    """Замеры операторов движка (события before/after_cursor_execute) и этапов на клиенте в кольцевом буфере."""
+    def __init__(self, size: int = QUERY_STATS_SIZE):
+        self._lock = threading.Lock()
+        self._timings: deque = deque(maxlen=size)
+        self.total = 0  # всего замеров с момента очистки, включая вытесненные из буфера
+
+    def attach(self, engine: Engine):
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._on_error)
+
+    # Время начала хранится в контексте выполнения: он свой у каждого оператора и исчезает вместе с ним,
+    # поэтому оператор, завершившийся ошибкой, не оставляет на соединении «висящий» замер.
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        self.add(QueryTiming(" ".join(statement.split()), _params_shape(parameters, executemany),
+                             max(cursor.rowcount, 0), elapsed))
+
+    def _on_error(self, ctx):
+        """Оператор с ошибкой (statement_timeout, отмена, нарушение ограничения) — тоже замер, с пометкой."""
+        context = ctx.execution_context
+        started = getattr(context, "_query_started", None)
+        if ctx.statement is None or started is None:
+            return  # ошибка до отправки оператора (подключение, компиляция) — замерять нечего
+        executemany = bool(getattr(context, "executemany", False))
+        self.add(QueryTiming(" ".join(ctx.statement.split()), _params_shape(ctx.parameters, executemany),
+                             0, time.perf_counter() - started, error=type(ctx.original_exception).__name__))
+
+    def add(self, timing: QueryTiming):
+        with self._lock:
+            self._timings.append(timing)
+            self.total += 1
+
+    @contextmanager
+    def stage(self, kind: str, label: str):
+        """Замер этапа на клиенте: with QUERY_STATS.stage("build", "task") as t: ...; t.rows = n."""
+        timing = QueryTiming(label, "-", 0, 0.0, kind)
+        started = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing.elapsed = time.perf_counter() - started
+            self.add(timing)
+
+    def timings(self) -> List[QueryTiming]:
+        with self._lock:
+            return list(self._timings)
+
+    def clear(self):
+        with self._lock:
+            self._timings.clear()
+            self.total = 0
+
+    def percentiles(self, kind: str = "sql", ps: Sequence[float] = (50, 90, 99)) -> Dict[float, float]:
+        values = sorted(t.elapsed for t in self.timings() if t.kind == kind)
+        return {p: _percentile(values, p) for p in ps}
+
+    def histogram(self, kind: str = "sql") -> List[int]:
+        """Число замеров по корзинам LATENCY_BUCKETS_MS; последняя корзина — всё, что дольше."""
+        counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for t in self.timings():
+            if t.kind == kind:
+                ms = t.elapsed * 1000
+                counts[next((i for i, b in enumerate(LATENCY_BUCKETS_MS) if ms <= b), len(LATENCY_BUCKETS_MS))] += 1
+        return counts
+
+    def slowest(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Сводка по операторам (одинаковый текст — одна строка), самые медленные по p95 — первыми."""
+        groups: Dict[tuple, List[QueryTiming]] = {}
+        for t in self.timings():
+            groups.setdefault((t.kind, t.statement), []).append(t)
+        summary = []
+        for (kind, statement), items in groups.items():
+            values = sorted(t.elapsed for t in items)
+            summary.append({
+                "kind": kind, "statement": statement, "params": items[-1].params, "calls": len(items),
+                "rows": sum(t.rows for t in items), "total": sum(values), "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95), "max": values[-1], "errors": sum(1 for t in items if t.error),
+            })
+        summary.sort(key=lambda r: r["p95"], reverse=True)
+        return summary[:limit]
+
+    def dump(self, path: str):
+        """Сохраняет сводку и все замеры буфера в JSON — для приложения к задаче."""
+        kinds = sorted({t.kind for t in self.timings()})
+        report = {
+            "created": datetime.now().isoformat(),
+            "total": self.total,
+            "percentiles_ms": {k: {str(p): v * 1000 for p, v in self.percentiles(k).items()} for k in kinds},
+            "histogram": {
+                "bounds_ms": list(LATENCY_BUCKETS_MS),
+                "counts": {k: self.histogram(k) for k in kinds},
+            },
+            "slowest": self.slowest(),
+            "timings": [t.__dict__ for t in self.timings()],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+
+QUERY_STATS = QueryStats()
+
+
+class RoundTrips:
+    """Число ожиданий ответа сервера (round trip) по событиям движка и пула — всего и за блок measure().
+
+    Драйверы ждут ответа так: BEGIN — отдельно перед первым оператором транзакции; COMMIT/ROLLBACK —
+    только если в транзакции были операторы; executemany (не insertmanyvalues) у psycopg2 — на каждую
+    строку, у psycopg 3 — один раз (конвейер); операторы внутри WriteRepository._pipeline — одна
+    синхронизация на весь конвейер. Соединения (connect) считаются отдельно: это несколько обменов.
+    """
+    KINDS = ("connect", "ping", "begin", "execute", "commit", "rollback")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.totals = dict.fromkeys(self.KINDS, 0)
+
+    def attach(self, engine: Engine):
+        event.listen(engine, "connect", lambda dbapi_conn, record: self.add("connect"))
+        event.listen(engine, "begin", self._begin)
+        event.listen(engine, "before_cursor_execute", self._execute)
+        event.listen(engine, "commit", lambda conn: self._end(conn, "commit"))
+        event.listen(engine, "rollback", lambda conn: self._end(conn, "rollback"))
+
+    def _begin(self, conn):
+        conn.info["rt_begin"] = True
+
+    def _execute(self, conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("pipeline"):
+            if conn.info.pop("rt_begin", False):  # BEGIN ушёл в том же конвейере
+                conn.info["rt_transaction"] = True
+            return
+        if conn.info.pop("rt_begin", False) and not getattr(conn.connection.dbapi_connection, "autocommit", False):
+            self.add("begin")
+            conn.info["rt_transaction"] = True
+        many = executemany and getattr(context, "execute_style", None) is ExecuteStyle.EXECUTEMANY
+        self.add("execute", len(parameters) if many and conn.dialect.driver == "psycopg2" else 1)
+
+    def _end(self, conn, kind: str):
+        conn.info.pop("rt_begin", None)
+        if conn.info.pop("rt_transaction", False):
+            self.add(kind)
+
+    def add(self, kind: str, n: int = 1):
+        with self._lock:
+            self.totals[kind] += n
+        for counts in getattr(self._local, "active", ()):
+            counts[kind] += n
+
+    @contextmanager
+    def measure(self):
+        """Ожидания текущего потока за время блока: with ROUND_TRIPS.measure() as trips: ...; sum(trips.values())."""
+        counts = dict.fromkeys(self.KINDS, 0)
+        active = self._local.__dict__.setdefault("active", [])
+        active.append(counts)
+        try:
+            yield counts
+        finally:
+            active.remove(counts)
+
+    def clear(self):
+        with self._lock:
+            self.totals = dict.fromkeys(self.KINDS, 0)
+
+
+ROUND_TRIPS = RoundTrips()
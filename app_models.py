@@ -0,0 +1,1183 @@
+"""Модели Qt для таблиц: колоночное хранилище, постраничная загрузка, общий кэш моделей,
+локальный снимок (SQLite) и живое обновление по NOTIFY."""
+import logging
+import re
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Callable, Sequence
+from datetime import date, datetime
+from array import array
+import json
+import select as select_module
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен: без него сортировка в памяти просто медленнее
+    np = None
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, QObject, Signal
+
+# ===== SQLAlchemy =====
+from sqlalchemy import (
+    Table, Integer, Date, select, Boolean, asc, desc, tuple_, and_, or_, text, DateTime, func, literal_column,
+)
+from sqlalchemy.engine import Engine
+
+from app_base import log_event, PgConfig, QueryCancelled, CancelToken, DbWorker, run_db_job
+from app_engine import QUERY_STATS
+from app_schema import ARRAY_TYPES, NOTIFY_CHANNEL
+
+
+# -------------------------------
+# Колоночное хранилище строк и форматирование ячеек
+# -------------------------------
+DISPLAY_CACHE_LIMIT = 100_000  # максимум закэшированных строк отображения на столбец
+
+
+class ColumnStore:
+    """Строки выборки по столбцам: NOT NULL Integer — array('q'), остальные — list."""
+    __slots__ = ("columns", "_length")
+
+    def __init__(self, typecodes: Sequence[Optional[str]]):
+        self.columns: List[Any] = [array(tc) if tc else [] for tc in typecodes]
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def extend_rows(self, rows: Sequence[Sequence[Any]]):
+        if not rows:
+            return
+        for i, values in enumerate(zip(*rows)):
+            self._extend_column(i, values)
+        self._length += len(rows)
+
+    def extend(self, other: "ColumnStore"):
+        for i, values in enumerate(other.columns):
+            self._extend_column(i, values)
+        self._length += len(other)
+
+    def append_row(self, values: Sequence[Any]):
+        for i, val in enumerate(values):
+            self._extend_column(i, (val,))
+        self._length += 1
+
+    def _extend_column(self, i: int, values):
+        dst = self.columns[i]
+        try:
+            dst.extend(values)
+        except TypeError:
+            # в «числовом» столбце встретился NULL — переходим на обычный список
+            self.columns[i] = list(dst[:self._length]) + list(values)
+
+    def set_row(self, row: int, values: Sequence[Any]):
+        for i, val in enumerate(values):
+            try:
+                self.columns[i][row] = val
+            except TypeError:
+                self.columns[i] = list(self.columns[i])
+                self.columns[i][row] = val
+
+    def take(self, rows: Sequence[int]) -> "ColumnStore":
+        """Новое хранилище из строк rows (в указанном порядке)."""
+        store = ColumnStore([])
+        store.columns = [array(c.typecode, (c[i] for i in rows)) if isinstance(c, array) else [c[i] for i in rows]
+                         for c in self.columns]
+        store._length = len(rows)
+        return store
+
+    def value(self, row: int, col: int):
+        return self.columns[col][row]
+
+    def row(self, row: int) -> tuple:
+        return tuple(c[row] for c in self.columns)
+
+
+def _typecodes(columns) -> List[Optional[str]]:
+    return ["q" if isinstance(c.type, Integer) and not c.nullable else None for c in columns]
+
+
+def format_money(val) -> str:
+    return f"{val:,}".replace(",", " ") + " ₽"
+
+
+def _format_tags(val) -> str:
+    return " ".join(f"#{tag}" for tag in val)
+
+
+def _format_date(val) -> str:
+    return val.isoformat()
+
+
+def format_bool(val) -> str:
+    return "Да" if val else "Нет"
+
+
+def column_formatter(col) -> Callable[[Any], str]:
+    """Функция val -> строка для ячейки с учётом типа столбца (и col.info["format"])."""
+    fmt = col.info.get("format") if hasattr(col, "info") else None
+    if fmt == "money":
+        f = format_money
+    elif fmt == "tags" or isinstance(col.type, ARRAY_TYPES):
+        f = _format_tags
+    elif isinstance(col.type, Date):
+        f = _format_date
+    elif isinstance(col.type, Boolean):
+        f = format_bool
+    else:
+        f = str
+    return lambda val: "" if val is None else f(val)
+
+
+# -------------------------------
+# QAbstractTableModel для SQLAlchemy
+# -------------------------------
+PAGE_SIZE = 500  # размер страницы для постраничной (keyset) загрузки
+_TEXT_ROLES = (Qt.DisplayRole, Qt.EditRole)  # поиск атрибутов Qt.* в data() заметно дорог
+
+
+def fetch_rows(res, typecodes: Sequence[Optional[str]], label: str = "") -> "ColumnStore":
+    """Читает весь результат res в ColumnStore, замеряя этап "build"."""
+    with QUERY_STATS.stage("build", label) as timing:
+        store = ColumnStore(typecodes)
+        store.extend_rows(list(res))
+        timing.rows = len(store)
+    return store
+
+
+def _row_ranges(rows: List[int]) -> List[tuple]:
+    """[1, 2, 3, 7, 8] -> [(1, 3), (7, 8)] — для групповых сигналов модели."""
+    ranges: List[list] = []
+    for row in sorted(rows):
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(r) for r in ranges]
+
+
+def _estimate_row_count(conn, table: Table) -> int:
+    if conn.dialect.name != "postgresql":
+        return 0
+    est = conn.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)"),
+        {"name": table.name},
+    ).scalar()
+    return max(int(est or 0), 0)  # -1 — таблица ещё ни разу не анализировалась
+
+
+class SATableModel(QAbstractTableModel):
+    """Универсальная модель для QTableView (SQLAlchemy).
+
+    Если задан page_size, строки подгружаются страницами через canFetchMore/fetchMore
+    (keyset-пагинация по активному столбцу сортировки + первичному ключу, без OFFSET),
+    а до полной загрузки rowCount() равен оценке из pg_class.reltuples.
+    С worker запросы выполняются в фоне, а о загрузке сообщает сигнал loadingChanged.
+    Строки хранятся по столбцам (ColumnStore), строки отображения кэшируются по мере отрисовки.
+    Когда выборка загружена целиком, sort() переставляет строки в памяти (кэш перестановок
+    по (столбец, порядок)); для частично загруженных данных сортирует сервер.
+    insert_row() добавляет новую строку на её место в текущей сортировке без перезагрузки.
+    refresh() полностью загруженной модели сравнивает новый снимок со старым по первичному ключу
+    и сообщает представлению только об изменившихся строках (dataChanged/rowsInserted/rowsRemoved).
+    С snapshot (SnapshotStore) таблица сначала целиком читается из локального снимка, затем
+    refresh() догоняет сервер дельтой снимка; без engine модель показывает только снимок.
+    """
+    loadingChanged = Signal(bool)
+
+    def __init__(self, engine: Optional[Engine], table: Table, parent=None, page_size: Optional[int] = None,
+                 worker: Optional[DbWorker] = None, snapshot: Optional["SnapshotStore"] = None):
+        super().__init__(parent)
+        self.engine = engine
+        self.table = table
+        self.worker = worker
+        self.snapshot = snapshot
+        self.snapshot_synced: Optional[float] = None  # время последней синхронизации снимка с сервером
+        self._snapshot_state = "new" if snapshot is not None else "off"  # new / loaded / off
+        self.columns: List[str] = [c.name for c in self.table.columns]
+        self.pk_col = list(self.table.primary_key.columns)[0]
+        self.page_size = page_size
+        self._sort_col = self.pk_col
+        self._sort_desc = False
+        self._init_storage()
+        self._exhausted = True  # все строки выборки уже загружены
+        self._estimate = 0  # приблизительное число строк в таблице
+        self._wanted_row = -1  # до какой строки догрузить данные (для «виртуальных» строк)
+        self._fetching = False  # запрос строк уже выполняется
+        self._loading = False
+        self.refresh()
+
+    def _init_storage(self):
+        cols = list(self.table.columns)
+        self._typecodes = _typecodes(cols)
+        self._formatters = [column_formatter(c) for c in cols]
+        self._pk_index = self.columns.index(self.pk_col.name)
+        self._store = ColumnStore(self._typecodes)
+        self._display: List[Dict[int, str]] = [{} for _ in cols]  # ключ — индекс строки в _store
+        self._store_sort: Optional[tuple] = (self._pk_index, False)  # порядок строк в _store (None — смешанный)
+        self._order: Optional[array] = None  # строка представления -> строка _store
+        self._perm_cache: Dict[tuple, array] = {}
+
+    @property
+    def paged(self) -> bool:
+        return self.page_size is not None
+
+    def is_loading(self) -> bool:
+        return self._loading
+
+    def _set_loading(self, loading: bool):
+        if loading != self._loading:
+            self._loading = loading
+            self.loadingChanged.emit(loading)
+
+    def _submit(self, job, on_done):
+        """Выполняет job(token) в фоне (новый запрос модели отменяет предыдущий) или сразу, без worker."""
+        if self.worker is None:
+            on_done(job(CancelToken()))
+            return
+
+        def done(result):
+            self._set_loading(False)
+            on_done(result)
+
+        self._set_loading(True)
+        self.worker.submit(job, done, self._on_load_failed, key=self)
+
+    def _on_load_failed(self, error):
+        self._fetching = False
+        self._set_loading(False)
+        log_event(f"Ошибка загрузки таблицы: {error}", logging.ERROR, op="select", table=self.table.name)
+
+    def refresh(self):
+        if self._snapshot_state == "new":
+            self._load_snapshot(sync=True)
+            return
+        if self._snapshot_state == "loaded":
+            self._sync_snapshot()
+            return
+        engine, table, typecodes = self.engine, self.table, self._typecodes
+        # выборка уже целиком в памяти — перечитываем её всю и применяем разницу
+        diff = self._exhausted and not self._fetching and len(self._store) > 0
+        paged = self.paged and not diff
+        stmt = self._ordered_select()
+        if paged:
+            stmt = stmt.limit(self.page_size)
+        self._fetching = True  # до получения нового снимка не догружаем страницы старого
+
+        def job(token):
+            with engine.connect() as conn, token.bind(conn):
+                estimate = _estimate_row_count(conn, table) if paged else 0
+                return estimate, fetch_rows(conn.execute(stmt), typecodes, table.name)
+
+        self._submit(job, self._apply_diff if diff else self._apply_refresh)
+
+    def _load_snapshot(self, sync: bool):
+        snapshot, name = self.snapshot, self.table.name
+        self._fetching = True
+        self._submit(lambda token: snapshot.load(name), lambda loaded: self._apply_snapshot(loaded, sync))
+
+    def _apply_snapshot(self, loaded: Optional[tuple], sync: bool):
+        self._fetching = False
+        if loaded is None:
+            self._snapshot_state = "off"
+            if self.engine is None:
+                log_event("Снимка таблицы нет, а подключения нет.", logging.WARNING, op="snapshot",
+                          table=self.table.name)
+                return
+            self.refresh()  # таблица с сервера как обычно, снимок для следующего раза строится в фоне
+            engine, snapshot, name = self.engine, self.snapshot, self.table.name
+            run_db_job(self.worker, lambda token: snapshot.sync(engine, name, token), None,
+                       lambda e: log_event(f"Ошибка построения снимка: {e}", logging.ERROR, op="snapshot",
+                                           table=name),
+                       key=("snapshot", self))
+            return
+        self.snapshot_synced, store = loaded
+        self._snapshot_state = "loaded"
+        sort = (self._sort_col, self._sort_desc)
+        self._sort_col, self._sort_desc = self.pk_col, False  # снимок читается по возрастанию ключа
+        self._apply_refresh((0, store), complete=True)
+        if sort != (self.pk_col, False):
+            self.sort(self.columns.index(sort[0].name), Qt.DescendingOrder if sort[1] else Qt.AscendingOrder)
+        if sync:
+            self._sync_snapshot()
+
+    def _sync_snapshot(self):
+        if self.engine is None:
+            return  # без подключения — только снимок
+        engine, snapshot, name = self.engine, self.snapshot, self.table.name
+        self._fetching = True
+        self._submit(lambda token: snapshot.sync(engine, name, token), self._apply_sync)
+
+    def _apply_sync(self, delta: "SnapshotDelta"):
+        self._fetching = False
+        self.snapshot_synced = delta.synced_at
+        if self.table.name in delta.evicted:
+            self._snapshot_state = "off"  # таблица одна больше предела снимка — дальше только сервер
+        elif delta.reload or not self.apply_changes(delta.rows, delta.deleted):
+            self._load_snapshot(sync=False)
+
+    def _apply_refresh(self, result, complete: bool = False):
+        estimate, store = result
+        self.beginResetModel()
+        try:
+            self._store = store
+            self._display = [{} for _ in self.columns]
+            self._store_sort = (self.columns.index(self._sort_col.name), self._sort_desc)
+            self._order = None
+            self._perm_cache.clear()
+            self._estimate = estimate
+            self._exhausted = complete or not self.paged or len(store) < self.page_size
+            self._wanted_row = -1
+            self._fetching = False
+        finally:
+            self.endResetModel()
+
+    def _apply_diff(self, result):
+        with QUERY_STATS.stage("diff", self.table.name) as timing:
+            timing.rows = len(result[1])
+            self._merge_snapshot(result)
+
+    def _merge_snapshot(self, result):
+        _, new = result
+        self._fetching = False
+        old_pks = self._store.columns[self._pk_index]
+        new_pks = new.columns[self._pk_index]
+        old_index = {pk: i for i, pk in enumerate(old_pks)}
+        new_index = {pk: i for i, pk in enumerate(new_pks)}
+        deleted = old_index.keys() - new_index.keys()
+        rows: Dict[Any, tuple] = {}  # новые и изменившиеся строки в порядке снимка
+        for j, pk in enumerate(new_pks):
+            values = new.row(j)
+            physical = old_index.get(pk)
+            if physical is None or self._store.row(physical) != values:
+                rows[pk] = values
+
+        if len(deleted) + len(rows) > len(new) // 2:
+            self._apply_refresh(result, complete=True)  # изменилось слишком много — дешевле сбросить модель
+            return
+        self._apply_row_changes(rows, deleted)
+
+        # представление уже совпадает с новым снимком — незаметно переходим на его хранилище
+        pks = self._store.columns[self._pk_index]
+        order = array("q", (new_index[pks[p]] for p in self._view_rows()))
+        identity = all(i == j for i, j in enumerate(order))
+        self._store = new
+        self._order = None if identity else order
+        self._store_sort = (self.columns.index(self._sort_col.name), self._sort_desc) if identity else None
+        self._display = [{} for _ in self.columns]
+        self._perm_cache.clear()
+
+    def apply_changes(self, rows: Dict[Any, tuple], deleted) -> bool:
+        """Применяет изменения отдельных строк: rows — {pk: значения} новых/изменённых, deleted — pk удалённых.
+
+        Возвращает False, если выборка загружена не полностью — тогда модель нужно перечитать.
+        """
+        if not self._exhausted or self._fetching:
+            return False
+        if self._apply_row_changes(rows, deleted):
+            self._compact()
+        return True
+
+    def _apply_row_changes(self, rows: Dict[Any, tuple], deleted) -> bool:
+        """Сигналы dataChanged/rowsRemoved/rowsInserted для изменённых строк.
+
+        Удалённые строки только убираются из _order и остаются в _store «мусором»;
+        возвращает True, если такие строки появились.
+        """
+        col = self.columns.index(self._sort_col.name)
+        pks = self._store.columns[self._pk_index]
+        removed: List[int] = []  # строки представления, которые уходят (удалены или сменили место)
+        changed: List[tuple] = []  # (строка представления, физическая строка, новые значения)
+        seen, moved = set(), set()
+        for view_row, physical in enumerate(self._view_rows()):
+            pk = pks[physical]
+            if pk in deleted:
+                removed.append(view_row)
+                continue
+            values = rows.get(pk)
+            if values is None:
+                continue
+            seen.add(pk)
+            old_values = self._store.row(physical)
+            if old_values == values:
+                continue
+            if old_values[col] != values[col]:
+                removed.append(view_row)
+                moved.add(pk)
+            else:
+                changed.append((view_row, physical, values))
+        inserted = [values for pk, values in rows.items() if pk not in seen or pk in moved]
+
+        for view_row, physical, values in changed:
+            self._store.set_row(physical, values)
+            for cache in self._display:
+                cache.pop(physical, None)
+        for first, last in _row_ranges([r for r, _, _ in changed]):
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.columns) - 1))
+
+        if self._order is None and (removed or inserted):
+            self._order = array("q", range(len(self._store)))
+        for first, last in reversed(_row_ranges(removed)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._order[first:last + 1]
+            self.endRemoveRows()
+        for values in inserted:
+            pos = self._insert_position(values[col], values[self._pk_index])
+            physical = len(self._store)
+            self.beginInsertRows(QModelIndex(), pos, pos)
+            self._store.append_row(values)
+            self._order.insert(pos, physical)
+            self.endInsertRows()
+        if inserted:
+            self._store_sort = None
+        self._perm_cache.clear()
+        return bool(removed)
+
+    def _compact(self):
+        """Пересобирает _store в порядке представления, выбрасывая удалённые строки."""
+        store = self._store.take(self._view_rows())
+        self._store = store
+        self._order = None
+        self._store_sort = (self.columns.index(self._sort_col.name), self._sort_desc)
+        self._display = [{} for _ in self.columns]
+        self._perm_cache.clear()
+
+    def _ordered_select(self):
+        col, pk = self._sort_col, self.pk_col
+        direction = desc if self._sort_desc else asc
+        keys = []
+        if col is not pk:
+            if col.nullable:
+                keys.append(col.is_(None))  # NULL всегда в конце, чтобы keyset-условие было однозначным
+            keys.append(direction(col))
+        keys.append(direction(pk))
+        return select(self.table).order_by(*keys)
+
+    def _keyset_after(self, row: int):
+        """Условие «строго после строки row» в текущем порядке сортировки."""
+        col, pk = self._sort_col, self.pk_col
+        after = (lambda a, b: a < b) if self._sort_desc else (lambda a, b: a > b)
+        last_pk = self._store.value(row, self._pk_index)
+        if col is pk:
+            return after(pk, last_pk)
+        last = self._store.value(row, self.columns.index(col.name))
+        if last is None:
+            return and_(col.is_(None), after(pk, last_pk))
+        cond = after(tuple_(col, pk), (last, last_pk))
+        return or_(col.is_(None), cond) if col.nullable else cond
+
+    def _page_select(self, limit: int):
+        stmt = self._ordered_select()
+        if len(self._store):
+            stmt = stmt.where(self._keyset_after(len(self._store) - 1))
+        return stmt.limit(limit)
+
+    def _append_rows(self, rows: ColumnStore, exhausted: bool):
+        shown = self.rowCount()
+        start = len(self._store)
+        end = start + len(rows)
+        if end > shown:
+            self.beginInsertRows(QModelIndex(), shown, end - 1)
+            self._store.extend(rows)
+            self.endInsertRows()
+        else:
+            self._store.extend(rows)
+        self._perm_cache.clear()
+        if start < min(end, shown):
+            self.dataChanged.emit(self.index(start, 0), self.index(min(end, shown) - 1, len(self.columns) - 1))
+        if exhausted and end < shown:
+            # оценка оказалась больше реального числа строк — убираем лишний «хвост»
+            self.beginRemoveRows(QModelIndex(), end, shown - 1)
+            self._exhausted = True
+            self.endRemoveRows()
+        else:
+            self._exhausted = exhausted
+
+    def _fetch(self, limit: int):
+        if self._fetching:
+            return
+        self._fetching = True
+        engine, stmt, typecodes = self.engine, self._page_select(limit), self._typecodes
+        label = self.table.name
+
+        def job(token):
+            with engine.connect() as conn, token.bind(conn):
+                return fetch_rows(conn.execute(stmt), typecodes, label)
+
+        self._submit(job, lambda rows: self._apply_fetch(rows, limit))
+
+    def _apply_fetch(self, rows: ColumnStore, limit: int):
+        self._fetching = False
+        self._append_rows(rows, len(rows) < limit)
+        if self._wanted_row >= len(self._store) and not self._exhausted:
+            QTimer.singleShot(0, self._fetch_wanted)
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self.paged and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._fetch(self.page_size)
+
+    def _request_row(self, row: int):
+        # строка ещё не загружена: откладываем догрузку, чтобы не ходить в БД из data()
+        if self._wanted_row < 0 and not self._fetching:
+            QTimer.singleShot(0, self._fetch_wanted)
+        self._wanted_row = max(self._wanted_row, row)
+
+    def _fetch_wanted(self):
+        if self._fetching:
+            return  # догрузим после завершения текущего запроса (_apply_fetch)
+        wanted, self._wanted_row = self._wanted_row, -1
+        if wanted >= len(self._store) and not self._exhausted:
+            # keyset не умеет «прыгать», поэтому забираем весь промежуток одним запросом
+            pages = (wanted - len(self._store)) // self.page_size + 1
+            self._fetch(pages * self.page_size)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        if self._exhausted:
+            return self._view_len()
+        return max(len(self._store), self._estimate)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if role not in _TEXT_ROLES or not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if row >= self._view_len():
+            self._request_row(row)
+            return "…"
+        if self._order is not None:
+            row = self._order[row]
+        cache = self._display[col]
+        cell = cache.get(row)
+        if cell is None:
+            if len(cache) >= DISPLAY_CACHE_LIMIT:
+                cache.clear()
+            cell = cache[row] = self._formatters[col](self._store.value(row, col))
+        return cell
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        return self.columns[section] if orientation == Qt.Horizontal else section + 1
+
+    def _physical_row(self, row: int) -> int:
+        return self._order[row] if self._order is not None else row
+
+    def _view_len(self) -> int:
+        return len(self._order) if self._order is not None else len(self._store)
+
+    def _view_rows(self):
+        return self._order if self._order is not None else range(len(self._store))
+
+    def pk_value_at(self, row: int):
+        if not 0 <= row < self._view_len():
+            return None
+        return self._store.value(self._physical_row(row), self._pk_index)
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        if column < 0 or column >= len(self.columns):
+            return
+
+        self._sort_col = self.table.columns[self.columns[column]]
+        self._sort_desc = order != Qt.AscendingOrder
+        if not self._exhausted or self._fetching:
+            self.refresh()  # данные загружены не полностью — порядок задаёт сервер
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        physical = [self._physical_row(i.row()) for i in persistent]
+        key = (column, self._sort_desc)
+        with QUERY_STATS.stage("sort", f"{self.table.name}.{self.columns[column]}") as timing:
+            self._order = None if key == self._store_sort else self._permutation(*key)
+            timing.rows = len(self._store)
+        if persistent:
+            # сохраняем выделение и текущую строку представления
+            inverse = array("q", bytes(8 * len(self._store)))
+            for view_row, p in enumerate(self._view_rows()):
+                inverse[p] = view_row
+            self.changePersistentIndexList(
+                persistent, [self.index(inverse[p], i.column()) for p, i in zip(physical, persistent)])
+        self.layoutChanged.emit()
+
+    def insert_row(self, values: Sequence[Any]) -> bool:
+        """Вставляет строку (значения в порядке self.columns, например из RETURNING *).
+
+        Возвращает False, если место строки неизвестно (выборка загружена не полностью
+        или сейчас перезагружается) — тогда модель нужно обновить целиком.
+        """
+        if not self._exhausted or self._fetching:
+            return False
+        values = tuple(values)
+        col = self.columns.index(self._sort_col.name)
+        pos = self._insert_position(values[col], values[self._pk_index])
+        physical = len(self._store)
+        self.beginInsertRows(QModelIndex(), pos, pos)
+        self._store.append_row(values)
+        if self._order is None and pos != physical:
+            self._order = array("q", range(physical))
+        if self._order is not None:
+            self._order.insert(pos, physical)
+            self._store_sort = None  # физический порядок _store больше не совпадает с сортировкой
+        self._perm_cache.clear()
+        self.endInsertRows()
+        return True
+
+    def _insert_position(self, value, pk) -> int:
+        """Бинарный поиск позиции строки (value, pk) в текущем порядке представления."""
+        col = self.columns.index(self._sort_col.name)
+        desc_ = self._sort_desc
+
+        def before(row: int) -> bool:
+            physical = self._physical_row(row)
+            other, other_pk = self._store.value(physical, col), self._store.value(physical, self._pk_index)
+            if (value is None) != (other is None):
+                return other is None  # NULL всегда в конце
+            if value is not None and value != other:
+                return value > other if desc_ else value < other
+            return pk > other_pk if desc_ else pk < other_pk
+
+        lo, hi = 0, self._view_len()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if before(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _permutation(self, col: int, descending: bool) -> array:
+        key = (col, descending)
+        perm = self._perm_cache.get(key)
+        if perm is None:
+            perm = self._perm_cache[key] = self._argsort(col, descending)
+        return perm
+
+    def _argsort(self, col: int, descending: bool) -> array:
+        """Стабильная сортировка индексов _store: как ORDER BY col, pk (NULL в конце)."""
+        values = self._store.columns[col]
+        pks = self._store.columns[self._pk_index]
+        if np is not None and isinstance(values, array) and isinstance(pks, array):
+            v = np.frombuffer(values, dtype=np.int64)
+            p = np.frombuffer(pks, dtype=np.int64)
+            order = np.lexsort((-p, -v) if descending else (p, v)).astype(np.int64)
+            perm = array("q")
+            perm.frombytes(order.tobytes())
+            return perm
+        if col == self._pk_index:
+            return array("q", sorted(range(len(values)), key=values.__getitem__, reverse=descending))
+        # равные значения сохраняют порядок по первичному ключу (в том же направлении)
+        base = self._permutation(self._pk_index, descending)
+        filled = [i for i in base if values[i] is not None]
+        filled.sort(key=values.__getitem__, reverse=descending)
+        return array("q", filled + [i for i in base if values[i] is None])
+
+
+class QueryResultModel(QAbstractTableModel):
+    """Модель только для чтения: строки произвольного запроса (фильтра), поступающие порциями.
+
+    start() начинает новый результат и возвращает его номер; порции старых запросов,
+    пришедшие позже, отбрасываются append_rows().
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.headers: List[str] = []
+        self.formatters: List[Callable[[Any], str]] = []
+        self.rows: List[tuple] = []
+        self.generation = 0
+
+    def start(self, headers: List[str], formatters: List[Callable[[Any], str]]) -> int:
+        self.beginResetModel()
+        self.headers, self.formatters, self.rows = list(headers), list(formatters), []
+        self.generation += 1
+        self.endResetModel()
+        return self.generation
+
+    def append_rows(self, generation: int, rows: List[tuple]):
+        if generation != self.generation or not rows:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if role not in _TEXT_ROLES or not index.isValid():
+            return None
+        return self.formatters[index.column()](self.rows[index.row()][index.column()])
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        return self.headers[section] if orientation == Qt.Horizontal else section + 1
+
+
+# -------------------------------
+# Общий кэш моделей подключения
+# -------------------------------
+MODEL_CACHE_ROWS = 2_000_000  # сколько строк могут держать неиспользуемые модели до вытеснения
+
+
+@dataclass
+class _ModelEntry:
+    model: SATableModel
+    refs: int = 0
+    stale: bool = False
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ModelRegistry:
+    """Общие модели таблиц для всех окон одного подключения.
+
+    Окна берут модели через acquire() и возвращают через release(); неиспользуемые модели
+    остаются «тёплыми» до отключения или пока их суммарный объём не превысит MODEL_CACHE_ROWS.
+    После записи в таблицу её модели помечаются устаревшими (mark_stale).
+    С snapshot модели таблиц открываются из локального снимка (SnapshotStore).
+    """
+    def __init__(self, engine: Optional[Engine], tables: Dict[str, Table], worker: Optional[DbWorker] = None,
+                 max_rows: int = MODEL_CACHE_ROWS, snapshot: Optional["SnapshotStore"] = None):
+        self.engine = engine
+        self.tables = tables
+        self.worker = worker
+        self.max_rows = max_rows
+        self.snapshot = snapshot
+        self._entries: Dict[tuple, _ModelEntry] = {}  # (имя таблицы, page_size) -> запись
+
+    def acquire(self, name: str, page_size: Optional[int] = None) -> SATableModel:
+        entry = self._entries.get((name, page_size))
+        if entry is None:
+            model = SATableModel(self.engine, self.tables[name], page_size=page_size, worker=self.worker,
+                                 snapshot=self.snapshot)
+            entry = self._entries[(name, page_size)] = _ModelEntry(model)
+        elif entry.stale:
+            entry.model.refresh()
+            entry.stale = False
+        entry.refs += 1
+        entry.last_used = time.monotonic()
+        return entry.model
+
+    def release(self, model: SATableModel):
+        for entry in self._entries.values():
+            if entry.model is model:
+                entry.refs = max(entry.refs - 1, 0)
+                entry.last_used = time.monotonic()
+        self.trim()
+
+    def models(self, name: str) -> List[SATableModel]:
+        return [e.model for (table, _), e in self._entries.items() if table == name]
+
+    def row_inserted(self, name: str, values: Sequence[Any]):
+        """Добавляет вставленную строку (RETURNING *) в модели таблицы; не сумевшие — устаревают."""
+        for (table, _), entry in self._entries.items():
+            if table != name or entry.stale or entry.model.insert_row(values):
+                continue
+            if entry.refs:
+                entry.model.refresh()
+            else:
+                entry.stale = True
+
+    def rows_inserted(self, name: str, rows: Sequence[Sequence[Any]]):
+        """Как row_inserted для пачки; после крупной пачки модели просто перечитываются."""
+        if len(rows) > PAGE_SIZE:
+            self.mark_stale(name)
+            return
+        for row in rows:
+            self.row_inserted(name, row)
+
+    def apply_changes(self, changes: Dict[str, Optional[Dict[str, set]]]):
+        """Применяет пакет уведомлений ChangeListener к моделям.
+
+        changes: {таблица: {"upsert": pk, "delete": pk} или None — «изменилось много, перечитать»}.
+        """
+        for name, change in changes.items():
+            entries = [e for (table, _), e in self._entries.items() if table == name and not e.stale]
+            if not entries:
+                continue
+            if change is None:
+                self.mark_stale(name)
+                continue
+            self._load_changed_rows(name, entries, set(change["upsert"]), set(change["delete"]))
+
+    def _load_changed_rows(self, name: str, entries: List[_ModelEntry], upserts: set, deleted: set):
+        engine, table = self.engine, self.tables[name]
+        pk = list(table.primary_key.columns)[0]
+
+        def job(token):
+            if not upserts:
+                return []
+            with engine.connect() as conn, token.bind(conn):
+                return [tuple(r) for r in conn.execute(select(table).where(pk.in_(upserts)))]
+
+        def done(rows):
+            pk_index = list(table.columns).index(pk)
+            values = {r[pk_index]: r for r in rows}
+            gone = deleted | (upserts - values.keys())  # строка успела исчезнуть до нашего SELECT
+            for entry in entries:
+                if entry.model.apply_changes(values, gone):
+                    continue
+                if entry.refs:
+                    entry.model.refresh()
+                else:
+                    entry.stale = True
+
+        run_db_job(self.worker, job, done)
+
+    def mark_stale(self, name: str):
+        """Таблица изменилась: открытые модели перечитываются сразу, остальные — при следующем acquire()."""
+        for (table, _), entry in self._entries.items():
+            if table != name:
+                continue
+            if entry.refs:
+                entry.model.refresh()
+            else:
+                entry.stale = True
+
+    def trim(self):
+        idle = sorted((e.last_used, key) for key, e in self._entries.items() if not e.refs)
+        total = sum(len(e.model._store) for e in self._entries.values())
+        for _, key in idle:
+            if total <= self.max_rows:
+                break
+            total -= len(self._entries[key].model._store)
+            self._evict(key)
+
+    def clear(self):
+        for key in list(self._entries):
+            self._evict(key)
+
+    def _evict(self, key: tuple):
+        model = self._entries.pop(key).model
+        if self.worker is not None:
+            self.worker.cancel(model)
+        model.deleteLater()
+
+
+# -------------------------------
+# Локальный снимок таблиц (SQLite)
+# -------------------------------
+SNAPSHOT_DIR = Path("snapshots")
+SNAPSHOT_CHUNK_ROWS = 10_000  # строк в порции чтения и записи снимка
+SNAPSHOT_BUSY_MS = 30_000  # ожидание файла, который пишет другой поток
+_XID_EPOCH = 1 << 32  # xmin строки — 32 бита полного номера транзакции (xid8)
+
+
+def snapshot_path(cfg: PgConfig) -> Path:
+    """Файл снимка базы cfg: у каждой базы свой."""
+    name = re.sub(r"[^\w.-]+", "_", f"{cfg.host}_{cfg.port}_{cfg.dbname}").strip("_")
+    return SNAPSHOT_DIR / f"{name}.sqlite3"
+
+
+def snapshot_age_text(synced_at: Optional[float]) -> str:
+    if synced_at is None:
+        return "Снимка ещё нет"
+    age = time.time() - synced_at
+    if age < 60:
+        return "Снимок обновлён только что"
+    if age < 3600:
+        return f"Снимок обновлён {int(age // 60)} мин назад"
+    if age < 86400:
+        return f"Снимок обновлён {int(age // 3600)} ч назад"
+    return f"Снимок от {datetime.fromtimestamp(synced_at):%d.%m.%Y %H:%M}"
+
+
+@dataclass
+class SnapshotDelta:
+    """Итог синхронизации таблицы со снимком; reload — снимок перестроен, модель перечитывает его целиком."""
+    table: str
+    rows: Dict[Any, tuple]  # новые и изменённые строки по первичному ключу
+    deleted: set
+    reload: bool
+    synced_at: float
+    evicted: List[str] = field(default_factory=list)
+
+
+class SnapshotStore:
+    """Копия таблиц build_metadata в файле SQLite: окно данных показывает её сразу, затем догоняет сервер.
+
+    Дельта синхронизации — строки с ключом больше прежнего максимума или с xmin не старше водяного
+    знака (pg_snapshot_xmin прошлой синхронизации); удалённые строки находятся сравнением числа строк,
+    а при расхождении — списков ключей. Смена эпохи xid, схемы таблицы или сервера — полная перезагрузка.
+    Сверх max_bytes вытесняются таблицы, которые дольше всех не открывались.
+    """
+    def __init__(self, path: Path, tables: Dict[str, Table], max_bytes: int):
+        self.path = Path(path)
+        self.tables = tables
+        self.max_bytes = max_bytes
+        self._locks = {name: threading.Lock() for name in tables}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA auto_vacuum = INCREMENTAL")  # действует только для нового файла
+            db.execute("PRAGMA journal_mode = WAL")  # окно читает снимок, пока фоновый поток его пишет
+            db.execute("CREATE TABLE IF NOT EXISTS snapshot_meta (name TEXT PRIMARY KEY, columns TEXT, "
+                       "watermark INTEGER, max_pk INTEGER, rows INTEGER, synced_at REAL, used_at REAL)")
+            db.commit()
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=SNAPSHOT_BUSY_MS / 1000)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def _signature(table: Table) -> str:
+        return ",".join(f"{c.name}:{c.type}" for c in table.columns)
+
+    @staticmethod
+    def _codecs(table: Table) -> tuple:
+        """(кодеры, декодеры) значений по столбцам; None — значение хранится как есть."""
+        encoders, decoders = [], []
+        for col in table.columns:
+            if isinstance(col.type, ARRAY_TYPES):
+                encoders.append(lambda v: None if v is None else json.dumps(v, ensure_ascii=False))
+                decoders.append(lambda v: None if v is None else json.loads(v))
+            elif isinstance(col.type, DateTime):
+                encoders.append(lambda v: None if v is None else v.isoformat())
+                decoders.append(lambda v: None if v is None else datetime.fromisoformat(v))
+            elif isinstance(col.type, Date):
+                encoders.append(lambda v: None if v is None else v.isoformat())
+                decoders.append(lambda v: None if v is None else date.fromisoformat(v))
+            elif isinstance(col.type, Boolean):
+                encoders.append(None)
+                decoders.append(lambda v: None if v is None else bool(v))
+            else:
+                encoders.append(None)
+                decoders.append(None)
+        return encoders, decoders
+
+    @staticmethod
+    def _convert(rows, codecs: list) -> list:
+        if not any(codecs):
+            return [tuple(r) for r in rows]
+        return [tuple(c(v) if c else v for c, v in zip(codecs, r)) for r in rows]
+
+    def _meta(self, db, name: str) -> Optional[tuple]:
+        """(columns, watermark, max_pk, rows, synced_at) или None."""
+        return db.execute("SELECT columns, watermark, max_pk, rows, synced_at FROM snapshot_meta WHERE name = ?",
+                          (name,)).fetchone()
+
+    def synced_at(self, name: str) -> Optional[float]:
+        with self._connect() as db:
+            meta = self._meta(db, name)
+        return meta[4] if meta is not None else None
+
+    def load(self, name: str) -> Optional[tuple]:
+        """(время синхронизации, ColumnStore по возрастанию ключа) или None, если снимка таблицы нет."""
+        table = self.tables[name]
+        pk = list(table.primary_key.columns)[0]
+        _, decoders = self._codecs(table)
+        with self._connect() as db:
+            meta = self._meta(db, name)
+            if meta is None or meta[0] != self._signature(table):
+                return None
+            db.execute("UPDATE snapshot_meta SET used_at = ? WHERE name = ?", (time.time(), name))
+            db.commit()
+            with QUERY_STATS.stage("snapshot", name) as timing:
+                store = ColumnStore(_typecodes(table.columns))
+                cursor = db.execute(f'SELECT * FROM "{name}" ORDER BY "{pk.name}"')
+                while True:
+                    part = cursor.fetchmany(SNAPSHOT_CHUNK_ROWS)
+                    if not part:
+                        break
+                    store.extend_rows(self._convert(part, decoders))
+                timing.rows = len(store)
+        return meta[4], store
+
+    def _create_table(self, db, table: Table):
+        pk = list(table.primary_key.columns)[0]
+        columns = ", ".join(f'"{c.name}" INTEGER PRIMARY KEY' if c is pk else f'"{c.name}"' for c in table.columns)
+        db.execute(f'DROP TABLE IF EXISTS "{table.name}"')
+        db.execute(f'CREATE TABLE "{table.name}" ({columns})')
+
+    def sync(self, engine: Engine, name: str, token: "CancelToken") -> SnapshotDelta:
+        """Догоняет снимок таблицы name до сервера в одной транзакции REPEATABLE READ."""
+        table = self.tables[name]
+        pk = list(table.primary_key.columns)[0]
+        pk_index = list(table.columns).index(pk)
+        encoders, _ = self._codecs(table)
+        signature = self._signature(table)
+        placeholders = ", ".join("?" * len(table.columns))
+        started = time.perf_counter()
+        with self._locks[name], self._connect() as db, \
+                engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn, token.bind(conn):
+            meta = self._meta(db, name)
+            # xmin самой старой ещё не завершённой транзакции: всё, что старше, уже видно в этом снимке
+            watermark = conn.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar()
+            full = (meta is None or meta[0] != signature or watermark < meta[1]
+                    or watermark // _XID_EPOCH != meta[1] // _XID_EPOCH)
+            stmt = select(table)
+            if not full:
+                xmin = literal_column(f"{table.name}.xmin::text::bigint")
+                stmt = stmt.where(or_(pk > meta[2], xmin >= meta[1] % _XID_EPOCH))
+            result = conn.execution_options(stream_results=True, max_row_buffer=SNAPSHOT_CHUNK_ROWS).execute(stmt)
+            changed: Dict[Any, tuple] = {}
+            if full:  # с DELETE открывается транзакция SQLite: пересоздание таблицы тоже откатится при ошибке
+                db.execute("DELETE FROM snapshot_meta WHERE name = ?", (name,))
+                self._create_table(db, table)
+            for part in result.partitions(SNAPSHOT_CHUNK_ROWS):
+                if token.cancelled:
+                    raise QueryCancelled()
+                rows = [tuple(r) for r in part]
+                db.executemany(f'INSERT OR REPLACE INTO "{name}" VALUES ({placeholders})',
+                               self._convert(rows, encoders))
+                if not full:
+                    changed.update((r[pk_index], r) for r in rows)
+            # после дельты локальных строк не меньше, чем на сервере: лишние — удалённые на сервере
+            server_rows = conn.execute(select(func.count()).select_from(table)).scalar()
+            deleted = set()
+            if db.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0] > server_rows:
+                server_pks = set(conn.execute(select(pk)).scalars())
+                deleted = {r[0] for r in db.execute(f'SELECT "{pk.name}" FROM "{name}"')} - server_pks
+                db.executemany(f'DELETE FROM "{name}" WHERE "{pk.name}" = ?', [(k,) for k in deleted])
+            max_pk = db.execute(f'SELECT max("{pk.name}") FROM "{name}"').fetchone()[0] or 0
+            synced_at = time.time()
+            db.execute("INSERT OR REPLACE INTO snapshot_meta VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (name, signature, watermark, max_pk, server_rows, synced_at, synced_at))
+            db.commit()
+            conn.rollback()  # транзакция только читала
+        delta = SnapshotDelta(name, changed, deleted, full or len(changed) + len(deleted) > server_rows // 2,
+                              synced_at, self._evict(keep=name))
+        message = "Снимок загружен целиком" if full else \
+            f"Снимок синхронизирован: изменено {len(changed)}, удалено {len(deleted)}"
+        if delta.evicted:
+            message += f"; вытеснены: {', '.join(delta.evicted)}"
+        log_event(message, op="snapshot", table=name, rows=server_rows if full else len(changed),
+                  elapsed=time.perf_counter() - started)
+        return delta
+
+    @staticmethod
+    def _size(db) -> int:
+        pages = db.execute("PRAGMA page_count").fetchone()[0] - db.execute("PRAGMA freelist_count").fetchone()[0]
+        return pages * db.execute("PRAGMA page_size").fetchone()[0]
+
+    def _evict(self, keep: str) -> List[str]:
+        """Пока файл больше max_bytes, удаляет таблицы в порядке давности открытия; keep — последней."""
+        evicted = []
+        with self._connect() as db:
+            names = [r[0] for r in db.execute("SELECT name FROM snapshot_meta ORDER BY name = ?, used_at", (keep,))]
+            for name in names:
+                if self._size(db) <= self.max_bytes:
+                    break
+                lock = self._locks.get(name)
+                if lock is not None and not lock.acquire(blocking=name == keep):
+                    continue  # таблица сейчас синхронизируется
+                try:
+                    db.execute(f'DROP TABLE IF EXISTS "{name}"')
+                    db.execute("DELETE FROM snapshot_meta WHERE name = ?", (name,))
+                    db.commit()
+                finally:
+                    if lock is not None:
+                        lock.release()
+                db.execute("PRAGMA incremental_vacuum")
+                evicted.append(name)
+        return evicted
+
+
+# -------------------------------
+# Живое обновление: приём NOTIFY
+# -------------------------------
+def merge_change(changes: Dict[str, Optional[Dict[str, set]]], notice: Dict[str, Any]):
+    """Добавляет уведомление триггера в пакет; более позднее действие над строкой побеждает."""
+    name = notice["table"]
+    if name in changes and changes[name] is None:
+        return
+    if notice.get("pks") is None:
+        changes[name] = None
+        return
+    entry = changes.setdefault(name, {"upsert": set(), "delete": set()})
+    pks = set(notice["pks"])
+    if notice["op"] == "DELETE":
+        entry["delete"] |= pks
+        entry["upsert"] -= pks
+    else:
+        entry["upsert"] |= pks
+        entry["delete"] -= pks
+
+
+class ChangeFeed:
+    """Отдельное (вне пула) соединение psycopg2, выполнившее LISTEN на канал триггеров."""
+    def __init__(self, engine: Engine):
+        self._raw = engine.raw_connection()
+        self._raw.detach()
+        self._conn = self._raw.dbapi_connection
+        self._conn.autocommit = True
+        with self._conn.cursor() as cur:
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+
+    def poll(self, timeout: float) -> List[Dict[str, Any]]:
+        """Ждёт уведомлений не дольше timeout секунд и возвращает их разобранными."""
+        if self._conn.notifies or select_module.select([self._conn], [], [], timeout)[0]:
+            self._conn.poll()
+        notices = [json.loads(n.payload) for n in self._conn.notifies]
+        self._conn.notifies.clear()
+        return notices
+
+    def close(self):
+        self._raw.close()
+
+
+class ChangeListener(QObject):
+    """Фоновый поток с ChangeFeed: собирает уведомления за interval секунд и отдаёт пакетом."""
+    changed = Signal(object)
+
+    def __init__(self, engine: Engine, parent=None, interval: float = 0.2):
+        super().__init__(parent)
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="change-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+
+    def _run(self):
+        feed = None
+        while not self._stop.is_set():
+            try:
+                if feed is None:
+                    feed = ChangeFeed(self.engine)
+                notices = feed.poll(0.5)
+                if not notices:
+                    continue
+                deadline = time.monotonic() + self.interval
+                while time.monotonic() < deadline:
+                    notices += feed.poll(max(deadline - time.monotonic(), 0))
+                changes: Dict[str, Optional[Dict[str, set]]] = {}
+                for notice in notices:
+                    merge_change(changes, notice)
+                self.changed.emit(changes)
+            except Exception as e:
+                log_event(f"Ошибка живого обновления: {e}", logging.ERROR, op="listen")
+                if feed is not None:
+                    try:
+                        feed.close()
+                    except Exception:
+                        pass
+                feed = None
+                self._stop.wait(5)  # переподключимся позже
+        if feed is not None:
+            feed.close()
@@ -0,0 +1,362 @@
+"""Запросы окна данных: фильтры на стороне сервера, полнотекстовый поиск, поиск по навыкам."""
+import re
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable
+import threading
+from collections import OrderedDict
+
+# ===== SQLAlchemy =====
+from sqlalchemy import Table, Column, String, select, func, bindparam, literal_column
+from sqlalchemy.engine import Engine
+
+from app_base import QueryCancelled, CancelToken
+from app_models import column_formatter
+from app_schema import ARRAY_TYPES, SEARCH_COLUMN, SEARCH_CONFIGS, SKILL_TABLE
+from app_transfer import convert_value
+
+
+# -------------------------------
+# Фильтры на стороне сервера (WHERE / ORDER BY / GROUP BY / HAVING)
+# -------------------------------
+FILTER_DEBOUNCE_MS = 400  # запрос уходит после паузы в наборе, а не на каждое нажатие
+FILTER_CHUNK_ROWS = 1000  # порция строк серверного курсора
+FILTER_MAX_ROWS = 100_000  # больше строк модель результата не держит
+FILTER_CACHE_SIZE = 128
+FILTER_AGGREGATES = {"count": func.count, "min": func.min, "max": func.max, "sum": func.sum, "avg": func.avg}
+
+
+_CONDITION_RE = re.compile(
+    r"^\s*(?P<target>\w+(?:\(\s*[\w*]*\s*\))?)\s*"
+    r"(?P<op>is\s+not\s+null|is\s+null|not\s+in\b|in\b|<=|>=|!=|<>|=|<|>|~)\s*(?P<value>.*?)\s*$",
+    re.IGNORECASE,
+)
+
+
+CONDITION_SEPARATOR = ";"  # единственный разделитель условий: значение (name ~ Tom and Jerry) берётся до него целиком
+
+
+class FilterError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Condition:
+    target: str  # столбец или агрегат: count, min(deadline)
+    op: str  # =, !=, <, <=, >, >=, ~ (подстрока), in, not in, is null, is not null
+    values: tuple = ()
+
+
+@dataclass
+class FilterQuery:
+    """Разобранный фильтр панели; значения условий уходят в запрос только параметрами."""
+    table: Table
+    columns: tuple = ()  # пусто — все столбцы
+    where: tuple = ()
+    order: tuple = ()  # ((цель, по убыванию), ...)
+    group: tuple = ()
+    having: tuple = ()
+
+    def is_empty(self) -> bool:
+        return not (self.columns or self.where or self.order or self.group or self.having)
+
+    def shape(self) -> tuple:
+        """Ключ кэша запросов: структура фильтра без значений (для in — без их числа)."""
+        return (self.table.name, self.columns, tuple((c.target, c.op) for c in self.where), self.order,
+                self.group, tuple((c.target, c.op) for c in self.having))
+
+    def params(self) -> Dict[str, Any]:
+        params = {}
+        for prefix, conditions in (("w", self.where), ("h", self.having)):
+            for i, cond in enumerate(conditions):
+                if cond.op in ("in", "not in"):
+                    params[f"{prefix}{i}"] = list(cond.values)
+                elif cond.values:
+                    params[f"{prefix}{i}"] = cond.values[0]
+        return params
+
+
+def _column(table: Table, name: str) -> Column:
+    if name not in table.c:
+        raise FilterError(f"нет столбца {name!r} в таблице {table.name}")
+    return table.c[name]
+
+
+def _split_aggregate(target: str):
+    """'min(deadline)' -> ('min', 'deadline'); 'count' / 'count(*)' -> ('count', None); столбец -> (None, имя)."""
+    target = target.replace(" ", "").lower() if "(" in target else target
+    if "(" not in target:
+        return ("count", None) if target.lower() == "count" else (None, target)
+    name, arg = target[:-1].split("(", 1)
+    if name not in FILTER_AGGREGATES:
+        raise FilterError(f"неизвестная агрегатная функция {name!r}")
+    if arg in ("", "*"):
+        if name != "count":
+            raise FilterError(f"{name}() требует столбец")
+        return "count", None
+    return name, arg
+
+
+def _convert(table: Table, target: str, op: str, raw: str, aggregate_ok: bool) -> tuple:
+    agg, name = _split_aggregate(target)
+    if agg is not None and not aggregate_ok:
+        raise FilterError(f"{target}: агрегаты допустимы только в HAVING и ORDER BY с GROUP BY")
+    if agg is None and aggregate_ok:
+        raise FilterError(f"{target}: в HAVING нужен агрегат, например count > 5 или max(deadline) < 2025-01-01")
+    col = _column(table, name) if name is not None else None
+    if op in ("is null", "is not null"):
+        return ()
+    if op == "~" and (agg is not None or not isinstance(col.type, String)):
+        raise FilterError(f"{target}: поиск подстроки (~) только по текстовым столбцам")
+    if col is not None and isinstance(col.type, ARRAY_TYPES):
+        raise FilterError(f"{target}: для массивов доступны только is null / is not null")
+    raws = [v.strip() for v in raw.split(",")] if op in ("in", "not in") else [raw.strip()]
+    values = []
+    for val in raws:
+        if val == "":
+            raise FilterError(f"{target} {op}: нет значения")
+        try:
+            if agg == "count":
+                values.append(int(val))
+            elif agg in ("sum", "avg"):
+                values.append(float(val))
+            else:
+                values.append(convert_value(col, val))
+        except (TypeError, ValueError) as e:
+            raise FilterError(f"{target}: {e}")
+    if op == "~":  # подстрока без учёта регистра: спецсимволы LIKE экранируются
+        escaped = values[0].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        values = [f"%{escaped}%"]
+    return tuple(values)
+
+
+def parse_conditions(table: Table, text_: str, aggregate_ok: bool = False) -> tuple:
+    """'status = Новая; deadline < 2025-01-01' -> (Condition, ...); условия, разделённые ";", соединяются по AND."""
+    conditions = []
+    for part in text_.split(CONDITION_SEPARATOR):
+        if not part.strip():
+            continue
+        match = _CONDITION_RE.match(part)
+        if match is None:
+            raise FilterError(f"не понято условие {part.strip()!r} (условия разделяются «;», пример: "
+                              f"status = Новая; deadline < 2025-01-01)")
+        op = " ".join(match["op"].lower().split())
+        op = "!=" if op == "<>" else op
+        target = match["target"]
+        if op in ("is null", "is not null") and match["value"]:
+            raise FilterError(f"{part.strip()!r}: после {op} значение не нужно")
+        conditions.append(Condition(target, op, _convert(table, target, op, match["value"], aggregate_ok)))
+    return tuple(conditions)
+
+
+def parse_filter(table: Table, column: str = "", where: str = "", order_by: str = "", group_by: str = "",
+                 having: str = "") -> FilterQuery:
+    """Проверяет поля панели фильтра по Table.columns и собирает FilterQuery; ошибки — FilterError."""
+    group = tuple(_column(table, g.strip()).name for g in group_by.split(",") if g.strip())
+    columns = (_column(table, column).name,) if column else ()
+    if group and columns:
+        raise FilterError("при GROUP BY выводятся столбцы группировки и агрегаты — выберите пустой столбец")
+    having_ = parse_conditions(table, having, aggregate_ok=True)
+    if having_ and not group:
+        raise FilterError("HAVING без GROUP BY")
+    order = []
+    for item in order_by.split(","):
+        words = item.split()
+        if not words:
+            continue
+        if len(words) > 2 or (len(words) == 2 and words[1].lower() not in ("asc", "desc")):
+            raise FilterError(f"ORDER BY: не понято {item.strip()!r} (пример: deadline desc, name)")
+        agg, name = _split_aggregate(words[0])
+        if group:
+            if agg is None and name not in group:
+                raise FilterError(f"ORDER BY {name}: при GROUP BY сортировать можно по группам и агрегатам")
+        elif agg is not None:
+            raise FilterError(f"ORDER BY {words[0]}: агрегат без GROUP BY")
+        if name is not None:
+            _column(table, name)
+        target = f"{agg}({name or ''})" if agg else name
+        order.append((target, len(words) == 2 and words[1].lower() == "desc"))
+    return FilterQuery(table, columns, parse_conditions(table, where), tuple(order), group, having_)
+
+
+def _target_expr(table: Table, target: str):
+    agg, name = _split_aggregate(target)
+    if agg is None:
+        return table.c[name]
+    return FILTER_AGGREGATES[agg](table.c[name]) if name else func.count()
+
+
+def _condition_expr(expr, cond: Condition, param: str, type_):
+    if cond.op == "is null":
+        return expr.is_(None)
+    if cond.op == "is not null":
+        return expr.is_not(None)
+    if cond.op in ("in", "not in"):
+        clause = expr.in_(bindparam(param, expanding=True, type_=type_))
+        return ~clause if cond.op == "not in" else clause
+    value = bindparam(param, type_=type_)
+    if cond.op == "~":
+        return expr.ilike(value, escape="\\")
+    return {"=": expr == value, "!=": expr != value, "<": expr < value, "<=": expr <= value,
+            ">": expr > value, ">=": expr >= value}[cond.op]
+
+
+def _aggregate_label(target: str) -> str:
+    agg, name = _split_aggregate(target)
+    return f"{agg}_{name}" if name else agg
+
+
+def build_filter_select(q: FilterQuery):
+    """SELECT с bindparam вместо значений: один и тот же объект подходит для любых значений той же формы."""
+    table = q.table
+    if q.group:
+        group_cols = [table.c[g] for g in q.group]
+        targets = ["count"] + [c.target for c in q.having] + [t for t, _ in q.order if "(" in t or t == "count"]
+        aggregates = {}
+        for target in targets:
+            aggregates.setdefault(_aggregate_label(target), _target_expr(table, target))
+        stmt = select(*group_cols, *(expr.label(label) for label, expr in aggregates.items())).group_by(*group_cols)
+    else:
+        stmt = select(*([table.c[c] for c in q.columns] or table.c))
+    for i, cond in enumerate(q.where):
+        col = table.c[cond.target]
+        stmt = stmt.where(_condition_expr(col, cond, f"w{i}", col.type))
+    for i, cond in enumerate(q.having):
+        agg, name = _split_aggregate(cond.target)
+        type_ = table.c[name].type if agg in ("min", "max") else None
+        stmt = stmt.having(_condition_expr(_target_expr(table, cond.target), cond, f"h{i}", type_))
+    order = []
+    for target, descending in q.order:
+        expr = _target_expr(table, target)
+        order.append(expr.desc().nulls_last() if descending else expr.asc().nulls_last())
+    if not q.group:
+        order += [c for c in table.primary_key.columns]  # устойчивый порядок при одинаковых значениях
+    return stmt.order_by(*order).limit(FILTER_MAX_ROWS + 1)  # лишняя строка — признак обрезки
+
+
+_filter_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+_filter_cache_lock = threading.Lock()
+
+
+def cached_filter_select(q: FilterQuery):
+    """build_filter_select с LRU-кэшем по форме фильтра.
+
+    Тот же объект Select даёт SQLAlchemy тот же ключ кэша компиляции, поэтому повторный
+    запрос той же формы не строится и не компилируется заново.
+    """
+    key = q.shape()
+    with _filter_cache_lock:
+        stmt = _filter_cache.get(key)
+        if stmt is not None:
+            _filter_cache.move_to_end(key)
+            return stmt
+    stmt = build_filter_select(q)
+    with _filter_cache_lock:
+        _filter_cache[key] = stmt
+        while len(_filter_cache) > FILTER_CACHE_SIZE:
+            _filter_cache.popitem(last=False)
+    return stmt
+
+
+def filter_headers(q: FilterQuery) -> tuple:
+    """Заголовки и форматтеры столбцов результата в порядке SELECT."""
+    stmt = cached_filter_select(q)
+    formatters = []
+    for col in stmt.selected_columns:
+        source = q.table.c.get(col.name)
+        formatters.append(column_formatter(source) if source is not None else
+                          (lambda v: "" if v is None else (f"{v:.2f}" if isinstance(v, float) else str(v))))
+    return [c.name for c in stmt.selected_columns], formatters
+
+
+def stream_select(engine: Engine, stmt, params: dict, token: "CancelToken", on_rows: Callable[[list], None],
+                   max_rows: int) -> tuple:
+    """Выполняет stmt серверным курсором и отдаёт строки порциями; возвращает (строк, обрезано ли)."""
+    total = 0
+    with engine.connect() as conn, token.bind(conn):
+        result = conn.execution_options(stream_results=True, max_row_buffer=FILTER_CHUNK_ROWS).execute(stmt, params)
+        for part in result.partitions(FILTER_CHUNK_ROWS):
+            if token.cancelled:
+                raise QueryCancelled()
+            rows = [tuple(r) for r in part]
+            if total + len(rows) > max_rows:
+                on_rows(rows[:max_rows - total])
+                return max_rows, True
+            total += len(rows)
+            on_rows(rows)
+    return total, False
+
+
+def stream_filter(engine: Engine, q: FilterQuery, token: "CancelToken", on_rows: Callable[[list], None]) -> tuple:
+    """Выполняет фильтр и отдаёт строки порциями; возвращает (строк, обрезано ли)."""
+    return stream_select(engine, cached_filter_select(q), q.params(), token, on_rows, FILTER_MAX_ROWS)
+
+
+# -------------------------------
+# Полнотекстовый поиск по задачам (tsvector + GIN)
+# -------------------------------
+SEARCH_LIMIT = 500
+SEARCH_DEBOUNCE_MS = 250
+
+
+def _search_query():
+    # запрос в каждой конфигурации: «отчёты» находит «отчёт», а «reports» — «report»
+    query = None
+    for config in SEARCH_CONFIGS:
+        part = func.websearch_to_tsquery(literal_column(f"'{config}'::regconfig"), bindparam("q"))
+        query = part if query is None else query.op("||")(part)
+    return query
+
+
+def build_search_select(task: Table, limit: int = SEARCH_LIMIT):
+    """Задачи, подходящие под запрос :q, по убыванию ts_rank; LIMIT — чтобы не читать всю таблицу."""
+    document, query = literal_column(f"task.{SEARCH_COLUMN}"), _search_query()
+    rank = func.ts_rank(document, query).label("rank")
+    return (select(*task.c, rank)
+            .where(document.op("@@")(query))
+            .order_by(rank.desc(), task.c.task_id)
+            .limit(limit))
+
+
+def search_headers(task: Table) -> tuple:
+    """Заголовки и форматтеры результата поиска: столбцы task и релевантность."""
+    return ([c.name for c in task.c] + ["rank"],
+            [column_formatter(c) for c in task.c] + [lambda v: f"{v:.3f}"])
+
+
+def stream_search(engine: Engine, task: Table, query: str, token: "CancelToken", on_rows: Callable[[list], None],
+                  limit: int = SEARCH_LIMIT) -> int:
+    """Ищет задачи и отдаёт строки порциями; возвращает число найденных (не больше limit)."""
+    total, _ = stream_select(engine, build_search_select(task, limit), {"q": query}, token, on_rows, limit)
+    return total
+
+
+# -------------------------------
+# Навыки сотрудников (GIN по skills, словарь навыков)
+# -------------------------------
+SKILL_SUGGESTIONS = 1000  # сколько самых частых навыков подгружать в подсказки
+
+
+def skill_dictionary(engine: Engine, tables: Dict[str, Table], limit: int = SKILL_SUGGESTIONS) -> List[tuple]:
+    """[(навык, сотрудников), ...] от самых частых."""
+    skill = tables["employee"].metadata.tables[SKILL_TABLE]
+    with engine.connect() as conn:
+        return [tuple(r) for r in conn.execute(
+            select(skill.c.name, skill.c.employees).order_by(skill.c.employees.desc(), skill.c.name).limit(limit))]
+
+
+def build_skills_select(employee: Table, skills: List[str], match_all: bool = True, duty: Optional[str] = None):
+    """Сотрудники со всеми навыками (skills @> ...) или хотя бы одним (skills && ...); оба идут по GIN."""
+    col = employee.c.skills
+    stmt = select(*employee.c)
+    if skills:
+        stmt = stmt.where(col.contains(skills) if match_all else col.overlap(skills))
+    if duty:
+        stmt = stmt.where(employee.c.duty == duty)
+    return stmt.order_by(employee.c.employee_id).limit(FILTER_MAX_ROWS + 1)
+
+
+def stream_skills(engine: Engine, employee: Table, skills: List[str], match_all: bool, duty: Optional[str],
+                  token: "CancelToken", on_rows: Callable[[list], None]) -> tuple:
+    """Ищет сотрудников по навыкам и отдаёт строки порциями; возвращает (строк, обрезано ли)."""
+    stmt = build_skills_select(employee, skills, match_all, duty)
+    return stream_select(engine, stmt, {}, token, on_rows, FILTER_MAX_ROWS)
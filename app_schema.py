@@ -0,0 +1,667 @@
+"""Схема БД: таблицы, триггеры, служебные функции и индексы; версии схемы (миграции)."""
+import logging
+from typing import Optional, List, Dict, Callable, Tuple
+import time
+
+# ===== SQLAlchemy =====
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, Date, CheckConstraint, insert, ForeignKeyConstraint, Boolean, text,
+    DDL, event, Index, DateTime, func, inspect, JSON,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.types import TypeDecorator
+
+from app_base import log_event
+from app_views import JOIN_VIEW_TABLE, attach_join_views, create_predefined_join_views
+
+
+# -------------------------------
+# Таблицы и ограничения
+# -------------------------------
+DUTIES = ('Frontend', 'Backend', 'DevOps', 'Teamlead', 'HR', 'PM', 'CEO')
+TASK_STATUSES = ('Новая', 'В работе', 'Можно проверять', 'Завершена')
+
+
+def normalize_tag(tag: str) -> str:
+    """' Machine  Learning ' -> 'machine learning': теги сравниваются как есть, поэтому храним одну форму."""
+    return " ".join(str(tag).split()).lower()
+
+
+def normalize_tags(tags) -> List[str]:
+    """Нормализует теги, убирает пустые и повторы (порядок первого появления сохраняется)."""
+    return list(dict.fromkeys(t for t in map(normalize_tag, tags) if t))
+
+
+class TagArray(TypeDecorator):
+    """ARRAY(String) с нормализацией тегов при записи — так GIN-индекс и словарь навыков не дробятся
+    на 'Python', 'python ' и 'PYTHON'."""
+    impl = ARRAY(String)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else normalize_tags(value)
+
+
+ARRAY_TYPES = (ARRAY, TagArray)
+
+
+def _sql_in(column: str, values) -> str:
+    return f"{column} IN ({', '.join(repr(v) for v in values)})"
+
+
+# те же CHECK-ограничения на стороне клиента: по ним проверяются строки массового импорта
+ROW_CHECKS: Dict[str, List[tuple]] = {
+    "employee": [
+        ("age", lambda v: v > 0, "age > 0"),
+        ("salary", lambda v: v > 0, "salary > 0"),
+        ("duty", lambda v: v in DUTIES, _sql_in("duty", DUTIES)),
+    ],
+    "task": [("status", lambda v: v in TASK_STATUSES, _sql_in("status", TASK_STATUSES))],
+    "project": [("prize", lambda v: v > 0, "prize > 0")],
+}
+
+
+def build_metadata() -> (MetaData, Dict[str, Table]):
+    md = MetaData()
+
+    employee = Table(
+        "employee", md,
+        Column("employee_id", Integer, primary_key=True, autoincrement=True),
+        Column("full_name", String(300), nullable=False),
+        Column("age", Integer, nullable=False),
+        Column("salary", Integer, nullable=False, info={"format": "money"}),
+        Column("duty", String(10), nullable=False),
+        Column("skills", TagArray(), info={"format": "tags"}),
+        CheckConstraint("age > 0", name="employee_age_check"),
+        CheckConstraint("salary > 0", name="employee_salary_check"),
+        CheckConstraint(_sql_in("duty", DUTIES)),
+        Index("ix_employee_skills", "skills", postgresql_using="gin"),  # skills @> / && массив
+    )
+
+    task = Table(
+        "task", md,
+        Column("task_id", Integer, primary_key=True, autoincrement=True),
+        Column("employee_id", Integer, nullable=False),
+        Column("name", String(300), nullable=False),
+        Column("description", String),
+        Column("deadline", Date),
+        Column("status", String(50), nullable=False),
+        CheckConstraint(_sql_in("status", TASK_STATUSES)),
+        ForeignKeyConstraint(["employee_id"], ["employee.employee_id"], name="fk_employee"),
+        Index("ix_task_employee_id", "employee_id"),
+        Index("ix_task_status_deadline", "status", "deadline"),
+    )
+
+    project = Table(
+        "project", md,
+        Column("project_id", Integer, primary_key=True, autoincrement=True),
+        Column("name", String(300), nullable=False),
+        Column("deadline", Date),
+        Column("prize", Integer, nullable=False, info={"format": "money"}),
+        Column("customer", String(500)),
+        Column("finished", Boolean, nullable=False),
+        CheckConstraint("prize > 0", name="project_prize_check"),
+    )
+    # незавершённые проекты по сроку — небольшая часть таблицы, частичный индекс
+    Index("ix_project_unfinished_deadline", project.c.deadline, postgresql_where=~project.c.finished)
+
+    project_task = Table(
+        "project_task", md,
+        Column("project_task_id", Integer, primary_key=True, autoincrement=True),
+        Column("project_id", Integer, nullable=False),
+        Column("task_id", Integer, nullable=False),
+        ForeignKeyConstraint(["project_id"], ["project.project_id"], name="fk_project"),
+        ForeignKeyConstraint(["task_id"], ["task.task_id"], name="fk_task"),
+        Index("ix_project_task_project_id", "project_id"),
+        Index("ix_project_task_task_id", "task_id"),
+    )
+
+    Table(
+        SCHEMA_VERSION_TABLE, md,  # применённые миграции (SCHEMA_MIGRATIONS), в окна не попадает
+        Column("version", Integer, primary_key=True, autoincrement=False),
+        Column("description", String(300), nullable=False),
+        Column("applied_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    )
+    Table(
+        SKILL_TABLE, md,  # словарь навыков для подсказок, ведётся триггерами employee; в окна не попадает
+        Column("name", String, primary_key=True),
+        Column("employees", Integer, nullable=False),
+    )
+    Table(
+        JOIN_VIEW_TABLE, md,  # сохранённые соединения мастера (материализованные представления jv_*)
+        Column("name", String(60), primary_key=True),
+        Column("title", String(300), nullable=False),
+        Column("definition", JSON, nullable=False),
+        Column("refresh_minutes", Integer, nullable=False),
+        Column("refreshed_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    )
+    add_summary_tables(md)
+    tables = {"employee": employee, "task": task, "project": project, "project_task": project_task}
+    attach_live_triggers(md, tables)
+    attach_search(md, tables)
+    attach_skill_dictionary(md, tables)
+    attach_join_views(md, tables)
+    attach_summaries(md, tables)
+    return md, tables
+
+
+# -------------------------------
+# Триггеры живого обновления (LISTEN/NOTIFY)
+# -------------------------------
+NOTIFY_CHANNEL = "outsource_changes"
+NOTIFY_MAX_PKS = 500  # больше изменённых строк в одном операторе — клиенту проще перечитать таблицу
+
+
+# в DDL знак % нужно удваивать
+NOTIFY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION outsource_notify_change() RETURNS trigger AS $$
+DECLARE
+    pks bigint[];
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        EXECUTE format('SELECT array_agg(%%I) FROM old_rows', TG_ARGV[0]) INTO pks;
+    ELSE
+        EXECUTE format('SELECT array_agg(%%I) FROM new_rows', TG_ARGV[0]) INTO pks;
+    END IF;
+    IF pks IS NULL THEN
+        RETURN NULL;
+    END IF;
+    IF cardinality(pks) > {NOTIFY_MAX_PKS} THEN
+        pks := NULL;
+    END IF;
+    PERFORM pg_notify('{NOTIFY_CHANNEL}',
+                      json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'pks', pks)::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def live_trigger_ddl(table: Table) -> List[str]:
+    """Операторные триггеры: один NOTIFY со списком первичных ключей на каждый INSERT/UPDATE/DELETE."""
+    pk = list(table.primary_key.columns)[0].name
+    transitions = {
+        "INSERT": "NEW TABLE AS new_rows",
+        "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        "DELETE": "OLD TABLE AS old_rows",
+    }
+    statements = []
+    for op, referencing in transitions.items():
+        trigger = f"{table.name}_notify_{op.lower()}"
+        statements.append(f"DROP TRIGGER IF EXISTS {trigger} ON {table.name}")
+        statements.append(
+            f"CREATE TRIGGER {trigger} AFTER {op} ON {table.name} REFERENCING {referencing} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION outsource_notify_change('{pk}')"
+        )
+    return statements
+
+
+def attach_live_triggers(md: MetaData, tables: Dict[str, Table]):
+    """Триггеры создаются вместе со схемой (create_all) — только для PostgreSQL."""
+    event.listen(md, "before_create", DDL(NOTIFY_FUNCTION_SQL).execute_if(dialect="postgresql"))
+    for table in tables.values():
+        for statement in live_trigger_ddl(table):
+            event.listen(table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+    event.listen(md, "after_drop",
+                 DDL("DROP FUNCTION IF EXISTS outsource_notify_change()").execute_if(dialect="postgresql"))
+
+
+def install_live_triggers(engine: Engine, tables: Dict[str, Table]):
+    """Устанавливает триггеры в уже существующую схему (без пересоздания таблиц)."""
+    with engine.begin() as conn:
+        conn.execute(DDL(NOTIFY_FUNCTION_SQL))
+        for table in tables.values():
+            for statement in live_trigger_ddl(table):
+                conn.execute(DDL(statement))
+
+
+def drop_and_create_schema_sa(engine: Engine, md: MetaData) -> bool:
+    try:
+        md.drop_all(engine)
+        md.create_all(engine)
+        _stamp_schema(engine, md, [m[:2] for m in SCHEMA_MIGRATIONS])  # новая схема уже содержит все миграции
+        return True
+    except SQLAlchemyError as e:
+        log_event(f"Ошибка пересоздания схемы: {e}", logging.ERROR, op="schema")
+        return False
+
+
+# -------------------------------
+# Полнотекстовый поиск: столбец task.search и GIN-индекс
+# -------------------------------
+SEARCH_COLUMN = "search"  # столбец task, который ведёт триггер; в метаданные не входит, модели его не видят
+SEARCH_INDEX = "ix_task_search"
+SEARCH_FUNCTION = "task_search_document"
+SEARCH_BACKFILL_ROWS = 5000  # строк в одной транзакции заполнения столбца у существующих задач
+SEARCH_CONFIGS = ("russian", "english")  # названия и описания бывают на обоих языках
+
+
+def _search_document_sql(row: str = "") -> str:
+    # явная конфигурация: документ не зависит от default_text_search_config сеанса
+    parts = [f"setweight(to_tsvector('{config}'::regconfig, coalesce({row}{column}, '')), '{weight}')"
+             for column, weight in (("name", "A"), ("description", "B")) for config in SEARCH_CONFIGS]
+    return " || ".join(parts)
+
+
+def search_ddl() -> List[str]:
+    """Столбец поиска по task.name и task.description и триггер, который его заполняет.
+
+    Столбец без значения по умолчанию добавляется только в каталог, без перезаписи таблицы
+    (в отличие от GENERATED ... STORED). Существующие строки заполняет backfill_search,
+    индекс строится отдельно (create_search_index).
+    """
+    return [
+        f"ALTER TABLE task ADD COLUMN IF NOT EXISTS {SEARCH_COLUMN} tsvector",
+        f"CREATE OR REPLACE FUNCTION {SEARCH_FUNCTION}() RETURNS trigger AS $$\n"
+        f"BEGIN\n    NEW.{SEARCH_COLUMN} := {_search_document_sql('NEW.')};\n    RETURN NEW;\nEND\n"
+        f"$$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS task_search ON task",
+        f"CREATE TRIGGER task_search BEFORE INSERT OR UPDATE OF name, description ON task "
+        f"FOR EACH ROW EXECUTE FUNCTION {SEARCH_FUNCTION}()",
+    ]
+
+
+def search_index_ddl() -> str:
+    return f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON task USING gin ({SEARCH_COLUMN})"
+
+
+def attach_search(md: MetaData, tables: Dict[str, Table]):
+    """Столбец и GIN-индекс поиска создаются вместе с таблицей task (create_all) — только для PostgreSQL."""
+    for statement in search_ddl() + [search_index_ddl()]:
+        event.listen(tables["task"], "after_create", DDL(statement).execute_if(dialect="postgresql"))
+    event.listen(md, "after_drop",
+                 DDL(f"DROP FUNCTION IF EXISTS {SEARCH_FUNCTION}()").execute_if(dialect="postgresql"))
+
+
+def backfill_search(engine: Engine, batch_rows: int = SEARCH_BACKFILL_ROWS) -> int:
+    """Заполняет столбец поиска у задач, записанных до триггера; возвращает число заполненных строк.
+
+    Пачки идут по task_id, каждая — отдельная транзакция: строки блокируются ненадолго и понемногу.
+    """
+    filled, after = 0, 0
+    while True:
+        with engine.begin() as conn:
+            upto = conn.execute(text("SELECT max(task_id) FROM (SELECT task_id FROM task WHERE task_id > :after "
+                                     "ORDER BY task_id LIMIT :n) AS batch"), {"after": after, "n": batch_rows}).scalar()
+            if upto is None:
+                return filled
+            filled += conn.execute(text(f"UPDATE task SET {SEARCH_COLUMN} = {_search_document_sql()} "
+                                        f"WHERE task_id > :after AND task_id <= :upto AND {SEARCH_COLUMN} IS NULL"),
+                                   {"after": after, "upto": upto}).rowcount
+        after = upto
+
+
+def create_search_index(engine: Engine) -> bool:
+    return _create_index_sql_concurrently(engine, SEARCH_INDEX, search_index_ddl())
+
+
+# -------------------------------
+# Словарь навыков (ведётся триггерами employee)
+# -------------------------------
+SKILL_TABLE = "skill"
+
+
+# словарь меняется на разность навыков изменённых строк, а не пересчитывается целиком
+SKILL_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION outsource_skill_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE {SKILL_TABLE} AS s SET employees = s.employees - d.n
+        FROM (SELECT tag, count(*) AS n FROM old_rows, unnest(old_rows.skills) AS tag GROUP BY tag) AS d
+        WHERE s.name = d.tag;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {SKILL_TABLE} (name, employees)
+        SELECT tag, count(*) FROM new_rows, unnest(new_rows.skills) AS tag GROUP BY tag
+        ON CONFLICT (name) DO UPDATE SET employees = {SKILL_TABLE}.employees + excluded.employees;
+    END IF;
+    DELETE FROM {SKILL_TABLE} WHERE employees <= 0;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def skill_trigger_ddl() -> List[str]:
+    """Операторные триггеры employee, которые ведут словарь навыков."""
+    transitions = {
+        "INSERT": "NEW TABLE AS new_rows",
+        "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        "DELETE": "OLD TABLE AS old_rows",
+    }
+    statements = []
+    for op, referencing in transitions.items():
+        trigger = f"employee_skills_{op.lower()}"
+        statements.append(f"DROP TRIGGER IF EXISTS {trigger} ON employee")
+        statements.append(f"CREATE TRIGGER {trigger} AFTER {op} ON employee REFERENCING {referencing} "
+                          f"FOR EACH STATEMENT EXECUTE FUNCTION outsource_skill_counts()")
+    return statements
+
+
+def attach_skill_dictionary(md: MetaData, tables: Dict[str, Table]):
+    """Функция и триггеры словаря создаются вместе со схемой (create_all) — только для PostgreSQL."""
+    event.listen(md, "before_create", DDL(SKILL_FUNCTION_SQL).execute_if(dialect="postgresql"))
+    for statement in skill_trigger_ddl():
+        event.listen(tables["employee"], "after_create", DDL(statement).execute_if(dialect="postgresql"))
+    event.listen(md, "after_drop",
+                 DDL("DROP FUNCTION IF EXISTS outsource_skill_counts()").execute_if(dialect="postgresql"))
+
+
+def install_skill_dictionary(engine: Engine):
+    """Триггеры словаря в уже существующей схеме и пересчёт словаря по текущим данным."""
+    with engine.begin() as conn:
+        conn.execute(DDL(SKILL_FUNCTION_SQL))
+        for statement in skill_trigger_ddl():
+            conn.execute(DDL(statement))
+        conn.exec_driver_sql("LOCK TABLE employee IN SHARE MODE")  # пока пересчитываем, навыки не меняются
+        conn.exec_driver_sql(f"DELETE FROM {SKILL_TABLE}")
+        conn.exec_driver_sql(f"INSERT INTO {SKILL_TABLE} (name, employees) "
+                             f"SELECT tag, count(*) FROM employee, unnest(skills) AS tag GROUP BY tag")
+
+
+# -------------------------------
+# Сводки для аналитики (ведутся триггерами)
+# -------------------------------
+DONE_STATUS = TASK_STATUSES[-1]  # остальные статусы — открытые задачи
+SUMMARY_TABLES = ("analytics_state", "employee_summary", "project_summary", "project_staff")
+
+
+def add_summary_tables(md: MetaData):
+    """Сводки по задачам: аналитика читает их, а не task/project_task; в окна таблиц не попадают."""
+    counts = lambda: [Column(name, Integer, nullable=False, server_default="0")  # noqa: E731
+                      for name in ("open_tasks", "overdue_tasks", "done_tasks")]
+    Table(
+        "analytics_state", md,  # одна строка: по какую дату (не включая) задачи уже посчитаны просроченными
+        Column("id", Integer, primary_key=True, autoincrement=False),
+        Column("overdue_as_of", Date, nullable=False),
+    )
+    Table("employee_summary", md, Column("employee_id", Integer, primary_key=True, autoincrement=False), *counts())
+    Table("project_summary", md, Column("project_id", Integer, primary_key=True, autoincrement=False), *counts())
+    Table(
+        "project_staff", md,  # кто с открытыми задачами работает на проекте — для ФОТ по проектам и заказчикам
+        Column("project_id", Integer, primary_key=True, autoincrement=False),
+        Column("employee_id", Integer, primary_key=True, autoincrement=False),
+        Column("open_tasks", Integer, nullable=False),
+    )
+
+
+def _summary_counts_sql(sign: str, task: str) -> str:
+    # просрочена — открыта и срок раньше $1 (analytics_state.overdue_as_of); NULL-срок не просрочен
+    return (f"{sign} * ({task}.status <> '{DONE_STATUS}')::int AS open, "
+            f"{sign} * (({task}.status <> '{DONE_STATUS}' AND {task}.deadline < $1) IS TRUE)::int AS overdue, "
+            f"{sign} * ({task}.status = '{DONE_STATUS}')::int AS done")
+
+
+_SUMMARY_UPSERT_SQL = """
+    {name} AS (
+        INSERT INTO {table} AS s ({key}, open_tasks, overdue_tasks, done_tasks)
+        SELECT {key}, sum(open), sum(overdue), sum(done) FROM c GROUP BY {key}
+        HAVING sum(open) <> 0 OR sum(overdue) <> 0 OR sum(done) <> 0
+        ON CONFLICT ({key}) DO UPDATE SET open_tasks = s.open_tasks + excluded.open_tasks,
+            overdue_tasks = s.overdue_tasks + excluded.overdue_tasks, done_tasks = s.done_tasks + excluded.done_tasks
+    )"""
+
+
+_STAFF_UPSERT_SQL = """
+    INSERT INTO project_staff AS s (project_id, employee_id, open_tasks)
+    SELECT project_id, employee_id, sum(open) FROM c GROUP BY project_id, employee_id HAVING sum(open) <> 0
+    ON CONFLICT (project_id, employee_id) DO UPDATE SET open_tasks = s.open_tasks + excluded.open_tasks"""
+
+
+# Каждая функция применяет разность строк оператора (new_rows минус old_rows) к сводкам.
+# Счётчики проектов относятся к связям project_task: задача попадает в project_summary, когда появляется
+# связь, и уходит, когда связь удаляют; изменения самой задачи переносятся через её текущие связи.
+# FOR SHARE на analytics_state: сдвиг даты просрочки (advance_overdue) и записи не идут одновременно.
+# В DDL знак % нужно удваивать.
+TASK_SUMMARY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION outsource_task_summary() RETURNS trigger AS $$
+DECLARE
+    as_of date;
+    delta text;
+    projects text := '';
+BEGIN
+    SELECT overdue_as_of INTO as_of FROM analytics_state WHERE id = 1 FOR SHARE;
+    delta := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT *, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT *, -1 AS sign FROM old_rows'
+        ELSE 'SELECT *, 1 AS sign FROM new_rows UNION ALL SELECT *, -1 FROM old_rows' END;
+    IF TG_OP = 'UPDATE' THEN
+        projects := $sql$,
+    l AS (SELECT l.project_id, c.* FROM c JOIN project_task l ON l.task_id = c.task_id),
+    {_SUMMARY_UPSERT_SQL.format(name="p", table="project_summary", key="project_id").replace("FROM c", "FROM l")}
+    $sql$;
+    END IF;
+    EXECUTE format($sql$
+    WITH c AS (SELECT d.task_id, d.employee_id, {_summary_counts_sql("d.sign", "d")} FROM (%%s) AS d),
+    {_SUMMARY_UPSERT_SQL.format(name="e", table="employee_summary", key="employee_id")}%%s
+    SELECT 1
+    $sql$, delta, projects) USING as_of;
+    IF TG_OP = 'UPDATE' THEN
+        EXECUTE format($sql$
+        WITH c AS (SELECT l.project_id, d.employee_id, {_summary_counts_sql("d.sign", "d")}
+                   FROM (%%s) AS d JOIN project_task l ON l.task_id = d.task_id)
+        {_STAFF_UPSERT_SQL}
+        $sql$, delta) USING as_of;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+LINK_SUMMARY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION outsource_link_summary() RETURNS trigger AS $$
+DECLARE
+    as_of date;
+    delta text;
+BEGIN
+    SELECT overdue_as_of INTO as_of FROM analytics_state WHERE id = 1 FOR SHARE;
+    delta := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT project_id, task_id, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT project_id, task_id, -1 AS sign FROM old_rows'
+        ELSE 'SELECT project_id, task_id, 1 AS sign FROM new_rows '
+             || 'UNION ALL SELECT project_id, task_id, -1 FROM old_rows' END;
+    EXECUTE format($sql$
+    WITH c AS (SELECT d.project_id, t.employee_id, {_summary_counts_sql("d.sign", "t")}
+               FROM (%%s) AS d JOIN task t ON t.task_id = d.task_id),
+    {_SUMMARY_UPSERT_SQL.format(name="p", table="project_summary", key="project_id")}
+    {_STAFF_UPSERT_SQL}
+    $sql$, delta) USING as_of;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def summary_trigger_ddl() -> List[Tuple[str, str]]:
+    """[(таблица, DDL), ...] операторных триггеров task и project_task, которые ведут сводки."""
+    statements = []
+    for table, function in (("task", "outsource_task_summary"), ("project_task", "outsource_link_summary")):
+        for op, referencing in (("INSERT", "NEW TABLE AS new_rows"),
+                                ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+                                ("DELETE", "OLD TABLE AS old_rows")):
+            trigger = f"{table}_summary_{op.lower()}"
+            statements.append((table, f"DROP TRIGGER IF EXISTS {trigger} ON {table}"))
+            statements.append((table, f"CREATE TRIGGER {trigger} AFTER {op} ON {table} REFERENCING {referencing} "
+                              f"FOR EACH STATEMENT EXECUTE FUNCTION {function}()"))
+    return statements
+
+
+SUMMARY_STATE_SQL = ("INSERT INTO analytics_state (id, overdue_as_of) VALUES (1, current_date) "
+                     "ON CONFLICT (id) DO NOTHING")
+
+
+def attach_summaries(md: MetaData, tables: Dict[str, Table]):
+    """Функции и триггеры сводок создаются вместе со схемой (create_all) — только для PostgreSQL."""
+    for function in (TASK_SUMMARY_FUNCTION_SQL, LINK_SUMMARY_FUNCTION_SQL):
+        event.listen(md, "before_create", DDL(function).execute_if(dialect="postgresql"))
+    event.listen(md.tables["analytics_state"], "after_create",
+                 DDL(SUMMARY_STATE_SQL).execute_if(dialect="postgresql"))
+    for table, statement in summary_trigger_ddl():
+        event.listen(tables[table], "after_create", DDL(statement).execute_if(dialect="postgresql"))
+    for function in ("outsource_task_summary", "outsource_link_summary"):
+        event.listen(md, "after_drop",
+                     DDL(f"DROP FUNCTION IF EXISTS {function}()").execute_if(dialect="postgresql"))
+
+
+def _rebuild_summaries(conn):
+    conn.exec_driver_sql("LOCK TABLE task, project_task IN SHARE MODE")  # пока пересчитываем, задачи не меняются
+    for name in SUMMARY_TABLES[1:]:
+        conn.exec_driver_sql(f"DELETE FROM {name}")
+    conn.exec_driver_sql(SUMMARY_STATE_SQL)
+    conn.exec_driver_sql("UPDATE analytics_state SET overdue_as_of = current_date")
+    counts = (f"count(*) FILTER (WHERE t.status <> '{DONE_STATUS}'), "
+              f"count(*) FILTER (WHERE t.status <> '{DONE_STATUS}' AND t.deadline < current_date), "
+              f"count(*) FILTER (WHERE t.status = '{DONE_STATUS}')")
+    conn.exec_driver_sql(f"INSERT INTO employee_summary SELECT t.employee_id, {counts} FROM task t "
+                         f"GROUP BY t.employee_id")
+    conn.exec_driver_sql(f"INSERT INTO project_summary SELECT l.project_id, {counts} "
+                         f"FROM project_task l JOIN task t ON t.task_id = l.task_id GROUP BY l.project_id")
+    conn.exec_driver_sql(f"INSERT INTO project_staff SELECT l.project_id, t.employee_id, count(*) "
+                         f"FROM project_task l JOIN task t ON t.task_id = l.task_id "
+                         f"WHERE t.status <> '{DONE_STATUS}' GROUP BY l.project_id, t.employee_id")
+
+
+def install_summaries(engine: Engine):
+    """Триггеры сводок в уже существующей схеме и пересчёт сводок по текущим данным."""
+    with engine.begin() as conn:
+        for function in (TASK_SUMMARY_FUNCTION_SQL, LINK_SUMMARY_FUNCTION_SQL):
+            conn.execute(DDL(function))
+        for _, statement in summary_trigger_ddl():
+            conn.execute(DDL(statement))
+        _rebuild_summaries(conn)
+
+
+# -------------------------------
+# Версии схемы (обновление без потери данных)
+# -------------------------------
+SCHEMA_VERSION_TABLE = "schema_version"
+SCHEMA_LOCK_ID = 0x6f7574  # pg_advisory_lock: схему обновляет только один клиент
+
+
+def create_index_concurrently(engine: Engine, index: Index) -> bool:
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS: запись в таблицу не блокируется на время построения.
+
+    Недостроенный (INVALID) индекс, оставшийся от прерванной попытки, удаляется и строится заново.
+    Возвращает False, если индекс уже был.
+    """
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+    return _create_index_sql_concurrently(engine, index.name, ddl)
+
+
+def _create_index_sql_concurrently(engine: Engine, name: str, ddl: str) -> bool:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        valid = conn.execute(text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                             {"name": name}).scalar()
+        if valid:
+            return False
+        if valid is not None:
+            conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY {name}")
+        conn.exec_driver_sql(ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1))
+    return True
+
+
+def _migrate_tables(engine: Engine, md: MetaData, tables: Dict[str, Table]):
+    md.create_all(engine, checkfirst=True)  # только отсутствующие таблицы (вместе с их индексами и триггерами)
+
+
+def _migrate_triggers(engine: Engine, md: MetaData, tables: Dict[str, Table]):
+    install_live_triggers(engine, tables)
+
+
+def _migrate_indexes(engine: Engine, md: MetaData, tables: Dict[str, Table]):
+    for table in tables.values():
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            create_index_concurrently(engine, index)
+
+
+def _migrate_search(engine: Engine, md: MetaData, tables: Dict[str, Table]):
+    with engine.begin() as conn:  # ACCESS EXCLUSIVE только на время изменения каталога
+        for statement in search_ddl():
+            conn.exec_driver_sql(statement)
+    backfill_search(engine)  # новые и изменённые строки уже заполняет триггер
+    create_search_index(engine)
+
+
+def _migrate_skills(engine: Engine, md: MetaData, tables: Dict[str, Table]):
+    md.tables[SKILL_TABLE].create(engine, checkfirst=True)
+    with engine.begin() as conn:  # навыки, записанные до нормализации: ' Python' и 'python' -> 'python'
+        conn.exec_driver_sql(
+            "UPDATE employee SET skills = ARRAY("
+            "SELECT tag FROM (SELECT lower(regexp_replace(btrim(s), '\\s+', ' ', 'g')) AS tag, min(i) AS i "
+            "FROM unnest(skills) WITH ORDINALITY AS u(s, i) GROUP BY 1) AS n WHERE tag <> '' ORDER BY i) "
+            "WHERE skills IS NOT NULL")
+    install_skill_dictionary(engine)
+    create_index_concurrently(engine, next(i for i in tables["employee"].indexes if i.name == "ix_employee_skills"))
+
+
+def _migrate_join_views(engine: Engine, md: MetaData, tables: Dict[str, Table]):
+    md.tables[JOIN_VIEW_TABLE].create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        create_predefined_join_views(conn, tables)
+
+
+def _migrate_summaries(engine: Engine, md: MetaData, tables: Dict[str, Table]):
+    for name in SUMMARY_TABLES:
+        md.tables[name].create(engine, checkfirst=True)
+    install_summaries(engine)
+
+
+# (версия, описание, функция); миграции идемпотентны — базы, созданные до появления версий, тоже доводятся
+SCHEMA_MIGRATIONS = (
+    (1, "Таблицы employee, task, project, project_task", _migrate_tables),
+    (2, "Триггеры живого обновления (LISTEN/NOTIFY)", _migrate_triggers),
+    (3, "Индексы внешних ключей, task (status, deadline), незавершённые проекты", _migrate_indexes),
+    (4, "Полнотекстовый поиск по задачам (tsvector + GIN)", _migrate_search),
+    (5, "Навыки: нормализация, GIN-индекс, словарь навыков", _migrate_skills),
+    (6, "Материализованные представления мастера соединений", _migrate_join_views),
+    (7, "Сводки для аналитики (нагрузка, просрочка, ФОТ)", _migrate_summaries),
+)
+
+
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+def schema_version(engine: Engine) -> int:
+    """Версия схемы в БД; 0 — таблицы версий нет (пустая база или схема старше версий)."""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(SCHEMA_VERSION_TABLE):
+            return 0
+        return conn.execute(text(f"SELECT coalesce(max(version), 0) FROM {SCHEMA_VERSION_TABLE}")).scalar()
+
+
+def _stamp_schema(engine: Engine, md: MetaData, migrations: List[tuple]):
+    versions = md.tables[SCHEMA_VERSION_TABLE]
+    with engine.begin() as conn:
+        conn.execute(insert(versions), [{"version": v, "description": d} for v, d in migrations])
+
+
+def upgrade_schema(engine: Engine, md: MetaData, tables: Dict[str, Table],
+                   progress: Optional[Callable[[str], None]] = None) -> List[int]:
+    """Применяет недостающие миграции SCHEMA_MIGRATIONS по порядку; данные не удаляются.
+
+    Возвращает номера применённых версий.
+    """
+    applied = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock:
+        lock.execute(text("SELECT pg_advisory_lock(:id)"), {"id": SCHEMA_LOCK_ID})
+        try:
+            md.tables[SCHEMA_VERSION_TABLE].create(engine, checkfirst=True)
+            current = schema_version(engine)
+            for version, description, migrate in SCHEMA_MIGRATIONS:
+                if version <= current:
+                    continue
+                if progress is not None:
+                    progress(description)
+                started = time.perf_counter()
+                migrate(engine, md, tables)
+                _stamp_schema(engine, md, [(version, description)])
+                log_event(f"Схема обновлена до версии {version}: {description}", op="migrate",
+                          elapsed=time.perf_counter() - started)
+                applied.append(version)
+        finally:
+            lock.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SCHEMA_LOCK_ID})
+    return applied
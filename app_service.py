@@ -0,0 +1,418 @@
+"""Служба без окон: JSON API над таблицами build_metadata на асинхронном движке SQLAlchemy (psycopg 3).
+
+Запуск:
+    python main_app_file.py serve --dbname outsource --http-port 8765
+
+Маршруты (HTTP/1.1 на локальном адресе, ответы — JSON):
+    GET  /health                      проверка соединения с БД
+    GET  /tables                      таблицы и столбцы
+    GET  /<table>?after=&limit=       страница по первичному ключу; next_after — ключ следующей страницы
+    GET  /<table>/filter?column=&where=&order_by=&group_by=&having=
+                                      фильтр в синтаксисе панели фильтра, строки отдаются потоком (chunked)
+    POST /<table>                     массив записей (у задач — с project_id); вставка одной транзакцией
+
+Одновременно к БД обращаются не больше ServiceConfig.max_concurrent запросов, остальные ждут
+в очереди до max_waiting; сверх неё служба сразу отвечает 503.
+"""
+import asyncio
+import json
+import logging
+import time
+import traceback
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional, Dict, List
+from urllib.parse import urlsplit, parse_qsl
+
+from sqlalchemy import Table, insert, select, text
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app_base import PgConfig, log_event
+from app_engine import QUERY_STATS, ROUND_TRIPS, attach_liveness, engine_url
+from app_schema import build_metadata
+from app_transfer import TASK_PROJECT_KEY, RowRejected, convert_value, validate_record
+from app_models import PAGE_SIZE
+from app_query import FILTER_CHUNK_ROWS, FILTER_MAX_ROWS, FilterError, cached_filter_select, parse_filter
+
+SERVICE_HOSTS = ("127.0.0.1", "localhost", "::1")  # API без авторизации, поэтому только локальные адреса
+FILTER_FIELDS = ("column", "where", "order_by", "group_by", "having")  # параметры parse_filter
+MAX_HEADERS = 100
+MAX_LINE = 64 * 1024  # байт в строке запроса и в заголовке (лимит StreamReader)
+HTTP_STATUS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 414: "URI Too Long", 431: "Request Header Fields Too Large",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+@dataclass
+class ServiceConfig:
+    host: str = "127.0.0.1"
+    port: int = 8765  # 0 — любой свободный
+    max_concurrent: int = 8  # запросов к БД одновременно; больше pool_size + max_overflow не бывает
+    max_waiting: int = 64  # запросов в очереди за соединением; сверх — 503
+    max_body: int = 16 * 1024 * 1024  # байт тела POST
+    max_page: int = 5000  # строк в странице
+    max_insert_rows: int = 50_000  # записей в одном POST
+
+
+# -------------------------------
+# Асинхронный движок
+# -------------------------------
+def make_async_engine(cfg: PgConfig) -> AsyncEngine:
+    """Движок asyncio (psycopg 3) с теми же настройками пула, проверкой соединений и замерами, что make_engine."""
+    engine = create_async_engine(engine_url(cfg, "psycopg"), pool_size=cfg.pool_size,
+                                 max_overflow=cfg.max_overflow, pool_timeout=cfg.pool_timeout,
+                                 pool_recycle=cfg.pool_recycle)
+    attach_liveness(engine.sync_engine, cfg.liveness_idle)
+    QUERY_STATS.attach(engine.sync_engine)
+    ROUND_TRIPS.attach(engine.sync_engine)
+    return engine
+
+
+async def prewarm_async_pool(engine: AsyncEngine, connections: int):
+    """Открывает connections соединений параллельно, проверяет одно и возвращает их в пул."""
+    opened = await asyncio.gather(*(engine.connect().start() for _ in range(max(connections, 1))))
+    try:
+        await opened[0].execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            await conn.close()
+
+
+def _json_value(val):
+    if isinstance(val, (date, datetime)):
+        return val.isoformat()
+    if isinstance(val, Decimal):  # avg() и sum() по numeric
+        return float(val)
+    raise TypeError(f"{type(val).__name__} не сериализуется в JSON")
+
+
+def _dumps(payload) -> str:
+    return json.dumps(payload, ensure_ascii=False, default=_json_value)
+
+
+# -------------------------------
+# HTTP поверх asyncio-потоков
+# -------------------------------
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Request:
+    method: str
+    path: List[str]  # /task/filter -> ["task", "filter"]
+    query: Dict[str, str]
+    headers: Dict[str, str]
+    body: bytes
+    keep_alive: bool
+
+
+async def _read_line(reader: asyncio.StreamReader, status: int, what: str) -> bytes:
+    # строка длиннее лимита StreamReader — ValueError (LimitOverrunError), а не частичная строка
+    try:
+        return await reader.readline()
+    except ValueError:
+        raise HttpError(status, f"{what} длиннее {MAX_LINE} байт")
+
+
+async def read_request(reader: asyncio.StreamReader, max_body: int) -> Optional[Request]:
+    """Следующий запрос соединения или None, если клиент закрыл соединение."""
+    line = await _read_line(reader, 414, "строка запроса")
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "не понята строка запроса")
+    headers = {}
+    while True:
+        line = await _read_line(reader, 431, "заголовок")
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(400, "слишком много заголовков")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", ""):
+        raise HttpError(400, "тело запроса передаётся только с Content-Length")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "неверный Content-Length")
+    if length > max_body:
+        raise HttpError(413, f"тело запроса больше {max_body} байт")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+    return Request(method.upper(), [p for p in url.path.split("/") if p], dict(parse_qsl(url.query)),
+                   headers, body, keep_alive)
+
+
+class Response:
+    """Ответ на один запрос: целиком (send) или потоком частей chunked (begin / write / end)."""
+    def __init__(self, writer: asyncio.StreamWriter, keep_alive: bool):
+        self.writer = writer
+        self.keep_alive = keep_alive
+        self.started = False
+
+    def _head(self, status: int, extra: str) -> bytes:
+        connection = "keep-alive" if self.keep_alive else "close"
+        return (f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\nConnection: {connection}\r\n{extra}\r\n"
+                ).encode("latin-1")
+
+    async def send(self, status: int, payload):
+        body = _dumps(payload).encode()
+        self.started = True
+        self.writer.write(self._head(status, f"Content-Length: {len(body)}\r\n") + body)
+        await self.writer.drain()
+
+    async def begin(self, status: int = 200):
+        self.started = True
+        self.writer.write(self._head(status, "Transfer-Encoding: chunked\r\n"))
+
+    async def write(self, data: str):
+        chunk = data.encode()
+        self.writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        await self.writer.drain()  # медленный клиент притормаживает чтение курсора, а не копит строки в памяти
+
+    async def end(self):
+        self.writer.write(b"0\r\n\r\n")
+        await self.writer.drain()
+
+
+class ConcurrencyLimit:
+    """Не больше limit запросов к БД одновременно, в очереди — не больше waiting; сверх — HttpError 503."""
+    def __init__(self, limit: int, waiting: int):
+        self._slots = asyncio.Semaphore(limit)
+        self.size = limit
+        self.max_waiting = waiting
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._slots.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HttpError(503, "служба перегружена, повторите запрос позже")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+# -------------------------------
+# Маршруты JSON API
+# -------------------------------
+class DataService:
+    """Обработчики маршрутов; соединение берётся из пула только на время запроса к БД."""
+    def __init__(self, engine: AsyncEngine, tables: Dict[str, Table], cfg: ServiceConfig, pool_limit: int):
+        self.engine = engine
+        self.t = tables
+        self.cfg = cfg
+        self.limit = ConcurrencyLimit(min(cfg.max_concurrent, pool_limit), cfg.max_waiting)
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader, self.cfg.max_body)
+                except HttpError as e:
+                    await Response(writer, False).send(e.status, {"error": str(e)})
+                    break
+                if request is None:
+                    break
+                response = Response(writer, request.keep_alive)
+                await self.dispatch(request, response)
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # клиент ушёл посреди запроса или ответа
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def dispatch(self, request: Request, response: Response):
+        started = time.perf_counter()
+        try:
+            await self.route(request, response)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise  # клиент ушёл: соединение закрывает serve_connection
+        except Exception as e:
+            status, message = self._error_status(e)
+            if status >= 500 and status != 503:  # перегрузку видно по ConcurrencyLimit.rejected, журнал не засоряется
+                detail = message if isinstance(e, (HttpError, SQLAlchemyError)) else self._describe(e)
+                log_event(f"Ошибка службы: {request.method} /{'/'.join(request.path)}: {detail}", logging.ERROR,
+                          op="serve", elapsed=time.perf_counter() - started)
+            if response.started:  # заголовки уже ушли: ошибка дописывается в конец потока
+                await response.write(f'], "error": {_dumps(message)}}}')
+                await response.end()
+            else:
+                await response.send(status, {"error": message})
+
+    @staticmethod
+    def _error_status(e: Exception) -> tuple:
+        if isinstance(e, HttpError):
+            return e.status, str(e)
+        if isinstance(e, IntegrityError):
+            return 409, str(e.orig).strip()
+        if isinstance(e, SQLAlchemyError):
+            return 500, str(getattr(e, "orig", None) or e).strip()
+        if isinstance(e, (FilterError, RowRejected, ValueError)):
+            return 400, str(e)
+        return 500, "внутренняя ошибка службы"  # подробности только в журнале
+
+    @staticmethod
+    def _describe(e: Exception) -> str:
+        frame = traceback.extract_tb(e.__traceback__)[-1]
+        return f"{type(e).__name__}: {e} ({frame.filename}:{frame.lineno})"
+
+    def _table(self, name: str) -> Table:
+        if name not in self.t:
+            raise HttpError(404, f"нет таблицы {name!r}")
+        return self.t[name]
+
+    async def route(self, request: Request, response: Response):
+        path, method = request.path, request.method
+        if path == ["health"] and method == "GET":
+            async with self.limit.slot(), self.engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            return await response.send(200, {"status": "ok"})
+        if path == ["tables"] and method == "GET":
+            return await response.send(200, {name: [{"name": c.name, "type": str(c.type), "nullable": c.nullable,
+                                                     "primary_key": c.primary_key} for c in table.columns]
+                                             for name, table in self.t.items()})
+        if len(path) == 1 and method == "GET":
+            return await self.page(self._table(path[0]), request, response)
+        if len(path) == 1 and method == "POST":
+            return await self.insert(self._table(path[0]), request, response)
+        if len(path) == 2 and path[1] == "filter" and method == "GET":
+            return await self.filter(self._table(path[0]), request, response)
+        if len(path) in (1, 2) and path[0] in self.t:
+            raise HttpError(405, f"метод {method} не поддерживается")
+        raise HttpError(404, "нет такого маршрута")
+
+    async def page(self, table: Table, request: Request, response: Response):
+        """Страница по первичному ключу (keyset): after — последний ключ предыдущей страницы."""
+        pk = list(table.primary_key.columns)[0]
+        try:
+            limit = min(max(int(request.query.get("limit", PAGE_SIZE)), 1), self.cfg.max_page)
+        except ValueError:
+            raise HttpError(400, "limit — целое число")
+        stmt = select(table).order_by(pk).limit(limit)
+        after = request.query.get("after")
+        if after:
+            stmt = stmt.where(pk > convert_value(pk, after))
+        async with self.limit.slot(), self.engine.connect() as conn:
+            rows = (await conn.execute(stmt)).all()
+        next_after = getattr(rows[-1], pk.name) if len(rows) == limit else None
+        await response.send(200, {"columns": [c.name for c in table.columns], "rows": [list(r) for r in rows],
+                                  "next_after": next_after})
+
+    async def filter(self, table: Table, request: Request, response: Response):
+        """Фильтр панели (parse_filter) серверным курсором; строки уходят клиенту по мере чтения."""
+        q = parse_filter(table, **{name: request.query.get(name, "") for name in FILTER_FIELDS})
+        stmt = cached_filter_select(q)
+        total, truncated = 0, False
+        async with self.limit.slot(), self.engine.connect() as conn:
+            result = await conn.stream(stmt, q.params())
+            await response.begin()
+            await response.write(f'{{"columns": {_dumps([c.name for c in stmt.selected_columns])}, "rows": [')
+            async for part in result.partitions(FILTER_CHUNK_ROWS):
+                rows = [list(r) for r in part][:FILTER_MAX_ROWS - total]
+                truncated = total + len(part) > FILTER_MAX_ROWS
+                if rows:
+                    await response.write(("," if total else "") + _dumps(rows)[1:-1])
+                    total += len(rows)
+                if truncated:
+                    break
+        await response.write(f'], "count": {total}, "truncated": {_dumps(truncated)}}}')
+        await response.end()
+
+    def _records(self, table: Table, request: Request) -> tuple:
+        """Тело POST -> (значения для INSERT, project_id задач); записи проверяются validate_record."""
+        try:
+            records = json.loads(request.body or b"[]")
+        except ValueError as e:
+            raise HttpError(400, f"тело не JSON: {e}")
+        if isinstance(records, dict):
+            records = records.get("records")
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise HttpError(400, "ожидается массив записей JSON или {\"records\": [...]}")
+        if len(records) > self.cfg.max_insert_rows:
+            raise HttpError(413, f"больше {self.cfg.max_insert_rows} записей в одном запросе")
+        values, projects = [], []
+        for i, record in enumerate(records):
+            try:
+                row = validate_record(table, record)
+                project_id = record.get(TASK_PROJECT_KEY) if table.name == "task" else None
+                projects.append(None if project_id in (None, "") else int(project_id))
+            except (RowRejected, TypeError, ValueError) as e:
+                raise HttpError(400, f"запись {i}: {e}")
+            values.append(row)
+        if len({tuple(sorted(row)) for row in values}) > 1:
+            raise HttpError(400, "у всех записей одного запроса должен быть одинаковый набор полей")
+        return values, projects
+
+    async def insert(self, table: Table, request: Request, response: Response):
+        """Записи одной транзакцией пачками insertmanyvalues; связи задач с проектами — в той же транзакции."""
+        values, projects = self._records(table, request)
+        started = time.perf_counter()
+        rows, links = [], []
+        if values:
+            async with self.limit.slot(), self.engine.begin() as conn:
+                stmt = insert(table).returning(*table.c, sort_by_parameter_order=True)
+                rows = (await conn.execute(stmt, values)).all()
+                link_values = [{"project_id": p, "task_id": row.task_id}
+                               for p, row in zip(projects, rows) if p is not None]
+                if link_values:
+                    link = self.t["project_task"]
+                    links = (await conn.execute(insert(link).returning(*link.c, sort_by_parameter_order=True),
+                                                link_values)).all()
+            log_event(f"Вставка через службу, связей с проектами: {len(links)}", op="insert_many",
+                      table=table.name, rows=len(rows), elapsed=time.perf_counter() - started)
+        await response.send(201, {"columns": [c.name for c in table.columns], "rows": [list(r) for r in rows],
+                                  "links": [list(r) for r in links]})
+
+
+# -------------------------------
+# Запуск
+# -------------------------------
+async def run_service(cfg: PgConfig, service: ServiceConfig, started: Optional[asyncio.Future] = None):
+    """Слушает service.host:port до отмены; в started (если задан) приходит фактический порт."""
+    engine = make_async_engine(cfg)
+    try:
+        await prewarm_async_pool(engine, min(cfg.pool_prewarm, cfg.pool_size))
+        _, tables = build_metadata()
+        app = DataService(engine, tables, service, cfg.pool_size + cfg.max_overflow)
+        server = await asyncio.start_server(app.serve_connection, service.host, service.port, limit=MAX_LINE)
+        port = server.sockets[0].getsockname()[1]
+        log_event(f"Служба JSON API: http://{service.host}:{port} => {cfg.host}:{cfg.port}/{cfg.dbname}, "
+                  f"одновременно {app.limit.size} запросов", op="serve")
+        if started is not None:
+            started.set_result(port)
+        async with server:
+            await server.serve_forever()
+    finally:
+        await engine.dispose()
+
+
+def serve(cfg: PgConfig, service: ServiceConfig) -> int:
+    if service.host not in SERVICE_HOSTS:
+        raise ValueError(f"служба без авторизации слушает только локальный адрес ({', '.join(SERVICE_HOSTS)})")
+    with suppress(KeyboardInterrupt):
+        asyncio.run(run_service(cfg, service))
+    log_event("Служба JSON API остановлена.", op="serve")
+    return 0
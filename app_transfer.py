@@ -0,0 +1,514 @@
+"""Перенос данных: массовый импорт (COPY), потоковый экспорт, пакетная запись."""
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable
+from datetime import date
+import csv
+import io
+import json
+import time
+from contextlib import contextmanager
+
+# ===== SQLAlchemy =====
+from sqlalchemy import Table, Column, Integer, Date, select, insert, Boolean, text, literal, bindparam, any_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app_base import log_event, QueryCancelled, CancelToken
+from app_engine import ROUND_TRIPS, write_engine
+from app_schema import ARRAY_TYPES, ROW_CHECKS, normalize_tags
+
+
+# -------------------------------
+# Массовый импорт (COPY ... FROM STDIN)
+# -------------------------------
+IMPORT_CHUNK_ROWS = 5000
+TASK_PROJECT_KEY = "project_id"  # необязательное поле строки задачи: сразу создаётся связь project_task
+
+
+class RowRejected(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    table: str
+    inserted: int = 0
+    linked: int = 0
+    rejected: int = 0
+    reject_path: Optional[str] = None
+    elapsed: float = 0.0
+
+
+def read_records(path: str):
+    """Записи файла как словари: .jsonl — по объекту JSON в строке, иначе CSV с заголовком."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _parse_bool(val) -> bool:
+    if isinstance(val, bool):
+        return val
+    lowered = str(val).strip().lower()
+    if lowered in ("1", "t", "true", "yes", "y", "да"):
+        return True
+    if lowered in ("0", "f", "false", "no", "n", "нет"):
+        return False
+    raise ValueError(f"не логическое значение: {val!r}")
+
+
+def parse_tags(val) -> List[str]:
+    """Навыки из строки "#a#b", литерала массива Postgres "{a,b}" или списка — нормализованные, без повторов."""
+    if isinstance(val, list):
+        return normalize_tags(val)
+    val = str(val)
+    if val.startswith("{") and val.endswith("}"):  # литерал массива Postgres, как в CSV-экспорте: {SQL,"C++"}
+        inner = val[1:-1]
+        if not inner:
+            return []
+        reader = csv.reader([inner], escapechar="\\", doublequote=False)
+        return normalize_tags(next(reader))
+    return normalize_tags(val.split("#")[1:])  # тот же формат, что в окне ввода: #SQL#Python
+
+
+def convert_value(col: Column, val):
+    """Значение из CSV/JSON -> значение Python для столбца col (пустая строка = NULL)."""
+    if val is None or val == "":
+        return None
+    if isinstance(col.type, ARRAY_TYPES):
+        return parse_tags(val)
+    if isinstance(col.type, Boolean):
+        return _parse_bool(val)
+    if isinstance(col.type, Integer):
+        return int(val)
+    if isinstance(col.type, Date):
+        return val if isinstance(val, date) else date.fromisoformat(str(val))
+    val = str(val)
+    if getattr(col.type, "length", None) and len(val) > col.type.length:
+        raise ValueError(f"длиннее {col.type.length} символов")
+    return val
+
+
+def validate_record(table: Table, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Приводит запись к типам столбцов и проверяет NOT NULL и CHECK-ограничения (ROW_CHECKS)."""
+    row = {}
+    for col in table.columns:
+        if col.name not in record:
+            continue
+        try:
+            row[col.name] = convert_value(col, record[col.name])
+        except (TypeError, ValueError) as e:
+            raise RowRejected(f"{col.name}: {e}")
+    for col in table.columns:
+        if not col.nullable and row.get(col.name) is None and not (col.primary_key and col.autoincrement):
+            raise RowRejected(f"{col.name}: NOT NULL")
+    for name, check, description in ROW_CHECKS.get(table.name, []):
+        if row.get(name) is not None and not check(row[name]):
+            raise RowRejected(f"CHECK ({description})")
+    return row
+
+
+def _copy_literal(val) -> str:
+    if val is None:
+        return "\\N"
+    if isinstance(val, bool):
+        return "t" if val else "f"
+    if isinstance(val, (list, tuple)):
+        items = ('"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for v in val)
+        return "{" + ",".join(items) + "}"
+    if isinstance(val, date):
+        return val.isoformat()
+    return str(val)
+
+
+def copy_rows(conn, table: Table, columns: List[str], rows: List[Dict[str, Any]]):
+    """COPY table (columns) FROM STDIN в формате CSV через соединение драйвера."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([_copy_literal(row.get(c)) for c in columns])
+    buf.seek(0)
+    cols = ", ".join(columns)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+    finally:
+        cursor.close()
+
+
+class BulkImporter:
+    """Потоковая загрузка записей в таблицу build_metadata пачками через COPY.
+
+    Каждая пачка — отдельная транзакция. Строки, не прошедшие проверку, и строки, на которых
+    упал COPY (пачка делится пополам до виновной строки), пишутся в файл отказов (JSONL).
+    Для задач поле project_id создаёт связь project_task в той же транзакции; оно разбирается
+    вместе с проверкой строки, и нечисловое значение отклоняет только эту строку.
+    """
+    def __init__(self, engine: Engine, tables: Dict[str, Table], name: str,
+                 chunk_rows: int = IMPORT_CHUNK_ROWS, progress: Optional[Callable[[int], None]] = None):
+        self.engine = engine
+        self.tables = tables
+        self.table = tables[name]
+        self.chunk_rows = chunk_rows
+        self.progress = progress
+        self.pk_col = list(self.table.primary_key.columns)[0]
+        self.result = ImportResult(name)
+        self._rejects = None
+
+    def run(self, records, reject_path: str) -> ImportResult:
+        started = time.perf_counter()
+        self.result.reject_path = reject_path
+        try:
+            chunk: List[tuple] = []  # (исходная запись, проверенная строка, project_id или None)
+            for record in records:
+                try:
+                    chunk.append((record, validate_record(self.table, record), self._project_id(record)))
+                except RowRejected as e:
+                    self._reject(record, str(e))
+                if len(chunk) >= self.chunk_rows:
+                    self._load_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self._load_chunk(chunk)
+        finally:
+            if self._rejects is not None:
+                self._rejects.close()
+        self.result.elapsed = time.perf_counter() - started
+        return self.result
+
+    def _reject(self, record: Dict[str, Any], error: str):
+        if self._rejects is None:
+            self._rejects = open(self.result.reject_path, "w", encoding="utf-8")
+        self._rejects.write(json.dumps({"error": error, "record": record}, ensure_ascii=False, default=str) + "\n")
+        self.result.rejected += 1
+
+    def _project_id(self, record: Dict[str, Any]) -> Optional[int]:
+        if self.table.name != "task":
+            return None
+        try:
+            return convert_value(self.tables["project"].c.project_id, record.get(TASK_PROJECT_KEY))
+        except (TypeError, ValueError) as e:
+            raise RowRejected(f"{TASK_PROJECT_KEY}: {e}")
+
+    def _load_chunk(self, chunk: List[tuple]):
+        chunk = self._check_foreign_keys(chunk)
+        if not chunk:
+            return
+        if any(project_id is not None for _, _, project_id in chunk):
+            self._assign_ids([row for _, row, _ in chunk if row.get(self.pk_col.name) is None])
+        self._copy_or_split(chunk)
+        if self.progress is not None:
+            self.progress(self.result.inserted + self.result.rejected)
+
+    def _check_foreign_keys(self, chunk: List[tuple]) -> List[tuple]:
+        """Отбрасывает строки со ссылками на несуществующие записи (одним запросом на внешний ключ)."""
+        # значения уже приведены к int: внешние ключи — validate_record, project_id — _project_id
+        refs = [(fk.column_keys[0], fk.elements[0].column, lambda entry, key=fk.column_keys[0]: entry[1].get(key))
+                for fk in self.table.foreign_key_constraints]
+        if self.table.name == "task":
+            refs.append((TASK_PROJECT_KEY, self.tables["project"].c.project_id, lambda entry: entry[2]))
+        with self.engine.connect() as conn:
+            for key, ref_col, value in refs:
+                wanted = {value(entry) for entry in chunk} - {None}
+                if not wanted:
+                    continue
+                found = set(conn.execute(select(ref_col).where(ref_col.in_(wanted))).scalars())
+                kept = []
+                for entry in chunk:
+                    val = value(entry)
+                    if val is not None and val not in found:
+                        self._reject(entry[0], f"{key}: нет записи {ref_col.table.name} с id {val}")
+                    else:
+                        kept.append(entry)
+                chunk = kept
+        return chunk
+
+    def _assign_ids(self, rows: List[Dict[str, Any]]):
+        # COPY не возвращает сгенерированные ключи, поэтому берём их из последовательности заранее
+        if not rows:
+            return
+        with self.engine.connect() as conn:
+            ids = conn.execute(
+                text("SELECT nextval(pg_get_serial_sequence(:t, :c)) FROM generate_series(1, :n)"),
+                {"t": self.table.name, "c": self.pk_col.name, "n": len(rows)},
+            ).scalars().all()
+        for row, new_id in zip(rows, ids):
+            row[self.pk_col.name] = new_id
+
+    def _copy_or_split(self, chunk: List[tuple]):
+        try:
+            self._copy_chunk(chunk)
+        except SQLAlchemyError as e:
+            if len(chunk) == 1:
+                self._reject(chunk[0][0], str(getattr(e, "orig", e)).strip())
+                return
+            middle = len(chunk) // 2
+            self._copy_or_split(chunk[:middle])
+            self._copy_or_split(chunk[middle:])
+
+    def _copy_chunk(self, chunk: List[tuple]):
+        rows = [row for _, row, _ in chunk]
+        columns = [c.name for c in self.table.columns if any(c.name in row for row in rows)]
+        links = [{"project_id": project_id, "task_id": row["task_id"]}
+                 for _, row, project_id in chunk if project_id is not None]
+        try:
+            with self.engine.begin() as conn:
+                copy_rows(conn, self.table, columns, rows)
+                if links:
+                    copy_rows(conn, self.tables["project_task"], ["project_id", "task_id"], links)
+        except Exception as e:
+            if isinstance(e, SQLAlchemyError):
+                raise
+            raise SQLAlchemyError(str(e)) from e  # ошибки драйвера из copy_expert не оборачиваются SQLAlchemy
+        self.result.inserted += len(rows)
+        self.result.linked += len(links)
+
+
+def import_file(engine: Engine, tables: Dict[str, Table], name: str, path: str,
+                reject_path: Optional[str] = None, **kwargs) -> ImportResult:
+    importer = BulkImporter(engine, tables, name, **kwargs)
+    result = importer.run(read_records(path), reject_path or path + ".rejected.jsonl")
+    log_event(f"Импорт {path} -> {name}: связей {result.linked}, отклонено {result.rejected}",
+              op="import", table=name, rows=result.inserted, elapsed=result.elapsed)
+    return result
+
+
+# -------------------------------
+# Потоковый экспорт (COPY ... TO STDOUT / серверный курсор)
+# -------------------------------
+EXPORT_BUFFER_ROWS = 2000  # сколько строк JSONL-выгрузки одновременно держит клиент
+EXPORT_FORMATS = ("csv", "jsonl")
+TASK_PROJECT_EXPORT = "task_project"  # задачи вместе с проектами, к которым они привязаны
+
+
+@dataclass
+class ExportResult:
+    source: str
+    path: str
+    rows: int = 0
+    elapsed: float = 0.0
+
+
+def export_sources(tables: Dict[str, Table]) -> List[str]:
+    return [*tables, TASK_PROJECT_EXPORT]
+
+
+def export_select(tables: Dict[str, Table], source: str):
+    """Запрос выгрузки: таблица целиком по первичному ключу или задачи, соединённые с проектами."""
+    if source == TASK_PROJECT_EXPORT:
+        task, project, link = tables["task"], tables["project"], tables["project_task"]
+        joined = task.outerjoin(link, link.c.task_id == task.c.task_id) \
+            .outerjoin(project, project.c.project_id == link.c.project_id)
+        return select(
+            *task.c, project.c.project_id, project.c.name.label("project_name"),
+            project.c.deadline.label("project_deadline"), project.c.prize, project.c.customer, project.c.finished,
+        ).select_from(joined).order_by(task.c.task_id, project.c.project_id)
+    table = tables[source]
+    return select(table).order_by(*table.primary_key.columns)
+
+
+def export_format(path: str, fmt: Optional[str] = None) -> str:
+    if fmt:
+        return fmt
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+class _CountingSink:
+    """Приёмник для copy_expert: пишет байты в файл и сообщает о прогрессе каждые every строк."""
+    def __init__(self, f, progress: Optional[Callable[[int], None]], every: int):
+        self.f = f
+        self.progress = progress
+        self.every = every
+        self.rows = -1  # первая строка — заголовок CSV
+        self._reported = 0
+
+    def write(self, data):
+        self.f.write(data)
+        self.rows += data.count(b"\n")  # многострочные значения дают завышенную, но монотонную оценку
+        if self.progress is not None and self.rows - self._reported >= self.every:
+            self._reported = self.rows
+            self.progress(self.rows)
+
+
+def _copy_to_csv(conn, stmt, f, progress, every: int) -> int:
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    sink = _CountingSink(f, progress, every)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", sink)
+        return cursor.rowcount if cursor.rowcount >= 0 else sink.rows
+    except Exception as e:
+        if isinstance(e, SQLAlchemyError):
+            raise
+        raise SQLAlchemyError(str(e)) from e
+    finally:
+        cursor.close()
+
+
+def _stream_to_jsonl(conn, stmt, f, progress, every: int, token: "CancelToken") -> int:
+    # серверный курсор: драйвер получает строки порциями по every, а не весь результат сразу
+    result = conn.execution_options(stream_results=True, max_row_buffer=every).execute(stmt)
+    rows = 0
+    for part in result.mappings().partitions(every):
+        if token.cancelled:
+            raise QueryCancelled()
+        for row in part:
+            f.write(json.dumps(dict(row), ensure_ascii=False, default=str) + "\n")
+        rows += len(part)
+        if progress is not None:
+            progress(rows)
+    return rows
+
+
+def export_data(engine: Engine, tables: Dict[str, Table], source: str, path: str,
+                fmt: Optional[str] = None, token: Optional["CancelToken"] = None,
+                progress: Optional[Callable[[int], None]] = None,
+                buffer_rows: int = EXPORT_BUFFER_ROWS) -> ExportResult:
+    """Выгружает source (таблица или TASK_PROJECT_EXPORT) в CSV (COPY TO STDOUT) или JSONL (серверный курсор).
+
+    Память клиента не зависит от размера таблицы. Файл пишется во временный path.part
+    и переименовывается только после успешной выгрузки.
+    """
+    fmt = export_format(path, fmt)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"неизвестный формат выгрузки: {fmt}")
+    token = token or CancelToken()
+    stmt = export_select(tables, source)
+    result = ExportResult(source, path)
+    started = time.perf_counter()
+    part_path = Path(path + ".part")
+    try:
+        with engine.connect() as conn, token.bind(conn):
+            if fmt == "csv":
+                with open(part_path, "wb") as f:
+                    result.rows = _copy_to_csv(conn, stmt, f, progress, buffer_rows)
+            else:
+                with open(part_path, "w", encoding="utf-8") as f:
+                    result.rows = _stream_to_jsonl(conn, stmt, f, progress, buffer_rows, token)
+        part_path.replace(path)
+    except Exception:
+        part_path.unlink(missing_ok=True)
+        if token.cancelled:
+            raise QueryCancelled()
+        raise
+    result.elapsed = time.perf_counter() - started
+    if progress is not None:
+        progress(result.rows)
+    log_event(f"Экспорт {source} -> {path}", op="export", table=source, rows=result.rows, elapsed=result.elapsed)
+    return result
+
+
+# -------------------------------
+# Слой записи (INSERT ... RETURNING пачками)
+# -------------------------------
+WRITE_BATCH_ROWS = 1000  # строк в одном многострочном INSERT (insertmanyvalues)
+
+
+class WriteRepository:
+    """Все вставки окон и скриптов: одна строка — один оператор, список записей — пачки по WRITE_BATCH_ROWS.
+
+    Задача и её связь с проектом вставляются одним оператором (CTE с INSERT),
+    поэтому задача без связи не может остаться в БД.
+    """
+    def __init__(self, engine: Engine, tables: Dict[str, Table], batch_rows: int = WRITE_BATCH_ROWS):
+        self.engine = write_engine(engine)
+        self.t = tables
+        self.batch_rows = batch_rows
+        self.pipelined = self.engine.dialect.driver == "psycopg"
+
+    def _begin(self):
+        return self.engine.execution_options(insertmanyvalues_page_size=self.batch_rows).begin()
+
+    @contextmanager
+    def _pipeline(self, conn):
+        """Режим конвейера psycopg 3: операторы уходят без ожидания ответа, синхронизация — на выходе.
+
+        Результаты внутри конвейера недоступны (RETURNING читать нельзя). Ошибка оператора приходит
+        при синхронизации, уже от драйвера, — её оборачиваем в исключение SQLAlchemy (IntegrityError и т.п.).
+        """
+        conn.info["pipeline"] = True
+        dbapi_error = conn.dialect.loaded_dbapi.Error
+        try:
+            with conn.connection.driver_connection.pipeline():
+                yield
+        except dbapi_error as e:
+            raise DBAPIError.instance(None, None, e, dbapi_error, dialect=conn.dialect) from e
+        finally:
+            conn.info.pop("pipeline", None)
+            ROUND_TRIPS.add("execute")
+
+    def insert_one(self, name: str, values: Dict[str, Any]):
+        table = self.t[name]
+        with self._begin() as conn:
+            return conn.execute(insert(table).values(**values).returning(*table.c)).one()
+
+    def insert_many(self, name: str, records: List[Dict[str, Any]]) -> list:
+        """Вставляет записи пачками; строки RETURNING возвращаются в порядке records."""
+        if not records:
+            return []
+        table = self.t[name]
+        started = time.perf_counter()
+        with self._begin() as conn:
+            rows = self._insert_many(conn, table, records)
+        log_event("Пакетная вставка", op="insert_many", table=name, rows=len(rows),
+                  elapsed=time.perf_counter() - started)
+        return rows
+
+    def _insert_many(self, conn, table: Table, records: List[Dict[str, Any]]) -> list:
+        stmt = insert(table).returning(*table.c, sort_by_parameter_order=True)
+        return conn.execute(stmt, records).all()
+
+    def _task_with_link(self, values: Dict[str, Any], project_id: int):
+        task, link = self.t["task"], self.t["project_task"]
+        new_task = insert(task).values(**values).returning(*task.c).cte("new_task")
+        new_link = insert(link).from_select(
+            ["project_id", "task_id"], select(literal(project_id, Integer), new_task.c.task_id)
+        ).returning(*link.c).cte("new_link")
+        return select(*new_task.c, *new_link.c).select_from(
+            new_task.join(new_link, new_link.c.task_id == new_task.c.task_id))
+
+    def insert_task(self, values: Dict[str, Any], project_id: Optional[int] = None) -> tuple:
+        """Задача и (если задан project_id) её связь project_task за один запрос: (строка task, строка связи)."""
+        if project_id is None:
+            return self.insert_one("task", values), None
+        ncols = len(self.t["task"].c)
+        with self._begin() as conn:
+            row = conn.execute(self._task_with_link(values, project_id)).one()
+        return tuple(row[:ncols]), tuple(row[ncols:])
+
+    def insert_tasks(self, records: List[Dict[str, Any]]) -> tuple:
+        """Пачка задач в одной транзакции; поле TASK_PROJECT_KEY записи создаёт связь с проектом.
+
+        Возвращает (строки task, строки project_task) в порядке записей.
+        """
+        task, link = self.t["task"], self.t["project_task"]
+        values = [{k: v for k, v in r.items() if k != TASK_PROJECT_KEY} for r in records]
+        started = time.perf_counter()
+        with self._begin() as conn:
+            tasks = self._insert_many(conn, task, values) if values else []
+            links = [{"project_id": r[TASK_PROJECT_KEY], "task_id": row.task_id}
+                     for r, row in zip(records, tasks) if r.get(TASK_PROJECT_KEY) is not None]
+            if links and self.pipelined:
+                link_rows = self._insert_links_pipelined(conn, links)
+            else:
+                link_rows = self._insert_many(conn, link, links) if links else []
+        log_event(f"Пакетная вставка задач, связей с проектами: {len(link_rows)}", op="insert_many", table="task",
+                  rows=len(tasks), elapsed=time.perf_counter() - started)
+        return tasks, link_rows
+
+    def _insert_links_pipelined(self, conn, links: List[Dict[str, Any]]) -> list:
+        # ключи задач уже известны, поэтому пачки связей не ждут друг друга; строки читаются одним запросом
+        link = self.t["project_task"]
+        with self._pipeline(conn):
+            for i in range(0, len(links), self.batch_rows):
+                conn.execute(insert(link).values(links[i:i + self.batch_rows]))
+        ids = bindparam("ids", [r["task_id"] for r in links], type_=ARRAY(Integer))
+        rows = {(row.project_id, row.task_id): row
+                for row in conn.execute(select(link).where(link.c.task_id == any_(ids)))}
+        return [rows[r["project_id"], r["task_id"]] for r in links]  # в порядке записей, как у insert_many
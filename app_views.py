@@ -0,0 +1,243 @@
+"""Мастер соединений: материализованные представления над соединёнными таблицами (jv_*)."""
+import re
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple
+import time
+from collections import deque
+
+# ===== SQLAlchemy =====
+from sqlalchemy import (
+    MetaData, Table, Column, select, insert, delete, ForeignKeyConstraint, and_, text, DDL, event, func, update,
+)
+from sqlalchemy.engine import Engine
+
+from app_base import log_event
+
+
+# -------------------------------
+# Соединения таблиц (материализованные представления)
+# -------------------------------
+JOIN_VIEW_TABLE = "join_view"
+JOIN_VIEW_PREFIX = "jv_"  # представления мастера соединений; удаляются вместе со схемой
+JOIN_REFRESH_CHECK_MS = 60_000  # как часто проверять, не пора ли обновить представления по расписанию
+_JOIN_NAME_RE = re.compile(r"[a-z_][a-z0-9_]{0,59}")
+
+
+class JoinError(ValueError):
+    pass
+
+
+@dataclass
+class JoinSpec:
+    """Базовая таблица и таблицы, на которые она ссылается по внешним ключам (многие-к-одному).
+
+    Строк в соединении столько же, сколько в базовой таблице, поэтому её первичный ключ —
+    уникальный ключ представления (нужен для REFRESH ... CONCURRENTLY) и ключ постраничной модели.
+    columns — "таблица.столбец": столбцы базовой таблицы называются как есть, остальные — "таблица_столбец".
+    """
+    name: str
+    title: str
+    base: str
+    parents: Tuple[str, ...] = ()
+    columns: Tuple[str, ...] = ()  # пусто — все столбцы
+    refresh_minutes: int = 0  # 0 — только вручную
+
+    @property
+    def view_name(self) -> str:
+        return JOIN_VIEW_PREFIX + self.name
+
+    def definition(self) -> Dict[str, Any]:
+        return {"base": self.base, "parents": list(self.parents), "columns": list(self.columns)}
+
+
+PREDEFINED_JOINS = (
+    JoinSpec("task_assignee", "Задачи и исполнители", "task", ("employee",),
+             ("task.task_id", "task.name", "task.status", "task.deadline", "employee.full_name", "employee.duty"),
+             refresh_minutes=15),
+    JoinSpec("project_task", "Проекты и задачи", "project_task", ("project", "task", "employee"),
+             ("project_task.project_task_id", "project.name", "project.customer", "project.deadline",
+              "project.finished", "task.name", "task.status", "task.deadline", "employee.full_name"),
+             refresh_minutes=15),
+)
+
+
+PROJECT_TASK_JOIN = PREDEFINED_JOINS[1]  # вкладка «Проекты/задачи» окна просмотра
+
+
+def join_parents(tables: Dict[str, Table], base: str) -> Dict[str, ForeignKeyConstraint]:
+    """Таблицы, достижимые из base по внешним ключам, и ключ, по которому каждая присоединяется (в порядке обхода)."""
+    found: Dict[str, ForeignKeyConstraint] = {}
+    pending = deque([tables[base]])
+    while pending:
+        child = pending.popleft()
+        for fk in sorted(child.foreign_key_constraints, key=lambda c: c.name or ""):
+            parent = fk.referred_table.name
+            if parent != base and parent not in found and parent in tables:
+                found[parent] = fk
+                pending.append(tables[parent])
+    return found
+
+
+def _join_tables(tables: Dict[str, Table], spec: JoinSpec) -> Dict[str, ForeignKeyConstraint]:
+    """Присоединяемые таблицы spec вместе с промежуточными (employee из project_task — через task)."""
+    reachable = join_parents(tables, spec.base)
+    needed = set()
+    for name in spec.parents:
+        if name not in reachable:
+            raise JoinError(f"таблица {name} не связана внешним ключом с {spec.base}")
+        while name != spec.base and name not in needed:
+            needed.add(name)
+            name = reachable[name].table.name
+    return {name: fk for name, fk in reachable.items() if name in needed}
+
+
+def join_columns(tables: Dict[str, Table], spec: JoinSpec) -> List[tuple]:
+    """[(имя в соединении, столбец таблицы), ...]; первичный ключ базовой таблицы всегда первый."""
+    joined = [spec.base] + list(_join_tables(tables, spec))
+    refs = list(spec.columns) or [f"{name}.{c.name}" for name in joined for c in tables[name].c]
+    pk = list(tables[spec.base].primary_key.columns)[0]
+    result = [(pk.name, pk)]
+    for ref in refs:
+        table_name, _, col_name = ref.partition(".")
+        if table_name not in joined or col_name not in tables[table_name].c:
+            raise JoinError(f"нет столбца {ref} в соединении")
+        col = tables[table_name].c[col_name]
+        label = col_name if table_name == spec.base else f"{table_name}_{col_name}"
+        if label not in (name for name, _ in result):
+            result.append((label, col))
+    return result
+
+
+def build_join_select(tables: Dict[str, Table], spec: JoinSpec):
+    """SELECT соединения: базовая таблица LEFT JOIN каждая присоединяемая по своему внешнему ключу."""
+    frm = tables[spec.base]
+    for name, fk in _join_tables(tables, spec).items():
+        frm = frm.outerjoin(tables[name], and_(*(e.parent == e.column for e in fk.elements)))
+    return select(*(col.label(label) for label, col in join_columns(tables, spec))).select_from(frm)
+
+
+def join_view_table(tables: Dict[str, Table], spec: JoinSpec) -> Table:
+    """Представление spec как Table: его читает SATableModel (типы и форматы — от исходных столбцов)."""
+    pk = list(tables[spec.base].primary_key.columns)[0].name
+    columns = [Column(label, col.type, primary_key=(label == pk), autoincrement=False, info=dict(col.info))
+               for label, col in join_columns(tables, spec)]
+    return Table(spec.view_name, MetaData(), *columns)
+
+
+def _join_registry(tables: Dict[str, Table]) -> Table:
+    return tables["task"].metadata.tables[JOIN_VIEW_TABLE]
+
+
+def _create_join_view(conn, tables: Dict[str, Table], spec: JoinSpec):
+    if not _JOIN_NAME_RE.fullmatch(spec.name):
+        raise JoinError("имя представления: латинские строчные буквы, цифры и _, не длиннее 60 символов")
+    if not spec.title.strip():
+        raise JoinError("нужно название соединения")
+    sql = build_join_select(tables, spec).compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    pk = list(tables[spec.base].primary_key.columns)[0].name
+    registry = _join_registry(tables)
+    conn.exec_driver_sql(f"DROP MATERIALIZED VIEW IF EXISTS {spec.view_name}")
+    conn.exec_driver_sql(f"CREATE MATERIALIZED VIEW {spec.view_name} AS {sql}")
+    conn.exec_driver_sql(f"CREATE UNIQUE INDEX {spec.view_name}_key ON {spec.view_name} ({pk})")
+    conn.execute(delete(registry).where(registry.c.name == spec.name))
+    conn.execute(insert(registry).values(name=spec.name, title=spec.title.strip(), definition=spec.definition(),
+                                         refresh_minutes=spec.refresh_minutes))
+
+
+def create_join_view(engine: Engine, tables: Dict[str, Table], spec: JoinSpec):
+    """Создаёт (или пересоздаёт) материализованное представление соединения и запоминает его в join_view."""
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        _create_join_view(conn, tables, spec)
+    log_event(f"Создано представление {spec.view_name} ({spec.title})", op="join_view", table=spec.base,
+              elapsed=time.perf_counter() - started)
+
+
+def create_predefined_join_views(conn, tables: Dict[str, Table]):
+    for spec in PREDEFINED_JOINS:
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": spec.view_name}).scalar() is None:
+            _create_join_view(conn, tables, spec)
+
+
+def drop_join_view(engine: Engine, tables: Dict[str, Table], name: str):
+    registry = _join_registry(tables)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP MATERIALIZED VIEW IF EXISTS {JOIN_VIEW_PREFIX}{name}")
+        conn.execute(delete(registry).where(registry.c.name == name))
+
+
+def join_views(engine: Engine, tables: Dict[str, Table]) -> List[tuple]:
+    """[(JoinSpec, когда обновлено), ...] всех сохранённых соединений."""
+    registry = _join_registry(tables)
+    with engine.connect() as conn:
+        rows = conn.execute(select(registry).order_by(registry.c.title)).all()
+    return [(JoinSpec(r.name, r.title, r.definition["base"], tuple(r.definition["parents"]),
+                      tuple(r.definition["columns"]), r.refresh_minutes), r.refreshed_at) for r in rows]
+
+
+def refresh_join_view(engine: Engine, tables: Dict[str, Table], name: str, concurrently: bool = True) -> float:
+    """REFRESH MATERIALIZED VIEW [CONCURRENTLY]: с CONCURRENTLY представление читается и во время обновления.
+
+    Без него (после массовой загрузки) обновление быстрее, но чтение ждёт его окончания.
+    """
+    registry = _join_registry(tables)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(update(registry).where(registry.c.name == name).values(refreshed_at=func.now()))
+        conn.exec_driver_sql(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}"
+                             f"{JOIN_VIEW_PREFIX}{name}")
+    elapsed = time.perf_counter() - started
+    log_event(f"Обновлено представление {JOIN_VIEW_PREFIX}{name}", op="refresh_view", elapsed=elapsed)
+    return elapsed
+
+
+def refresh_due_join_views(engine: Engine, tables: Dict[str, Table]) -> List[str]:
+    """Обновляет представления, у которых подошёл срок refresh_minutes; возвращает их имена.
+
+    Срок проверяется и сдвигается тем же UPDATE в транзакции обновления, поэтому при нескольких
+    запущенных клиентах каждое представление обновляет только один.
+    """
+    registry = _join_registry(tables)
+    with engine.connect() as conn:
+        names = conn.execute(select(registry.c.name).where(registry.c.refresh_minutes > 0)).scalars().all()
+    refreshed = []
+    for name in names:
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            claimed = conn.execute(text(
+                f"UPDATE {JOIN_VIEW_TABLE} SET refreshed_at = now() WHERE name = :name AND refresh_minutes > 0 "
+                f"AND refreshed_at <= now() - make_interval(mins => refresh_minutes) RETURNING name"),
+                {"name": name}).scalar()
+            if claimed is None:
+                continue
+            conn.exec_driver_sql(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {JOIN_VIEW_PREFIX}{name}")
+        log_event(f"Обновлено представление {JOIN_VIEW_PREFIX}{name} по расписанию", op="refresh_view",
+                  elapsed=time.perf_counter() - started)
+        refreshed.append(name)
+    return refreshed
+
+
+# DROP TABLE не удаляет зависящие представления, поэтому они удаляются до таблиц; % в DDL удваивается
+JOIN_VIEWS_DROP_SQL = f"""
+DO $$
+DECLARE
+    v text;
+BEGIN
+    FOR v IN SELECT matviewname FROM pg_matviews
+             WHERE schemaname = current_schema()
+               AND left(matviewname, {len(JOIN_VIEW_PREFIX)}) = '{JOIN_VIEW_PREFIX}' LOOP
+        EXECUTE format('DROP MATERIALIZED VIEW %%I', v);
+    END LOOP;
+END
+$$
+"""
+
+
+def attach_join_views(md: MetaData, tables: Dict[str, Table]):
+    """Готовые соединения (PREDEFINED_JOINS) создаются вместе со схемой, все jv_* удаляются вместе с ней."""
+    def create(target, connection, **kw):
+        if connection.dialect.name == "postgresql":
+            create_predefined_join_views(connection, tables)
+
+    event.listen(md, "after_create", create)
+    event.listen(md, "before_drop", DDL(JOIN_VIEWS_DROP_SQL).execute_if(dialect="postgresql"))
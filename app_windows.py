@@ -0,0 +1,1280 @@
+"""Окна работы с подключённой БД; главное окно загружает модуль при первом открытии любого из них."""
+import logging
+import time
+from datetime import date
+from typing import Optional, List, Dict
+
+from PySide6.QtCore import QDate, Qt, QTimer, QStringListModel
+from PySide6.QtWidgets import QPushButton, QVBoxLayout, QWidget, QGroupBox, QFormLayout, QMessageBox, \
+    QLineEdit, QTabWidget, QComboBox, QDialog, QCheckBox, QDateEdit, QSpinBox, \
+    QTableView, QAbstractSpinBox, QHBoxLayout, QLabel, QFileDialog, QTableWidget, QTableWidgetItem, QCompleter, \
+    QListWidget, QListWidgetItem
+from sqlalchemy import Table
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from app_base import log_event, DbWorker, run_db_job, RowsRelay, ProgressRelay, QueryCancelled
+from app_engine import LATENCY_BUCKETS_MS, ROUND_TRIPS, QueryStats
+from app_schema import DUTIES, normalize_tag
+from app_views import (
+    JoinError, JoinSpec, PROJECT_TASK_JOIN, build_join_select, join_columns, join_parents, join_views,
+    join_view_table, create_join_view, drop_join_view, refresh_join_view,
+)
+from app_transfer import (
+    WriteRepository, parse_tags, ExportResult, ImportResult, TASK_PROJECT_EXPORT, export_data, import_file,
+)
+from app_models import PAGE_SIZE, ModelRegistry, SATableModel, QueryResultModel, column_formatter, snapshot_age_text
+from app_query import (
+    stream_select, FILTER_DEBOUNCE_MS, FILTER_MAX_ROWS, FilterError, parse_filter, filter_headers, stream_filter,
+    SEARCH_DEBOUNCE_MS, SEARCH_LIMIT, search_headers, stream_search, skill_dictionary, stream_skills,
+)
+from app_analytics import AnalyticsSnapshot, ANALYTICS_REPORTS, analytics_report, load_analytics
+
+SNAPSHOT_AGE_REFRESH_MS = 30_000  # как часто обновлять надпись о возрасте снимка
+
+
+# -------------------------------
+# Подсказки навыков
+# -------------------------------
+class TagCompleter(QCompleter):
+    """Подсказки для последнего тега в строке вида #sql#pyt — из словаря навыков, частые первыми."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setModel(QStringListModel(self))
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+
+    def set_skills(self, skills: List[tuple]):
+        self.model().setStringList([name for name, _ in skills])
+
+    def load(self, engine: Engine, tables: Dict[str, Table], worker: Optional["DbWorker"]):
+        run_db_job(worker, lambda token: skill_dictionary(engine, tables), self.set_skills,
+                   lambda e: log_event(f"Ошибка загрузки словаря навыков: {e}", logging.ERROR, op="skills"))
+
+    def splitPath(self, path: str) -> List[str]:
+        return [normalize_tag(path.rsplit("#", 1)[-1])]
+
+    def pathFromIndex(self, index) -> str:
+        text_ = self.widget().text()
+        head = text_[:text_.rfind("#")] if "#" in text_ else ""
+        return f"{head}#{super().pathFromIndex(index)}"
+
+
+# -------------------------------
+# Окно Добавления данных в БД
+# -------------------------------
+class AlterTableWindow(QDialog):
+    def __init__(self, engine: Engine, tables: Dict[str, Table]):
+        super().__init__()
+        self.setWindowTitle('Alter Table')
+        self.setGeometry(300, 300, 600, 220)
+        self.engine = engine
+        self.t = tables
+
+        self.tab = QTabWidget()
+
+        self.empl_form = QFormLayout()  # макет для блока ввода данных для таблицы Сотрудники
+        # текстовые и числовые поля для блока ввода данных
+        self.empl_lineedit_fullname = QLineEdit();
+        self.empl_lineedit_fullname.setPlaceholderText("Иванов Иван Иванович")
+        self.empl_spinbox_age = QSpinBox()
+        self.empl_spinbox_age.setButtonSymbols(QAbstractSpinBox.NoButtons)
+        self.empl_spinbox_age.setRange(18, 200)
+        self.empl_spinbox_salary = QSpinBox()
+        self.empl_spinbox_salary.setButtonSymbols(QAbstractSpinBox.NoButtons)
+        self.empl_spinbox_salary.setRange(1, 2147483647)
+        self.empl_spinbox_salary.setSuffix(" ₽")
+        self.empl_combobox_duty = QComboBox()
+        self.empl_combobox_duty.addItem('Frontend'); self.empl_combobox_duty.addItem('Backend')
+        self.empl_combobox_duty.addItem('DevOps'); self.empl_combobox_duty.addItem('Teamlead')
+        self.empl_combobox_duty.addItem('HR'); self.empl_combobox_duty.addItem('PM')
+        self.empl_combobox_duty.addItem('CEO')
+        self.empl_lineedit_skills = QLineEdit()
+        self.empl_lineedit_skills.setPlaceholderText("#SQL#Python")
+
+        # добавление полей ввода в макет
+        self.empl_form.addRow("Полное имя:", self.empl_lineedit_fullname)
+        self.empl_form.addRow("Возраст:", self.empl_spinbox_age)
+        self.empl_form.addRow("Зарплата:", self.empl_spinbox_salary)
+        self.empl_form.addRow("Должность:", self.empl_combobox_duty)
+        self.empl_form.addRow("Умения:", self.empl_lineedit_skills)
+
+        self.empl_add_button = QPushButton('Добавить данные')  # кнопка добавления данных
+        # Создание макета всего внутреннего содержимого блока ввода данных (сами поля данных и кнопка)
+        self.empl_layout = QVBoxLayout()
+        self.empl_layout.addLayout(self.empl_form)
+        self.empl_layout.addWidget(self.empl_add_button)
+        self.empl_layout.addStretch()
+
+        # создание и именование блока ввода данных
+        self.empl_box = QGroupBox("Данные нового сотрудника")
+        self.empl_box.setLayout(self.empl_layout)  # установка макета в блок
+
+        self.tab.insertTab(0, self.empl_box, 'Сотрудники')
+
+        # Данная процедура повторяется ещё два раза для создания ещё двух вкладок
+
+        self.task_form = QFormLayout()
+
+        self.task_lineedit_name = QLineEdit();
+        self.task_lineedit_name.setPlaceholderText("Разгром")
+        self.task_lineedit_description = QLineEdit()
+        self.task_spinbox_id_employ = QSpinBox()
+        self.task_spinbox_id_employ.setButtonSymbols(QAbstractSpinBox.NoButtons)
+        self.task_spinbox_id_employ.setRange(1, 2147483647)
+        self.task_spinbox_id_project = QSpinBox()
+        self.task_spinbox_id_project.setButtonSymbols(QAbstractSpinBox.NoButtons)
+        self.task_spinbox_id_project.setRange(1, 2147483647)
+        self.task_dateedit_deadline = QDateEdit()
+        self.task_dateedit_deadline.setCalendarPopup(True)
+        self.task_dateedit_deadline.setDisplayFormat('yyyy-MM-dd')
+        self.task_dateedit_deadline.setDate(QDate(2000, 1, 1))
+        self.task_combobox_status = QComboBox()
+        self.task_combobox_status.addItem('Новая');
+        self.task_combobox_status.addItem('В работе')
+        self.task_combobox_status.addItem('Можно проверять');
+        self.task_combobox_status.addItem('Завершена')
+
+        self.task_form.addRow("Название задачи:", self.task_lineedit_name)
+        self.task_form.addRow("Описание задачи:", self.task_lineedit_description)
+        self.task_form.addRow("ID работника:", self.task_spinbox_id_employ)
+        self.task_form.addRow("ID проекта:", self.task_spinbox_id_project)
+        self.task_form.addRow("Дата дедлайна:", self.task_dateedit_deadline)
+        self.task_form.addRow("Статус задачи:", self.task_combobox_status)
+
+        self.task_add_button = QPushButton('Добавить данные')
+
+        self.task_layout = QVBoxLayout()
+        self.task_layout.addLayout(self.task_form)
+        self.task_layout.addWidget(self.task_add_button)
+        self.task_layout.addStretch()
+
+        self.task_box = QGroupBox("Данные новой задачи")
+        self.task_box.setLayout(self.task_layout)
+
+        self.tab.insertTab(1, self.task_box, 'Задачи')
+        # -------------------------------
+        self.projects_form = QFormLayout()
+
+        self.projects_add_button = QPushButton('Добавить данные')
+
+        self.projects_layout = QVBoxLayout()
+        self.projects_layout.addLayout(self.projects_form)
+        self.projects_layout.addWidget(self.projects_add_button)
+        self.projects_layout.addStretch()
+
+        self.projects_box = QGroupBox("Данные нового проекта")
+        self.projects_box.setLayout(self.projects_layout)
+
+        self.tab.insertTab(2, self.projects_box, 'Проекты')
+
+        # Конец создания вкладок
+
+        self.layout = QVBoxLayout()
+        self.layout.addWidget(self.tab)
+        self.layout.addStretch()
+
+        self.setLayout(self.layout)
+
+
+# -------------------------------
+# Окно Добавления данных в БД
+# -------------------------------
+class AddDataWindow(QDialog):
+    def __init__(self, engine: Engine, tables: Dict[str, Table], worker: Optional[DbWorker] = None,
+                 registry: Optional[ModelRegistry] = None):
+        super().__init__()
+        self.setWindowTitle('Data Input')
+        self.setGeometry(300, 300, 600, 220)
+        self.engine = engine
+        self.t = tables
+        self.worker = worker
+        self.repo = WriteRepository(engine, tables)
+        # окно только пишет в таблицы: вставленные строки (RETURNING *) передаются в общие модели
+        self.registry = registry or ModelRegistry(engine, tables, worker)
+
+        self.tab = QTabWidget()
+
+        self.empl_form = QFormLayout()  # макет для блока ввода данных для таблицы Сотрудники
+        # текстовые и числовые поля для блока ввода данных
+        self.empl_lineedit_fullname = QLineEdit(); self.empl_lineedit_fullname.setPlaceholderText("Иванов Иван Иванович")
+        self.empl_spinbox_age = QSpinBox()
+        self.empl_spinbox_age.setButtonSymbols(QAbstractSpinBox.NoButtons)
+        self.empl_spinbox_age.setRange(18, 200)
+        self.empl_spinbox_salary = QSpinBox()
+        self.empl_spinbox_salary.setButtonSymbols(QAbstractSpinBox.NoButtons)
+        self.empl_spinbox_salary.setRange(1, 2147483647)
+        self.empl_spinbox_salary.setSuffix(" ₽")
+        self.empl_combobox_duty = QComboBox()
+        self.empl_combobox_duty.addItem('Frontend'); self.empl_combobox_duty.addItem('Backend'); self.empl_combobox_duty.addItem('DevOps')
+        self.empl_combobox_duty.addItem('Teamlead'); self.empl_combobox_duty.addItem('HR'); self.empl_combobox_duty.addItem('PM')
+        self.empl_combobox_duty.addItem('CEO')
+        self.empl_lineedit_skills = QLineEdit(); self.empl_lineedit_skills.setPlaceholderText("#SQL#Python")
+        self.empl_skills_completer = TagCompleter(self)
+        self.empl_lineedit_skills.setCompleter(self.empl_skills_completer)
+        self.empl_skills_completer.load(engine, tables, worker)
+
+        # добавление полей ввода в макет
+        self.empl_form.addRow("Полное имя:", self.empl_lineedit_fullname)
+        self.empl_form.addRow("Возраст:", self.empl_spinbox_age)
+        self.empl_form.addRow("Зарплата:", self.empl_spinbox_salary)
+        self.empl_form.addRow("Должность:", self.empl_combobox_duty)
+        self.empl_form.addRow("Умения:", self.empl_lineedit_skills)
+
+        self.empl_add_button = QPushButton('Добавить данные') # кнопка добавления данных
+        self.empl_add_button.clicked.connect(self.add_employee)
+        # Создание макета всего внутреннего содержимого блока ввода данных (сами поля данных и кнопка)
+        self.empl_layout = QVBoxLayout()
+        self.empl_layout.addLayout(self.empl_form)
+        self.empl_layout.addWidget(self.empl_add_button)
+        self.empl_layout.addStretch()
+
+        # создание и именование блока ввода данных
+        self.empl_box = QGroupBox("Данные нового сотрудника")
+        self.empl_box.setLayout(self.empl_layout)  # установка макета в блок
+
+        self.tab.insertTab(0, self.empl_box, 'Сотрудники')
+
+
+        # Данная процедура повторяется ещё два раза для создания ещё двух вкладок
+
+
+        self.task_form = QFormLayout()
+
+        self.task_lineedit_name = QLineEdit(); self.task_lineedit_name.setPlaceholderText("Разгром")
+        self.task_lineedit_description = QLineEdit()
+        self.task_spinbox_id_employ = QSpinBox()
+        self.task_spinbox_id_employ.setButtonSymbols(QAbstractSpinBox.NoButtons)
+        self.task_spinbox_id_employ.setRange(1, 2147483647)
+        self.task_spinbox_id_project = QSpinBox()
+        self.task_spinbox_id_project.setButtonSymbols(QAbstractSpinBox.NoButtons)
+        self.task_spinbox_id_project.setRange(1, 2147483647)
+        self.task_dateedit_deadline = QDateEdit()
+        self.task_dateedit_deadline.setCalendarPopup(True)
+        self.task_dateedit_deadline.setDisplayFormat('yyyy-MM-dd')
+        self.task_dateedit_deadline.setDate(QDate(2000, 1, 1))
+        self.task_combobox_status = QComboBox()
+        self.task_combobox_status.addItem('Новая'); self.task_combobox_status.addItem('В работе')
+        self.task_combobox_status.addItem('Можно проверять'); self.task_combobox_status.addItem('Завершена')
+
+        self.task_form.addRow("Название задачи:", self.task_lineedit_name)
+        self.task_form.addRow("Описание задачи:", self.task_lineedit_description)
+        self.task_form.addRow("ID работника:", self.task_spinbox_id_employ)
+        self.task_form.addRow("ID проекта:", self.task_spinbox_id_project)
+        self.task_form.addRow("Дата дедлайна:", self.task_dateedit_deadline)
+        self.task_form.addRow("Статус задачи:", self.task_combobox_status)
+
+        self.task_add_button = QPushButton('Добавить данные')
+        self.task_add_button.clicked.connect(self.add_task)
+
+        self.task_layout = QVBoxLayout()
+        self.task_layout.addLayout(self.task_form)
+        self.task_layout.addWidget(self.task_add_button)
+        self.task_layout.addStretch()
+
+        self.task_box = QGroupBox("Данные новой задачи")
+        self.task_box.setLayout(self.task_layout)
+
+        self.tab.insertTab(1, self.task_box, 'Задачи')
+        # -------------------------------
+        self.projects_form = QFormLayout()
+
+        self.projects_lineedit_name = QLineEdit(); self.projects_lineedit_name.setPlaceholderText("Разгром")
+        self.projects_lineedit_customer = QLineEdit(); self.projects_lineedit_customer.setPlaceholderText("ООО 'Рога и Копыта'")
+        self.projects_dateedit_deadline = QDateEdit()
+        self.projects_dateedit_deadline.setCalendarPopup(True)
+        self.projects_dateedit_deadline.setDisplayFormat('yyyy-MM-dd')
+        self.projects_dateedit_deadline.setDate(QDate(2000, 1 ,1))
+        self.projects_spinbox_prize = QSpinBox()
+        self.projects_spinbox_prize.setButtonSymbols(QAbstractSpinBox.NoButtons)
+        self.projects_spinbox_prize.setRange(1, 2147483647)
+        self.projects_spinbox_prize.setSuffix(" ₽")
+        self.projects_checkbox_finished = QCheckBox()
+
+        self.projects_form.addRow("Название проекты:", self.projects_lineedit_name)
+
+        self.projects_form.addRow("Заказчик:", self.projects_lineedit_customer)
+        self.projects_form.addRow("Дата дедлайна:", self.projects_dateedit_deadline)
+        self.projects_form.addRow("Премия за проект:", self.projects_spinbox_prize)
+        self.projects_form.addRow("Завершён:", self.projects_checkbox_finished)
+
+        self.projects_add_button = QPushButton('Добавить данные')
+        self.projects_add_button.clicked.connect(self.add_project)
+
+        self.projects_layout = QVBoxLayout()
+        self.projects_layout.addLayout(self.projects_form)
+        self.projects_layout.addWidget(self.projects_add_button)
+        self.projects_layout.addStretch()
+
+        self.projects_box = QGroupBox("Данные нового проекта")
+        self.projects_box.setLayout(self.projects_layout)
+
+        self.tab.insertTab(2, self.projects_box, 'Проекты')
+
+        # Конец создания вкладок
+
+        self.import_button = QPushButton('Импорт из файла (CSV/JSONL)')  # в таблицу текущей вкладки
+        self.import_button.clicked.connect(self.import_from_file)
+
+        self.close_button = QPushButton('Закрыть окно')
+        self.close_button.clicked.connect(self.close) # при нажатии кнопки окно будет закрываться
+
+        self.layout = QVBoxLayout()
+        self.layout.addWidget(self.tab)
+        self.layout.addWidget(self.import_button)
+        self.layout.addWidget(self.close_button)
+        self.layout.addStretch()
+
+        self.setLayout(self.layout)
+
+    def _run_insert(self, button: QPushButton, what: str, job, on_done, table: Optional[str] = None):
+        """Выполняет INSERT в фоне; на время запроса кнопка добавления неактивна.
+
+        Если задан table, успешная вставка записывается в журнал со временем выполнения.
+        """
+        button.setDisabled(True)
+        started = time.perf_counter()
+
+        def done(result):
+            button.setDisabled(False)
+            if table is not None:
+                log_event(f"Запись {what} успешно добавлена!", op="insert", table=table, rows=1,
+                          elapsed=time.perf_counter() - started)
+            on_done(result)
+
+        def failed(e):
+            button.setDisabled(False)
+            if isinstance(e, IntegrityError):
+                QMessageBox.critical(self, "Ошибка INSERT (UNIQUE/CHECK)", str(e.orig))
+                log_event(f"Ошибка при добавления записи {what}. Ошибка INSERT (UNIQUE/CHECK)", logging.ERROR,
+                          op="insert", table=table)
+            else:
+                QMessageBox.critical(self, "Ошибка INSERT", str(e))
+                log_event(f"Ошибка при добавления записи {what}. {e}", logging.ERROR, op="insert", table=table)
+
+        run_db_job(self.worker, job, done, failed)
+
+    def import_from_file(self):
+        name = ("employee", "task", "project")[self.tab.currentIndex()]
+        path, _ = QFileDialog.getOpenFileName(self, "Импорт", "", "CSV / JSONL (*.csv *.jsonl *.ndjson)")
+        if not path:
+            return
+        engine, tables = self.engine, self.t
+
+        def job(token):
+            return import_file(engine, tables, name, path)
+
+        def done(result: ImportResult):
+            self.registry.mark_stale(name)
+            if result.linked:
+                self.registry.mark_stale("project_task")
+            message = f"Добавлено: {result.inserted}, связей с проектами: {result.linked}, отклонено: {result.rejected}"
+            if result.rejected:
+                message += f"\nОтклонённые строки: {result.reject_path}"
+            QMessageBox.information(self, "Импорт", message)
+
+        self._run_insert(self.import_button, f"из файла {path}", job, done)
+
+    def add_employee(self):
+        full_name = self.empl_lineedit_fullname.text().strip()
+        age = self.empl_spinbox_age.value()
+        salary = self.empl_spinbox_salary.value()
+        duty = self.empl_combobox_duty.currentText()
+        skills = parse_tags(self.empl_lineedit_skills.text())
+        if not full_name or not age or not salary or not duty:
+            QMessageBox.warning(self, "Ввод", "ФИО, Возраст, Зарплата и Должность обязательны (NOT NULL)")
+            log_event("Ошибка при добавления записи сотрудника. Название и статус обязательны", logging.WARNING)
+            return
+        repo = self.repo
+
+        def job(token):
+            return repo.insert_one("employee", dict(
+                full_name=full_name, age=age, salary=salary, duty=duty, skills=skills))
+
+        def done(row):
+            self.registry.row_inserted("employee", row)
+            self.empl_lineedit_fullname.clear(); self.empl_spinbox_age.clear(); self.empl_lineedit_skills.clear()
+
+        self._run_insert(self.empl_add_button, "сотрудника", job, done, "employee")
+
+    def _qdate_to_pydate(self, qd: QDate) -> date:
+        return date(qd.year(), qd.month(), qd.day())
+
+    def add_task(self):
+        name = self.task_lineedit_name.text().strip()
+        description = self.task_lineedit_description.text().strip()
+        deadline = self._qdate_to_pydate(self.task_dateedit_deadline.date())
+        status = self.task_combobox_status.currentText()
+        employee = self.task_spinbox_id_employ.value()
+        project = self.task_spinbox_id_project.value()
+
+        if not name or not status:
+            QMessageBox.warning(self, "Ввод", "Название и статус обязательны (NOT NULL)")
+            log_event("Ошибка при добавления записи задачи. Название и статус обязательны", logging.WARNING)
+            return
+        repo = self.repo
+
+        def job(token):
+            return repo.insert_task(dict(
+                name=name, description=description, deadline=deadline, status=status, employee_id=employee
+            ), project)
+
+        def done(rows):
+            self.task_lineedit_name.clear(); self.task_lineedit_description.clear(); self.task_spinbox_id_employ.clear(); self.task_spinbox_id_project.clear()
+            self.registry.row_inserted("task", rows[0])
+            if rows[1] is not None:
+                self.registry.row_inserted("project_task", rows[1])
+
+        self._run_insert(self.task_add_button, "задачи", job, done, "task")
+
+    def add_project(self):
+        name = self.projects_lineedit_name.text().strip()
+        deadline = self._qdate_to_pydate(self.projects_dateedit_deadline.date())
+        prize = self.projects_spinbox_prize.value()
+        customer = self.projects_lineedit_customer.text().strip()
+        finished =self.projects_checkbox_finished.isChecked()
+
+        if not name or not prize:
+            QMessageBox.warning(self, "Ввод", "Название и Стоимость обязательны (NOT NULL)")
+            log_event("Ошибка при добавления записи проекта. Название и статус обязательны", logging.WARNING)
+            return
+        repo = self.repo
+
+        def job(token):
+            return repo.insert_one("project", dict(
+                name=name, deadline=deadline, prize=prize, customer=customer, finished=finished))
+
+        def done(row):
+            self.projects_lineedit_name.clear(); self.projects_lineedit_customer.clear(); self.projects_spinbox_prize.clear()
+            self.registry.row_inserted("project", row)
+
+        self._run_insert(self.projects_add_button, "проекта", job, done, "project")
+
+
+# -------------------------------
+# Окно отображения данных из БД
+# -------------------------------
+class ShowDataBaseWindow(QDialog):
+    """Таблицы, поиск и фильтры; без engine (снимок без подключения) — только таблицы из снимка."""
+    def __init__(self, engine: Optional[Engine], tables: Dict[str, Table], worker: Optional[DbWorker] = None,
+                 registry: Optional[ModelRegistry] = None):
+        super().__init__()
+        self.setWindowTitle('Data Base show')
+        self.resize(1300, 800)
+        self.engine = engine
+        self.t = tables
+        self.worker = worker
+        self.registry = registry or ModelRegistry(engine, tables, worker)
+        self.modelEmployee = self.registry.acquire("employee", PAGE_SIZE)
+        self.modelTask = self.registry.acquire("task", PAGE_SIZE)
+        self.modelProject = self.registry.acquire("project", PAGE_SIZE)
+        self.finished.connect(self._release_models)
+
+        tab = QTabWidget()
+        tab.setObjectName("show")
+        self.tab = tab
+
+        self.empl_widget = QWidget()
+        self.empl_layout = QHBoxLayout()
+        self.empl_table = QTableView()
+        self.empl_table.setMinimumWidth(700)
+        self.empl_table.setSortingEnabled(True)
+        self.empl_table.setModel(self.modelEmployee)
+        self.empl_table.setSelectionBehavior(QTableView.SelectRows)
+        self.empl_table.setSelectionMode(QTableView.SingleSelection)
+
+        # поиск по навыкам: skills @> / && по GIN-индексу, подсказки — из словаря навыков
+        self.empl_skills_form = QFormLayout()
+        self.empl_skills_lineedit = QLineEdit(placeholderText="#python#docker")
+        self.empl_skills_completer = TagCompleter(self)
+        self.empl_skills_lineedit.setCompleter(self.empl_skills_completer)
+        if engine is not None:
+            self.empl_skills_completer.load(engine, tables, worker)
+        self.empl_skills_combobox_match = QComboBox()
+        self.empl_skills_combobox_match.addItem("все навыки", True); self.empl_skills_combobox_match.addItem("любой из навыков", False)
+        self.empl_skills_combobox_duty = QComboBox()
+        self.empl_skills_combobox_duty.addItem(''); self.empl_skills_combobox_duty.addItems(DUTIES)
+        self.empl_skills_button = QPushButton('Найти')
+        self.empl_skills_label = QLabel()
+        self.empl_skills_label.setWordWrap(True)
+
+        self.skillsModel = QueryResultModel(self)
+        self.skills_rows = RowsRelay(self)
+        self.skills_rows.rows.connect(self.skillsModel.append_rows)
+        self.skills_timer = QTimer(self)
+        self.skills_timer.setSingleShot(True)
+        self.skills_timer.setInterval(FILTER_DEBOUNCE_MS)
+        self.skills_timer.timeout.connect(self.search_skills)
+        self.empl_skills_lineedit.textChanged.connect(self.skills_timer.start)
+        self.empl_skills_lineedit.returnPressed.connect(self.search_skills)
+        self.empl_skills_combobox_match.currentIndexChanged.connect(self.search_skills)
+        self.empl_skills_combobox_duty.currentIndexChanged.connect(self.search_skills)
+        self.empl_skills_button.clicked.connect(self.search_skills)
+
+        self.empl_skills_form.addRow("Навыки:", self.empl_skills_lineedit)
+        self.empl_skills_form.addRow("Совпадение:", self.empl_skills_combobox_match)
+        self.empl_skills_form.addRow("Должность:", self.empl_skills_combobox_duty)
+        self.empl_skills_form.addWidget(self.empl_skills_button)
+        self.empl_skills_form.addRow(self.empl_skills_label)
+        self.empl_oper_layout = QVBoxLayout()
+        self.empl_oper_layout.addLayout(self.empl_skills_form)
+        self.empl_oper_layout.addStretch()
+        self.empl_layout.addWidget(self.empl_table); self.empl_layout.addLayout(self.empl_oper_layout)
+        self.empl_widget.setLayout(self.empl_layout)
+
+        tab.insertTab(0, self.empl_widget, 'Сотрудники') # добавляем вкладочку
+
+
+        # Данная процедура повторяется ещё три раза для создания ещё трёх вкладок
+
+        self.task_widget = QWidget()
+        self.task_layout = QHBoxLayout()
+        self.task_table = QTableView()
+        self.task_table.setMinimumWidth(700)
+        self.task_table.setSortingEnabled(True)
+        self.task_table.setModel(self.modelTask)
+        self.task_table.setSelectionBehavior(QTableView.SelectRows)
+        self.task_table.setSelectionMode(QTableView.SingleSelection)
+
+        self.button_select = QPushButton('SELECT')
+        self.button_searchtext = QPushButton('SEARCH')
+        self.button_textedit = QPushButton('TEXTEDIT')
+
+        self.task_search_lineedit = QLineEdit(placeholderText="Поиск по названию и описанию")
+        self.task_search_lineedit.setClearButtonEnabled(True)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.search_tasks)
+        self.task_search_lineedit.textChanged.connect(self.search_timer.start)
+        self.task_search_lineedit.returnPressed.connect(self.search_tasks)
+        self.button_searchtext.clicked.connect(self.search_tasks)
+
+        self.task_oper_layout = QVBoxLayout()
+        self.task_oper_layout.addWidget(self.button_select);
+        self.task_oper_layout.addWidget(self.task_search_lineedit)
+        self.task_oper_layout.addWidget(self.button_searchtext)
+        self.task_oper_layout.addWidget(self.button_textedit)
+
+        self.task_select_form = QFormLayout()
+        self.task_select_combobox_column = QComboBox()
+        self.task_select_combobox_column.addItem(''); self.task_select_combobox_column.addItems(self.modelTask.columns)
+        self.task_where_lineedit = QLineEdit(placeholderText="status = Новая; deadline < 2025-01-01; name ~ отчёт")
+        self.task_orderby_lineedit = QLineEdit(placeholderText="deadline desc, name")
+        self.task_groupby_lineedit = QLineEdit(placeholderText="status, employee_id")
+        self.task_having_lineedit = QLineEdit(placeholderText="count > 10; max(deadline) < 2025-01-01")
+        for lineedit in (self.task_where_lineedit, self.task_having_lineedit):
+            lineedit.setToolTip("Условия разделяются «;» и соединяются по AND; значение — весь текст до «;»")
+        self.task_select_button_accept = QPushButton('Принять фильтр')
+        self.task_filter_label = QLabel()
+        self.task_filter_label.setWordWrap(True)
+
+        # фильтр выполняется на сервере; результат — в отдельной модели только для чтения
+        self.filterModel = QueryResultModel(self)
+        self.filter_rows = RowsRelay(self)
+        self.filter_rows.rows.connect(self.filterModel.append_rows)
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(self.apply_task_filter)
+        for lineedit in (self.task_where_lineedit, self.task_orderby_lineedit,
+                         self.task_groupby_lineedit, self.task_having_lineedit):
+            lineedit.textChanged.connect(self.filter_timer.start)
+            lineedit.returnPressed.connect(self.apply_task_filter)
+        self.task_select_combobox_column.currentIndexChanged.connect(self.filter_timer.start)
+        self.task_select_button_accept.clicked.connect(self.apply_task_filter)
+
+
+        self.task_select_form.addRow("Столбец:", self.task_select_combobox_column)
+        self.task_select_form.addRow("Вхере:", self.task_where_lineedit)
+        self.task_select_form.addRow("Ордербу:", self.task_orderby_lineedit)
+        self.task_select_form.addRow("Гроупбу:", self.task_groupby_lineedit)
+        self.task_select_form.addRow("Хавинг:", self.task_having_lineedit)
+        self.task_select_form.addWidget(self.task_select_button_accept)
+        self.task_select_form.addRow(self.task_filter_label)
+
+        self.task_oper_layout.addLayout(self.task_select_form)
+        self.task_oper_layout.addStretch()
+        self.task_layout.addWidget(self.task_table); self.task_layout.addLayout(self.task_oper_layout)
+        self.task_widget.setLayout(self.task_layout)
+        tab.insertTab(1, self.task_widget, 'Задачи')
+        # -------------------------------
+        self.project_table = QTableView()
+        self.project_table.setSortingEnabled(True)
+        self.project_table.setModel(self.modelProject)
+        self.project_table.setSelectionBehavior(QTableView.SelectRows)
+        self.project_table.setSelectionMode(QTableView.SingleSelection)
+
+        tab.insertTab(2, self.project_table, 'Проекты')
+        # -------------------------------
+        # protas = project + task: материализованное представление мастера соединений (PROJECT_TASK_JOIN),
+        # трёхстороннее соединение не пересчитывается при каждом открытии
+        self.modelProjectTask = None
+        if engine is not None:  # представления нет в снимке
+            self.modelProjectTask = SATableModel(engine, join_view_table(tables, PROJECT_TASK_JOIN), self,
+                                                 page_size=PAGE_SIZE, worker=worker)
+            self.protas_table = QTableView()
+            self.protas_table.setSortingEnabled(True)
+            self.protas_table.setModel(self.modelProjectTask)
+            self.protas_table.setSelectionBehavior(QTableView.SelectRows)
+            self.protas_table.setSelectionMode(QTableView.SingleSelection)
+
+            tab.insertTab(3, self.protas_table, 'Проекты/задачи')
+        # -------------------------------
+        # Конец создания вкладок
+        # -------------------------------
+
+
+
+
+
+
+        self.loading_label = QLabel()  # индикатор фоновой загрузки
+        self.snapshot_label = QLabel()  # возраст локального снимка таблицы текущей вкладки
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.setInterval(SNAPSHOT_AGE_REFRESH_MS)
+        self.snapshot_timer.timeout.connect(self._update_snapshot_age)
+        self.snapshot_timer.start()
+        tab.currentChanged.connect(self._update_snapshot_age)
+        for model in self._models():
+            model.loadingChanged.connect(self._update_loading)
+        self._update_loading()
+
+        self.export_button = QPushButton('Экспорт таблицы (CSV/JSONL)')  # таблица текущей вкладки
+        self.export_button.clicked.connect(self.export_current)
+        self.export_join_button = QPushButton('Экспорт задач с проектами')
+        self.export_join_button.clicked.connect(lambda: self.export_to_file(TASK_PROJECT_EXPORT))
+        self.export_progress = ProgressRelay(self)
+        self.export_progress.progressed.connect(self._show_export_progress)
+
+        export_layout = QHBoxLayout()
+        export_layout.addWidget(self.export_button)
+        export_layout.addWidget(self.export_join_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(tab)
+        status_layout = QHBoxLayout()
+        status_layout.addWidget(self.loading_label)
+        status_layout.addStretch()
+        status_layout.addWidget(self.snapshot_label)
+        layout.addLayout(status_layout)
+        layout.addLayout(export_layout)
+        self.setLayout(layout)
+
+        if engine is None:  # поиск, фильтры и экспорт выполняются на сервере
+            for widget in (self.empl_skills_lineedit, self.empl_skills_combobox_match, self.empl_skills_combobox_duty,
+                           self.empl_skills_button, self.button_select, self.task_search_lineedit,
+                           self.button_searchtext, self.button_textedit, self.task_select_combobox_column,
+                           self.task_where_lineedit, self.task_orderby_lineedit, self.task_groupby_lineedit,
+                           self.task_having_lineedit, self.task_select_button_accept, self.export_button,
+                           self.export_join_button):
+                widget.setDisabled(True)
+
+    def _models(self) -> List[SATableModel]:
+        models = [self.modelEmployee, self.modelTask, self.modelProject, self.modelProjectTask]
+        return [m for m in models if m is not None]
+
+    def _update_loading(self):
+        loading = any(m.is_loading() for m in self._models())
+        self.loading_label.setText("Загрузка данных…" if loading else "")
+        self._update_snapshot_age()
+
+    def _update_snapshot_age(self):
+        models = (self.modelEmployee, self.modelTask, self.modelProject)
+        index = self.tab.currentIndex()
+        model = models[index] if index < len(models) else None
+        if model is None or model.snapshot is None:
+            self.snapshot_label.clear()
+            return
+        text = snapshot_age_text(model.snapshot_synced)
+        if self.engine is None:
+            text += " (без подключения)"
+        elif model.is_loading() and model.snapshot_synced is not None:
+            text += ", синхронизация…"
+        self.snapshot_label.setText(text)
+
+    def _show_query_results(self, headers, formatters) -> int:
+        """Переключает task_table на filterModel и начинает новый результат; возвращает его поколение."""
+        generation = self.filterModel.start(headers, formatters)
+        if self.task_table.model() is not self.filterModel:
+            self.task_table.setSortingEnabled(False)  # порядок задаёт сам запрос
+            self.task_table.setModel(self.filterModel)
+        self.task_filter_label.setText("Выполняется…")
+        return generation
+
+    def search_skills(self):
+        self.skills_timer.stop()
+        skills = parse_tags("#" + self.empl_skills_lineedit.text().lstrip("#"))
+        duty = self.empl_skills_combobox_duty.currentText() or None
+        key = ("skills", id(self))
+        if not skills and duty is None:
+            if self.worker is not None:
+                self.worker.cancel(key)
+            self.empl_skills_label.clear()
+            self.empl_table.setModel(self.modelEmployee)
+            self.empl_table.setSortingEnabled(True)
+            return
+        match_all = self.empl_skills_combobox_match.currentData()
+        employee = self.t["employee"]
+        generation = self.skillsModel.start([c.name for c in employee.c], [column_formatter(c) for c in employee.c])
+        if self.empl_table.model() is not self.skillsModel:
+            self.empl_table.setSortingEnabled(False)
+            self.empl_table.setModel(self.skillsModel)
+        self.empl_skills_label.setText("Выполняется…")
+        engine, relay = self.engine, self.skills_rows
+
+        def job(token):
+            return stream_skills(engine, employee, skills, match_all, duty, token,
+                                 lambda rows: relay.rows.emit(generation, rows))
+
+        def done(result):
+            total, truncated = result
+            note = f" (показаны первые {FILTER_MAX_ROWS})" if truncated else ""
+            self.empl_skills_label.setText(f"Сотрудников: {total}{note}")
+
+        def failed(e):
+            if not isinstance(e, QueryCancelled):
+                self.empl_skills_label.setText(f"Ошибка запроса: {getattr(e, 'orig', e)}")
+                log_event(f"Ошибка поиска по навыкам: {e}", logging.ERROR, op="skills", table="employee")
+
+        run_db_job(self.worker, job, done, failed, key=key)
+
+    def search_tasks(self):
+        self.search_timer.stop()
+        query = self.task_search_lineedit.text().strip()
+        if not query:
+            self.apply_task_filter()  # пустой поиск — обратно к фильтру или ко всей таблице
+            return
+        generation = self._show_query_results(*search_headers(self.t["task"]))
+        engine, task, relay = self.engine, self.t["task"], self.filter_rows
+
+        def job(token):
+            return stream_search(engine, task, query, token, lambda rows: relay.rows.emit(generation, rows))
+
+        def done(total):
+            note = f" (показаны {SEARCH_LIMIT} самых релевантных)" if total >= SEARCH_LIMIT else ""
+            self.task_filter_label.setText(f"Найдено: {total}{note}")
+
+        def failed(e):
+            if not isinstance(e, QueryCancelled):
+                self.task_filter_label.setText(f"Ошибка поиска: {getattr(e, 'orig', e)}")
+                log_event(f"Ошибка поиска: {e}", logging.ERROR, op="search", table="task")
+
+        # тот же ключ, что у фильтра: новый ввод отменяет ещё выполняющийся запрос на сервере
+        run_db_job(self.worker, job, done, failed, key=("filter", id(self)))
+
+    def apply_task_filter(self):
+        self.filter_timer.stop()
+        try:
+            query = parse_filter(
+                self.t["task"], self.task_select_combobox_column.currentText(), self.task_where_lineedit.text(),
+                self.task_orderby_lineedit.text(), self.task_groupby_lineedit.text(), self.task_having_lineedit.text())
+        except FilterError as e:
+            self.task_filter_label.setText(f"Ошибка фильтра: {e}")
+            return
+        key = ("filter", id(self))
+        if query.is_empty():
+            if self.worker is not None:
+                self.worker.cancel(key)
+            self.task_filter_label.clear()
+            self.task_table.setModel(self.modelTask)
+            self.task_table.setSortingEnabled(True)
+            return
+
+        generation = self._show_query_results(*filter_headers(query))
+        engine, relay = self.engine, self.filter_rows
+
+        def job(token):
+            return stream_filter(engine, query, token, lambda rows: relay.rows.emit(generation, rows))
+
+        def done(result):
+            total, truncated = result
+            note = f" (показаны первые {FILTER_MAX_ROWS})" if truncated else ""
+            self.task_filter_label.setText(f"Строк: {total}{note}")
+
+        def failed(e):
+            if not isinstance(e, QueryCancelled):
+                self.task_filter_label.setText(f"Ошибка запроса: {getattr(e, 'orig', e)}")
+                log_event(f"Ошибка фильтра: {e}", logging.ERROR, op="filter", table="task")
+
+        run_db_job(self.worker, job, done, failed, key=key)
+
+    def export_current(self):
+        self.export_to_file(("employee", "task", "project", TASK_PROJECT_EXPORT)[self.tab.currentIndex()])
+
+    def export_to_file(self, source: str):
+        path, _ = QFileDialog.getSaveFileName(self, "Экспорт", f"{source}.csv", "CSV (*.csv);;JSON Lines (*.jsonl)")
+        if not path:
+            return
+        engine, tables, relay = self.engine, self.t, self.export_progress
+
+        def job(token):
+            return export_data(engine, tables, source, path, token=token, progress=relay.progressed.emit)
+
+        def done(result: ExportResult):
+            self._set_exporting(False)
+            self.loading_label.setText(f"Выгружено строк: {result.rows} ({result.elapsed:.1f} c)")
+
+        def failed(e):
+            self._set_exporting(False)
+            self.loading_label.clear()
+            if not isinstance(e, QueryCancelled):
+                QMessageBox.critical(self, "Ошибка экспорта", str(e))
+                log_event(f"Ошибка экспорта: {e}", logging.ERROR, op="export", table=source)
+
+        self._set_exporting(True)
+        run_db_job(self.worker, job, done, failed, key=("export", id(self)))
+
+    def _set_exporting(self, exporting: bool):
+        self.export_button.setDisabled(exporting)
+        self.export_join_button.setDisabled(exporting)
+
+    def _show_export_progress(self, rows: int):
+        self.loading_label.setText(f"Экспорт: {rows} строк…")
+
+    def _release_models(self):
+        self.filter_timer.stop()
+        self.search_timer.stop()
+        self.skills_timer.stop()
+        self.snapshot_timer.stop()
+        if self.worker is not None:
+            self.worker.cancel(("export", id(self)))
+            self.worker.cancel(("filter", id(self)))
+            self.worker.cancel(("skills", id(self)))
+            if self.modelProjectTask is not None:
+                self.worker.cancel(self.modelProjectTask)
+        for model in self._models():
+            model.loadingChanged.disconnect(self._update_loading)
+        for model in (self.modelEmployee, self.modelTask, self.modelProject):
+            self.registry.release(model)
+
+
+# -------------------------------
+# Мастер соединений
+# -------------------------------
+class JoinWizardWindow(QDialog):
+    """Готовые и собранные пользователем соединения; сохранённые хранятся как материализованные представления
+    и показываются той же постраничной моделью, что и таблицы."""
+    def __init__(self, engine: Engine, tables: Dict[str, Table], worker: Optional[DbWorker] = None):
+        super().__init__()
+        self.setWindowTitle('Мастер соединений')
+        self.resize(1300, 800)
+        self.engine = engine
+        self.t = tables
+        self.worker = worker
+        self.model: Optional[SATableModel] = None
+        self.views: List[tuple] = []  # [(JoinSpec, обновлено), ...] из join_view
+        self.finished.connect(self._release_model)
+
+        self.view_table = QTableView()
+        self.view_table.setMinimumWidth(700)
+        self.view_table.setSelectionBehavior(QTableView.SelectRows)
+        self.view_table.setSelectionMode(QTableView.SingleSelection)
+        self.previewModel = QueryResultModel(self)
+        self.preview_rows = RowsRelay(self)
+        self.preview_rows.rows.connect(self.previewModel.append_rows)
+
+        # сохранённые представления
+        self.views_form = QFormLayout()
+        self.views_combobox = QComboBox()
+        self.views_label = QLabel()
+        self.views_label.setWordWrap(True)
+        self.views_button_open = QPushButton('Открыть')
+        self.views_button_refresh = QPushButton('Обновить (REFRESH CONCURRENTLY)')
+        self.views_button_drop = QPushButton('Удалить')
+        self.views_combobox.currentIndexChanged.connect(self._show_view_info)
+        self.views_button_open.clicked.connect(self.open_view)
+        self.views_button_refresh.clicked.connect(self.refresh_view)
+        self.views_button_drop.clicked.connect(self.drop_view)
+        self.views_form.addRow("Представление:", self.views_combobox)
+        self.views_form.addRow(self.views_label)
+        self.views_form.addWidget(self.views_button_open)
+        self.views_form.addWidget(self.views_button_refresh)
+        self.views_form.addWidget(self.views_button_drop)
+        self.views_box = QGroupBox("Сохранённые соединения")
+        self.views_box.setLayout(self.views_form)
+
+        # конструктор: базовая таблица, таблицы по её внешним ключам, столбцы
+        self.build_form = QFormLayout()
+        self.build_combobox_base = QComboBox()
+        self.build_combobox_base.addItems(list(tables))
+        self.build_list_parents = QListWidget()
+        self.build_list_columns = QListWidget()
+        self.build_lineedit_name = QLineEdit(placeholderText="task_projects")
+        self.build_lineedit_title = QLineEdit(placeholderText="Задачи с проектами")
+        self.build_spinbox_refresh = QSpinBox()
+        self.build_spinbox_refresh.setRange(0, 24 * 60)
+        self.build_spinbox_refresh.setSuffix(" мин")
+        self.build_spinbox_refresh.setSpecialValueText("вручную")
+        self.build_button_preview = QPushButton('Предпросмотр')
+        self.build_button_save = QPushButton('Сохранить как представление')
+        self.build_combobox_base.currentIndexChanged.connect(self._fill_parents)
+        self.build_list_parents.itemChanged.connect(self._fill_columns)
+        self.build_button_preview.clicked.connect(self.preview_join)
+        self.build_button_save.clicked.connect(self.save_join)
+        self.build_form.addRow("Базовая таблица:", self.build_combobox_base)
+        self.build_form.addRow("Присоединить:", self.build_list_parents)
+        self.build_form.addRow("Столбцы:", self.build_list_columns)
+        self.build_form.addRow("Имя (jv_…):", self.build_lineedit_name)
+        self.build_form.addRow("Название:", self.build_lineedit_title)
+        self.build_form.addRow("Обновлять каждые:", self.build_spinbox_refresh)
+        self.build_form.addWidget(self.build_button_preview)
+        self.build_form.addWidget(self.build_button_save)
+        self.build_box = QGroupBox("Новое соединение")
+        self.build_box.setLayout(self.build_form)
+
+        self.status_label = QLabel()
+        self.status_label.setWordWrap(True)
+
+        self.oper_layout = QVBoxLayout()
+        self.oper_layout.addWidget(self.views_box)
+        self.oper_layout.addWidget(self.build_box)
+        self.oper_layout.addWidget(self.status_label)
+        self.oper_layout.addStretch()
+        layout = QHBoxLayout()
+        layout.addWidget(self.view_table); layout.addLayout(self.oper_layout)
+        self.setLayout(layout)
+
+        self._fill_parents()
+        self.load_views()
+
+    def _checked(self, widget: QListWidget) -> List[str]:
+        return [widget.item(i).data(Qt.UserRole) for i in range(widget.count())
+                if widget.item(i).checkState() == Qt.Checked]
+
+    def _add_checkable(self, widget: QListWidget, label: str, value: str, checked: bool):
+        item = QListWidgetItem(label)
+        item.setData(Qt.UserRole, value)
+        item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+        item.setCheckState(Qt.Checked if checked else Qt.Unchecked)
+        widget.addItem(item)
+
+    def _fill_parents(self):
+        base = self.build_combobox_base.currentText()
+        self.build_list_parents.blockSignals(True)
+        self.build_list_parents.clear()
+        for name, fk in join_parents(self.t, base).items():
+            via = fk.table.name
+            self._add_checkable(self.build_list_parents, name if via == base else f"{name} (через {via})", name, False)
+        self.build_list_parents.blockSignals(False)
+        self._fill_columns()
+
+    def _fill_columns(self):
+        spec = JoinSpec("", "", self.build_combobox_base.currentText(), tuple(self._checked(self.build_list_parents)))
+        self.build_list_columns.clear()
+        for label, col in join_columns(self.t, spec)[1:]:  # первичный ключ базовой таблицы добавляется всегда
+            self._add_checkable(self.build_list_columns, label, f"{col.table.name}.{col.name}", True)
+
+    def _built_spec(self) -> JoinSpec:
+        return JoinSpec(self.build_lineedit_name.text().strip().lower(), self.build_lineedit_title.text(),
+                        self.build_combobox_base.currentText(), tuple(self._checked(self.build_list_parents)),
+                        tuple(self._checked(self.build_list_columns)), self.build_spinbox_refresh.value())
+
+    def _current_view(self) -> Optional[tuple]:
+        i = self.views_combobox.currentIndex()
+        return self.views[i] if 0 <= i < len(self.views) else None
+
+    def _show_view_info(self):
+        current = self._current_view()
+        if current is None:
+            self.views_label.clear()
+            return
+        spec, refreshed_at = current
+        schedule = f"каждые {spec.refresh_minutes} мин" if spec.refresh_minutes else "вручную"
+        self.views_label.setText(f"{spec.view_name}: {spec.base}"
+                                 + "".join(f" ⋈ {p}" for p in spec.parents)
+                                 + f"\nОбновлено: {refreshed_at.astimezone():%Y-%m-%d %H:%M:%S} ({schedule})")
+
+    def _failed(self, what: str):
+        def failed(e):
+            self.status_label.setText(f"{what}: {getattr(e, 'orig', e)}")
+            log_event(f"{what}: {e}", logging.ERROR, op="join_view")
+        return failed
+
+    def load_views(self, select_name: Optional[str] = None):
+        engine, tables = self.engine, self.t
+
+        def done(views):
+            self.views = views
+            self.views_combobox.blockSignals(True)
+            self.views_combobox.clear()
+            for spec, _ in views:
+                self.views_combobox.addItem(spec.title)
+            names = [spec.name for spec, _ in views]
+            if select_name in names:
+                self.views_combobox.setCurrentIndex(names.index(select_name))
+            self.views_combobox.blockSignals(False)
+            self._show_view_info()
+
+        run_db_job(self.worker, lambda token: join_views(engine, tables), done,
+                   self._failed("Ошибка чтения списка представлений"), key=("join_views", id(self)))
+
+    def _set_model(self, model: Optional[SATableModel]):
+        if self.model is not None:
+            if self.worker is not None:
+                self.worker.cancel(self.model)  # запросы старой модели больше не нужны
+            self.model.deleteLater()
+        self.model = model
+        self.view_table.setSortingEnabled(model is not None)
+        self.view_table.setModel(model if model is not None else self.previewModel)
+
+    def open_view(self):
+        current = self._current_view()
+        if current is None:
+            return
+        spec, _ = current
+        self._set_model(SATableModel(self.engine, join_view_table(self.t, spec), self, page_size=PAGE_SIZE,
+                                     worker=self.worker))
+        self.status_label.setText(f"Открыто: {spec.title}")
+
+    def refresh_view(self):
+        current = self._current_view()
+        if current is None:
+            return
+        spec, _ = current
+        engine, tables = self.engine, self.t
+        self.views_button_refresh.setDisabled(True)
+        self.status_label.setText(f"Обновляется {spec.view_name}…")
+
+        def done(elapsed: float):
+            self.views_button_refresh.setDisabled(False)
+            self.status_label.setText(f"{spec.title}: обновлено за {elapsed:.1f} c")
+            if self.model is not None and self.model.table.name == spec.view_name:
+                self.model.refresh()
+            self.load_views(spec.name)
+
+        def failed(e):
+            self.views_button_refresh.setDisabled(False)
+            self._failed("Ошибка обновления представления")(e)
+
+        run_db_job(self.worker, lambda token: refresh_join_view(engine, tables, spec.name), done, failed,
+                   key=("join_refresh", spec.name))
+
+    def drop_view(self):
+        current = self._current_view()
+        if current is None:
+            return
+        spec, _ = current
+        answer = QMessageBox.question(self, "Мастер соединений", f"Удалить представление {spec.view_name}?")
+        if answer != QMessageBox.Yes:
+            return
+        if self.model is not None and self.model.table.name == spec.view_name:
+            self._set_model(None)
+        engine, tables = self.engine, self.t
+        run_db_job(self.worker, lambda token: drop_join_view(engine, tables, spec.name),
+                   lambda _: self.load_views(), self._failed("Ошибка удаления представления"))
+
+    def preview_join(self):
+        """Первые PAGE_SIZE строк соединения прямо из таблиц, без сохранения."""
+        spec = self._built_spec()
+        try:
+            stmt = build_join_select(self.t, spec).limit(PAGE_SIZE)
+            columns = join_columns(self.t, spec)
+        except JoinError as e:
+            self.status_label.setText(f"Ошибка соединения: {e}")
+            return
+        self._set_model(None)
+        generation = self.previewModel.start([label for label, _ in columns],
+                                             [column_formatter(col) for _, col in columns])
+        self.status_label.setText("Выполняется…")
+        engine, relay = self.engine, self.preview_rows
+
+        def job(token):
+            return stream_select(engine, stmt, {}, token, lambda rows: relay.rows.emit(generation, rows), PAGE_SIZE)
+
+        def done(result):
+            self.status_label.setText(f"Предпросмотр: {result[0]} строк (не больше {PAGE_SIZE})")
+
+        run_db_job(self.worker, job, done, self._failed("Ошибка запроса"), key=("join_preview", id(self)))
+
+    def save_join(self):
+        spec = self._built_spec()
+        engine, tables = self.engine, self.t
+        self.build_button_save.setDisabled(True)
+        self.status_label.setText(f"Создаётся {spec.view_name}…")
+
+        def done(_):
+            self.build_button_save.setDisabled(False)
+            self.status_label.setText(f"Создано представление {spec.view_name}")
+            self.load_views(spec.name)
+
+        def failed(e):
+            self.build_button_save.setDisabled(False)
+            self._failed("Ошибка создания представления")(e)
+
+        run_db_job(self.worker, lambda token: create_join_view(engine, tables, spec), done, failed)
+
+    def _release_model(self):
+        if self.worker is not None:
+            self.worker.cancel(("join_views", id(self)))
+            self.worker.cancel(("join_preview", id(self)))
+        self._set_model(None)
+
+
+# -------------------------------
+# Окно медленных запросов
+# -------------------------------
+class QueryStatsWindow(QDialog):
+    COLUMNS = ("Этап", "Оператор", "Параметры", "Вызовов", "Строк", "Всего, мс", "p50, мс", "p95, мс", "Макс, мс", "Ошибок")
+
+    def __init__(self, stats: QueryStats):
+        super().__init__()
+        self.setWindowTitle('Медленные запросы')
+        self.resize(1300, 700)
+        self.stats = stats
+
+        self.summary_label = QLabel()
+        self.summary_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)  # Запрет на редактирование ячеек
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.horizontalHeader().setStretchLastSection(False)
+
+        self.refresh_button = QPushButton('Обновить')
+        self.refresh_button.clicked.connect(self.refresh)
+        self.clear_button = QPushButton('Очистить')
+        self.clear_button.clicked.connect(self.clear)
+        self.dump_button = QPushButton('Сохранить в файл…')
+        self.dump_button.clicked.connect(self.dump)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.refresh_button)
+        buttons.addWidget(self.clear_button)
+        buttons.addWidget(self.dump_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self.refresh()
+
+    def refresh(self):
+        lines = [f"Замеров: {self.stats.total} (в буфере {len(self.stats.timings())})",
+                 "Ожиданий ответа сервера: " + ", ".join(f"{k} {n}" for k, n in ROUND_TRIPS.totals.items())]
+        for kind in ("sql", "build", "sort", "diff", "snapshot"):
+            hist = self.stats.histogram(kind)
+            if not any(hist):
+                continue
+            pct = ", ".join(f"p{p:g} {v * 1000:.1f} мс" for p, v in self.stats.percentiles(kind).items())
+            bounds = [f"≤{b}" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+            buckets = " ".join(f"{b}:{n}" for b, n in zip(bounds, hist) if n)
+            lines.append(f"{kind}: {pct}; мс {buckets}")
+        self.summary_label.setText("\n".join(lines))
+
+        rows = self.stats.slowest()
+        self.table.setRowCount(len(rows))
+        for i, r in enumerate(rows):
+            values = (r["kind"], r["statement"], r["params"], r["calls"], r["rows"],
+                      f"{r['total'] * 1000:.1f}", f"{r['p50'] * 1000:.1f}", f"{r['p95'] * 1000:.1f}",
+                      f"{r['max'] * 1000:.1f}", r["errors"])
+            for j, val in enumerate(values):
+                item = QTableWidgetItem(str(val))
+                if j == 1:
+                    item.setToolTip(r["statement"])
+                self.table.setItem(i, j, item)
+        self.table.resizeColumnsToContents()
+        self.table.setColumnWidth(1, min(self.table.columnWidth(1), 600))
+
+    def clear(self):
+        self.stats.clear()
+        ROUND_TRIPS.clear()
+        self.refresh()
+
+    def dump(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить замеры", "query_stats.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            self.stats.dump(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Замеры", str(e))
+            return
+        log_event(f"Замеры запросов сохранены в {path}", op="stats", rows=len(self.stats.timings()))
+
+
+class AnalyticsWindow(QDialog):
+    """Нагрузка, просрочка и ФОТ по сводкам; сводки читаются один раз, группировка меняется на клиенте."""
+    def __init__(self, engine: Engine, worker: Optional[DbWorker] = None):
+        super().__init__()
+        self.setWindowTitle('Аналитика')
+        self.resize(1000, 700)
+        self.engine = engine
+        self.worker = worker
+        self.snapshot: Optional[AnalyticsSnapshot] = None
+        self.finished.connect(self._release)
+
+        self.report_combobox = QComboBox()
+        for key, (title, *_) in ANALYTICS_REPORTS.items():
+            self.report_combobox.addItem(title, key)
+        self.report_combobox.currentIndexChanged.connect(self._fill_dims)
+        self.dim_combobox = QComboBox()
+        self.dim_combobox.currentIndexChanged.connect(self.show_report)
+        self.refresh_button = QPushButton('Обновить')
+        self.refresh_button.clicked.connect(self.load)
+        self.status_label = QLabel()
+
+        self.reportModel = QueryResultModel(self)
+        self.view = QTableView()
+        self.view.setModel(self.reportModel)
+        self.view.setSelectionBehavior(QTableView.SelectRows)
+
+        form = QFormLayout()
+        form.addRow('Отчёт', self.report_combobox)
+        form.addRow('Группировка', self.dim_combobox)
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.status_label, 1)
+        buttons.addWidget(self.refresh_button)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(self.view)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self._fill_dims()
+        self.load()
+
+    def _fill_dims(self):
+        _, _, dims, _ = ANALYTICS_REPORTS[self.report_combobox.currentData()]
+        self.dim_combobox.blockSignals(True)
+        self.dim_combobox.clear()
+        for column, label in dims.items():
+            self.dim_combobox.addItem(label, column)
+        self.dim_combobox.blockSignals(False)
+        self.show_report()
+
+    def load(self):
+        engine = self.engine
+        self.refresh_button.setDisabled(True)
+        self.status_label.setText("Загрузка сводок…")
+
+        def done(snapshot: AnalyticsSnapshot):
+            self.refresh_button.setDisabled(False)
+            self.snapshot = snapshot
+            self.show_report()
+
+        def failed(e):
+            self.refresh_button.setDisabled(False)
+            self.status_label.setText(f"Ошибка чтения сводок: {getattr(e, 'orig', e)}")
+            log_event(f"Ошибка чтения сводок: {e}", logging.ERROR, op="analytics")
+
+        run_db_job(self.worker, lambda token: load_analytics(engine), done, failed, key=("analytics", id(self)))
+
+    def show_report(self):
+        if self.snapshot is None:
+            return
+        started = time.perf_counter()
+        headers, formatters, rows = analytics_report(self.snapshot, self.report_combobox.currentData(),
+                                                     self.dim_combobox.currentData())
+        elapsed = time.perf_counter() - started
+        gen = self.reportModel.start(headers, formatters)
+        self.reportModel.append_rows(gen, rows)
+        self.view.resizeColumnsToContents()
+        self.status_label.setText(
+            f"Групп: {len(rows)}; свёртка {elapsed * 1000:.1f} мс; "
+            f"сводки прочитаны {self.snapshot.loaded_at:%H:%M:%S}, просрочка на {self.snapshot.as_of:%d.%m.%Y}")
+
+    def _release(self):
+        if self.worker is not None:
+            self.worker.cancel(("analytics", id(self)))
@@ -0,0 +1,306 @@
+"""Замеры SATableModel и путей записи на схеме build_metadata при разных объёмах данных.
+
+Запуск (база --dbname пересоздаётся, по умолчанию outsource_bench):
+    python benchmark.py --host localhost --sizes 10000 100000 1000000 --output bench.json
+
+База заполняется генератором datagen (если в ней другой объём), затем каждый объём
+замеряется в отдельном процессе, чтобы пиковая память одного размера не влияла на следующий.
+Результаты пишутся в JSON для сравнения прогонов между собой.
+"""
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # модели работают без окон
+
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication
+from sqlalchemy import text, func, select, delete
+from sqlalchemy.engine import Engine
+
+from app_base import PgConfig, log_event
+from app_engine import make_engine, ROUND_TRIPS
+from app_schema import build_metadata, upgrade_schema, TASK_STATUSES
+from app_transfer import WriteRepository
+from app_models import SATableModel, PAGE_SIZE
+from app_cli import connection_arguments, config_from_args
+from datagen import GeneratorSpec, generate
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)  # число задач
+VIEWPORT_ROWS = 40  # строк, видимых в таблице одновременно
+VIEWPORT_SCROLLS = 200  # сколько позиций прокрутки отрисовать
+SINGLE_INSERTS = 500
+BATCH_INSERTS = 10_000
+BENCH_TASK_NAME = "bench-insert"  # задачи замера записи, удаляются после него
+POINT_SELECTS = 20  # коротких запросов подряд, каждый со своей выдачей соединения из пула
+STARTUP_TARGET_S = 0.6  # от запуска интерпретатора до первой отрисовки главного окна
+STARTUP_RUNS = 5
+STARTUP_DEFERRED = ("sqlalchemy", "psycopg2", "psycopg", "numpy", "app_engine", "app_schema", "app_views",
+                    "app_transfer", "app_models", "app_query", "app_analytics", "app_cli",
+                    "app_windows")  # грузятся при подключении
+STARTUP_PROBE = """
+import sys, time
+import main_app_file
+from PySide6.QtCore import QEvent, QObject
+from PySide6.QtWidgets import QApplication
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and isinstance(obj, main_app_file.MainWindow):
+            loaded = sorted({name.split(".")[0] for name in sys.modules} & set(sys.argv[1:]))
+            print(time.time(), *loaded)
+            QApplication.quit()
+        return False
+
+app = QApplication(sys.argv[:1])
+app.installEventFilter(first_paint := FirstPaint())
+sys.exit(main_app_file.main(sys.argv[:1]))
+"""
+
+
+def ensure_database(cfg: PgConfig):
+    """Создаёт базу cfg.dbname, если её ещё нет (через служебную базу postgres)."""
+    admin = make_engine(PgConfig(**{**cfg.__dict__, "dbname": "postgres"}))
+    try:
+        with admin.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            exists = conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :n"), {"n": cfg.dbname}).scalar()
+            if not exists:
+                conn.exec_driver_sql(f'CREATE DATABASE "{cfg.dbname}"')
+    finally:
+        admin.dispose()
+
+
+def seed(cfg: PgConfig, tasks: int, seed_value: int = GeneratorSpec.seed) -> Optional[float]:
+    """Заполняет базу генератором datagen, если в ней другой объём задач; возвращает время загрузки."""
+    engine = make_engine(cfg)
+    try:
+        with engine.connect() as conn:
+            current = conn.execute(text("SELECT count(*) FROM task")).scalar() \
+                if conn.execute(text("SELECT to_regclass('task')")).scalar() else None
+        if current == tasks:
+            md, tables = build_metadata()
+            upgrade_schema(engine, md, tables)  # данные прежние, но схема (индексы) должна быть текущей
+            return None
+    finally:
+        engine.dispose()
+    started = time.perf_counter()
+    generate(cfg, GeneratorSpec(tasks=tasks, seed=seed_value), reset=True)
+    return time.perf_counter() - started
+
+
+def _timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def bench_model(engine: Engine, name: str) -> Dict[str, Any]:
+    _, tables = build_metadata()
+    table = tables[name]
+    result: Dict[str, Any] = {}
+
+    holder: List[SATableModel] = []
+    result["load_s"] = _timed(lambda: holder.append(SATableModel(engine, table)))
+    model = holder[0]
+    result["rows"] = model.rowCount()
+    result["refresh_unchanged_s"] = _timed(model.refresh)  # полный снимок + сравнение по ключу
+    result["first_page_s"] = _timed(lambda: SATableModel(engine, table, page_size=PAGE_SIZE))
+
+    sort = {}
+    for column, col_name in enumerate(model.columns):
+        sort[col_name] = {
+            "asc_s": _timed(lambda: model.sort(column, Qt.AscendingOrder)),
+            "desc_s": _timed(lambda: model.sort(column, Qt.DescendingOrder)),
+            "asc_cached_s": _timed(lambda: model.sort(column, Qt.AscendingOrder)),
+        }
+    result["sort"] = sort
+    model.sort(0, Qt.AscendingOrder)
+
+    rows, cols = model.rowCount(), model.columnCount()
+    step = max((rows - VIEWPORT_ROWS) // VIEWPORT_SCROLLS, 1)
+    tops = [min(i * step, max(rows - VIEWPORT_ROWS, 0)) for i in range(VIEWPORT_SCROLLS)]
+
+    def paint():
+        for top in tops:
+            for r in range(top, min(top + VIEWPORT_ROWS, rows)):
+                for c in range(cols):
+                    model.data(model.index(r, c), Qt.DisplayRole)
+
+    calls = sum(min(VIEWPORT_ROWS, rows - top) for top in tops) * cols
+    cold, warm = _timed(paint), _timed(paint)  # первый проход форматирует, второй берёт строки из кэша
+    result["viewport_data_calls_per_s"] = {"cold": calls / cold, "warm": calls / warm}
+    return result
+
+
+def bench_writes(engine: Engine) -> Dict[str, Any]:
+    _, tables = build_metadata()
+    repo = WriteRepository(engine, tables)
+    with engine.connect() as conn:
+        employee_id = conn.execute(select(func.min(tables["employee"].c.employee_id))).scalar()
+        project_id = conn.execute(select(func.min(tables["project"].c.project_id))).scalar()
+    record = dict(employee_id=employee_id, name=BENCH_TASK_NAME, status=TASK_STATUSES[0])
+
+    single = _timed(lambda: [repo.insert_task(record, project_id) for _ in range(SINGLE_INSERTS)])
+    batch = _timed(lambda: repo.insert_tasks([{**record, "project_id": project_id}] * BATCH_INSERTS))
+
+    _delete_bench_tasks(engine, tables)
+    return {
+        "single_rows_per_s": SINGLE_INSERTS / single,
+        "batched_rows_per_s": BATCH_INSERTS / batch,
+        "single_rows": SINGLE_INSERTS,
+        "batched_rows": BATCH_INSERTS,
+    }
+
+
+def _pool_configs(cfg: PgConfig) -> Dict[str, PgConfig]:
+    """Прежний пул (проверка SELECT 1 при каждой выдаче) и текущие настройки cfg, с psycopg 3 — если он есть."""
+    configs = {"ping_each_checkout": PgConfig(**{**cfg.__dict__, "liveness_idle": 0, "pool_prewarm": 1,
+                                                 "write_driver": "psycopg2"}),
+               "configured": cfg}
+    if importlib.util.find_spec("psycopg") is None:
+        return configs
+    configs["psycopg_pipeline"] = PgConfig(**{**cfg.__dict__, "write_driver": "psycopg"})
+    return configs
+
+
+def bench_round_trips(cfg: PgConfig) -> Dict[str, Any]:
+    """Ожидания ответа сервера по операциям для каждой конфигурации пула (ROUND_TRIPS.measure)."""
+    _, tables = build_metadata()
+    result: Dict[str, Any] = {}
+    for label, pool_cfg in _pool_configs(cfg).items():
+        ops: Dict[str, Any] = {}
+
+        def measured(name: str, fn):
+            with ROUND_TRIPS.measure() as trips:
+                started = time.perf_counter()
+                value = fn()
+                ops[name] = {"round_trips": sum(trips.values()), **{k: n for k, n in trips.items() if n},
+                             "elapsed_s": time.perf_counter() - started}
+            return value
+
+        engine = measured("connect", lambda: make_engine(pool_cfg))
+        repo = WriteRepository(engine, tables)
+        with engine.connect() as conn:
+            employee_id = conn.execute(select(func.min(tables["employee"].c.employee_id))).scalar()
+            project_id = conn.execute(select(func.min(tables["project"].c.project_id))).scalar()
+        record = dict(employee_id=employee_id, name=BENCH_TASK_NAME, status=TASK_STATUSES[0])
+
+        def point_selects():
+            for _ in range(POINT_SELECTS):
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+
+        measured(f"point_select_x{POINT_SELECTS}", point_selects)
+        measured("first_page", lambda: SATableModel(engine, tables["task"], page_size=PAGE_SIZE))
+        measured("insert_task", lambda: repo.insert_task(record, project_id))
+        measured(f"insert_tasks_{BATCH_INSERTS}",
+                 lambda: repo.insert_tasks([{**record, "project_id": project_id}] * BATCH_INSERTS))
+        _delete_bench_tasks(engine, tables)
+        engine.dispose()
+        result[label] = ops
+    return result
+
+
+def _delete_bench_tasks(engine: Engine, tables):
+    task, link = tables["task"], tables["project_task"]
+    with engine.begin() as conn:
+        bench_ids = select(task.c.task_id).where(task.c.name == BENCH_TASK_NAME)
+        conn.execute(delete(link).where(link.c.task_id.in_(bench_ids)))
+        conn.execute(delete(task).where(task.c.name == BENCH_TASK_NAME))
+
+
+def bench_startup(runs: int = STARTUP_RUNS) -> Dict[str, Any]:
+    """Холодный старт окна в отдельных процессах: время до первой отрисовки и самые долгие импорты (-X importtime)."""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    times, deferred, imports = [], set(), {}
+    for _ in range(runs):
+        started = time.time()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_PROBE, *STARTUP_DEFERRED],
+                              capture_output=True, text=True, cwd=cwd, check=True)
+        painted, *loaded = proc.stdout.split()
+        times.append(float(painted) - started)
+        deferred.update(loaded)
+        for line in proc.stderr.splitlines():  # import time: self [us] | cumulative | imported package
+            parts = line.split("|")
+            name = parts[-1].strip()
+            if len(parts) == 3 and "." not in name and parts[1].strip().isdigit():  # пакеты верхнего уровня
+                imports[name] = min(imports.get(name, float("inf")), int(parts[1]) / 1e6)
+    slowest = sorted(imports.items(), key=lambda item: -item[1])[:10]
+    first_paint = sorted(times)[len(times) // 2]
+    return {"first_paint_s": first_paint, "runs_s": times, "target_s": STARTUP_TARGET_S,
+            "deferred_loaded": sorted(deferred), "slowest_imports_s": dict(slowest),
+            "ok": first_paint <= STARTUP_TARGET_S and not deferred}
+
+
+def run_size(cfg: PgConfig, size: int) -> Dict[str, Any]:
+    """Все замеры одного объёма; выполняется в отдельном процессе."""
+    app = QApplication.instance() or QApplication([])  # моделям Qt нужен экземпляр приложения
+    engine = make_engine(cfg)
+    result: Dict[str, Any] = {"tasks": size, "qt_platform": app.platformName()}
+    result["models"] = {name: bench_model(engine, name) for name in ("task", "employee")}
+    result["writes"] = bench_writes(engine)
+    result["round_trips"] = bench_round_trips(cfg)
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    engine.dispose()
+    return result
+
+
+def _environment(cfg: PgConfig) -> Dict[str, Any]:
+    engine = make_engine(cfg)
+    with engine.connect() as conn:
+        server = conn.exec_driver_sql("SHOW server_version").scalar()
+    engine.dispose()
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "postgres": server, "commit": commit}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     parents=[connection_arguments("outsource_bench")])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--output", default=f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    parser.add_argument("--seed", type=int, default=GeneratorSpec.seed, help="seed генератора данных")
+    parser.add_argument("--startup", action="store_true",
+                        help=f"только холодный старт окна; код 1, если дольше {STARTUP_TARGET_S} с "
+                             f"или при старте загружены {', '.join(STARTUP_DEFERRED)}")
+    args = parser.parse_args(argv)
+    if args.startup:
+        startup = bench_startup()
+        print(json.dumps(startup, ensure_ascii=False, indent=1))
+        return 0 if startup["ok"] else 1
+    cfg = config_from_args(args)
+
+    ensure_database(cfg)
+    report = {"created": datetime.now().isoformat(), "environment": _environment(cfg),
+              "startup": bench_startup(), "sizes": []}
+    context = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        print(f"{size} задач…", file=sys.stderr, flush=True)
+        seed_s = seed(cfg, size, args.seed)  # генератор сам запускает процессы, поэтому не из пула
+        with context.Pool(1) as pool:
+            result = pool.apply(run_size, (cfg, size))
+        report["sizes"].append({**result, "seed": args.seed, "seed_s": seed_s})
+        with open(args.output, "w", encoding="utf-8") as f:  # промежуточный результат не пропадёт
+            json.dump(report, f, ensure_ascii=False, indent=1)
+    log_event(f"Замеры сохранены в {args.output}", op="benchmark", rows=max(args.sizes))
+    print(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Генератор синтетических данных для схемы build_metadata: детерминированно по seed, загрузка через COPY.
+
+Запуск (--reset пересоздаёт схему):
+    python datagen.py --dbname outsource_bench --tasks 10000000 --seed 42 --processes 8 --reset
+
+Каждая таблица делится на пачки по CHUNK_ROWS строк; пачки генерируются и загружаются
+параллельно в отдельных процессах, у каждой пачки свой генератор случайных чисел
+(seed, таблица, номер пачки), поэтому результат не зависит от числа процессов.
+Таблицы грузятся по этапам, чтобы внешние ключи всегда ссылались на уже загруженные строки.
+Ключи employee/project/task задаются явно, последовательности после загрузки сдвигаются;
+вторичные индексы схемы (и GIN-индекс поиска) удаляются на время загрузки и строятся после неё.
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from app_base import PgConfig, log_event
+from app_engine import make_engine
+from app_schema import (
+    build_metadata, drop_and_create_schema_sa, upgrade_schema, create_index_concurrently, create_search_index,
+    SEARCH_INDEX, normalize_tags, DUTIES, TASK_STATUSES,
+)
+from app_views import join_views, refresh_join_view
+from app_cli import connection_arguments, config_from_args
+
+CHUNK_ROWS = 100_000
+LOAD_PHASES = (("employee", "project"), ("task",), ("project_task",))  # порядок из-за внешних ключей
+SKILLS = tuple(normalize_tags((  # в том же виде, в каком навыки записывает приложение
+    "SQL", "Python", "Qt", "C++", "Java", "Go", "Docker", "Linux", "Kubernetes", "React",
+    "TypeScript", "PostgreSQL", "Git", "CI/CD", "Rust", "Figma", "Scrum", "Excel")))
+CUSTOMERS = tuple(f"ООО Заказчик-{i}" for i in range(1, 201))
+WORDS = ("исправить", "добавить", "проверить", "форму", "отчёт", "API", "экспорт", "ошибку", "страницу",
+         "миграцию", "интеграцию", "тесты", "документацию", "кэш", "поиск", "уведомления")
+
+
+@dataclass
+class GeneratorSpec:
+    """Объёмы и распределения набора данных; веса выровнены с DUTIES и TASK_STATUSES."""
+    tasks: int = 100_000
+    employees: Optional[int] = None  # по умолчанию tasks / 10
+    projects: Optional[int] = None  # по умолчанию tasks / 100
+    seed: int = 42
+    duty_weights: Sequence[float] = (25, 30, 10, 8, 7, 15, 5)
+    salary_base: Dict[str, int] = field(default_factory=lambda: {
+        "Frontend": 150_000, "Backend": 180_000, "DevOps": 200_000, "Teamlead": 260_000,
+        "HR": 90_000, "PM": 170_000, "CEO": 450_000})
+    skills_max: int = 6  # навыков у сотрудника: 0..skills_max, популярные чаще (закон Ципфа)
+    status_weights: Sequence[float] = (20, 35, 15, 30)
+    deadline_from: date = date(2023, 1, 1)
+    deadline_days: int = 4 * 365
+    null_deadline_share: float = 0.1
+    null_description_share: float = 0.3
+    finished_share: float = 0.4
+    second_project_share: float = 0.1  # доля задач, привязанных сразу к двум проектам
+
+    def count(self, table: str) -> int:
+        if table == "employee":
+            return self.employees or max(self.tasks // 10, 1)
+        if table == "project":
+            return self.projects or max(self.tasks // 100, 1)
+        return self.tasks  # task, а project_task — по пачкам задач
+
+
+def _rng(spec: GeneratorSpec, table: str, chunk: int) -> random.Random:
+    return random.Random(f"{spec.seed}:{table}:{chunk}")
+
+
+def _pick(rng: random.Random, values: Sequence, weights: Sequence[float], k: int) -> list:
+    return rng.choices(values, cum_weights=list(accumulate(weights)), k=k)
+
+
+def _dates(spec: GeneratorSpec) -> List[str]:
+    return [(spec.deadline_from + timedelta(days=d)).isoformat() for d in range(spec.deadline_days)]
+
+
+def _employee_rows(rng: random.Random, spec: GeneratorSpec, start: int, stop: int):
+    n = stop - start
+    duties = _pick(rng, DUTIES, spec.duty_weights, n)
+    skill_cum = list(accumulate(1 / (i + 1) for i in range(len(SKILLS))))
+    for i, duty in zip(range(start, stop), duties):
+        age = int(rng.triangular(20, 65, 30))
+        salary = max(int(spec.salary_base[duty] * rng.lognormvariate(0, 0.25)), 1)
+        k = rng.randint(0, spec.skills_max)
+        skills = sorted(set(rng.choices(SKILLS, cum_weights=skill_cum, k=k)))
+        yield i, f"Сотрудник {i}", age, salary, duty, "{" + ",".join(skills) + "}"
+
+
+def _project_rows(rng: random.Random, spec: GeneratorSpec, start: int, stop: int):
+    dates = _dates(spec)
+    for i in range(start, stop):
+        deadline = "" if rng.random() < spec.null_deadline_share else rng.choice(dates)
+        prize = max(int(1_000_000 * rng.lognormvariate(0, 0.8)), 1)
+        finished = "t" if rng.random() < spec.finished_share else "f"
+        yield i, f"Проект {i}", deadline, prize, rng.choice(CUSTOMERS), finished
+
+
+def _task_rows(rng: random.Random, spec: GeneratorSpec, start: int, stop: int):
+    dates = _dates(spec)
+    employees = spec.count("employee")
+    statuses = _pick(rng, TASK_STATUSES, spec.status_weights, stop - start)
+    for i, status in zip(range(start, stop), statuses):
+        description = "" if rng.random() < spec.null_description_share else " ".join(rng.sample(WORDS, 4))
+        deadline = "" if rng.random() < spec.null_deadline_share else rng.choice(dates)
+        yield i, rng.randint(1, employees), f"Задача {i}", description, deadline, status
+
+
+def _project_task_rows(rng: random.Random, spec: GeneratorSpec, start: int, stop: int):
+    projects = spec.count("project")
+    for task_id in range(start, stop):
+        first = rng.randint(1, projects)
+        yield first, task_id
+        if projects > 1 and rng.random() < spec.second_project_share:
+            yield first % projects + 1, task_id
+
+
+GENERATORS = {
+    "employee": (_employee_rows, ("employee_id", "full_name", "age", "salary", "duty", "skills")),
+    "project": (_project_rows, ("project_id", "name", "deadline", "prize", "customer", "finished")),
+    "task": (_task_rows, ("task_id", "employee_id", "name", "description", "deadline", "status")),
+    "project_task": (_project_task_rows, ("project_id", "task_id")),
+}
+
+_worker_engine: Optional[Engine] = None
+
+
+def _init_worker(cfg: PgConfig):
+    global _worker_engine
+    _worker_engine = make_engine(cfg)
+
+
+def _load_chunk(spec: GeneratorSpec, table: str, chunk: int, start: int, stop: int) -> tuple:
+    """Генерирует пачку строк [start, stop) и загружает её одним COPY; возвращает (таблица, строк)."""
+    rows_fn, columns = GENERATORS[table]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    rows = 0
+    for row in rows_fn(_rng(spec, table, chunk), spec, start, stop):
+        writer.writerow(row)
+        rows += 1
+    buf.seek(0)
+    raw = _worker_engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+        raw.commit()
+    finally:
+        raw.close()
+    return table, rows
+
+
+def _chunks(spec: GeneratorSpec, table: str, chunk_rows: int):
+    total = spec.count(table)
+    for chunk, start in enumerate(range(1, total + 1, chunk_rows)):
+        yield chunk, start, min(start + chunk_rows, total + 1)
+
+
+def generate(cfg: PgConfig, spec: GeneratorSpec, processes: Optional[int] = None, reset: bool = False,
+             chunk_rows: int = CHUNK_ROWS, progress=None) -> Dict[str, int]:
+    """Заполняет базу cfg по spec; возвращает число загруженных строк по таблицам.
+
+    Без reset таблицы должны быть пусты: ключи генерируются с 1.
+    """
+    started = time.perf_counter()
+    engine = make_engine(cfg)
+    md, tables = build_metadata()
+    try:
+        if reset:
+            if not drop_and_create_schema_sa(engine, md):
+                raise RuntimeError("не удалось пересоздать схему")
+        else:
+            upgrade_schema(engine, md, tables)
+        with engine.connect() as conn:
+            filled = [name for name in tables if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})")).scalar()]
+        if filled:
+            raise RuntimeError(f"таблицы не пусты: {', '.join(filled)} (используйте reset)")
+        # вторичные индексы дешевле построить один раз после загрузки, чем обновлять при каждом COPY
+        indexes = [index for table in tables.values() for index in table.indexes]
+        with engine.begin() as conn:
+            for name in [index.name for index in indexes] + [SEARCH_INDEX]:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+        loaded = {name: 0 for name in tables}
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker, initargs=(cfg,)) as pool:
+            for phase in LOAD_PHASES:
+                futures = [pool.submit(_load_chunk, spec, table, *chunk)
+                           for table in phase for chunk in _chunks(spec, table, chunk_rows)]
+                for future in futures:
+                    table, rows = future.result()
+                    loaded[table] += rows
+                    if progress is not None:
+                        progress(table, loaded[table])
+
+        for index in indexes:
+            create_index_concurrently(engine, index)
+        create_search_index(engine)
+        with engine.begin() as conn:
+            for name in ("employee", "project", "task"):
+                pk = list(tables[name].primary_key.columns)[0].name
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence(:t, :c), "
+                                  f"(SELECT coalesce(max({pk}), 0) + 1 FROM {name}), false)"),
+                             {"t": name, "c": pk})
+        for view, _ in join_views(engine, tables):  # представления соединений созданы над пустыми таблицами
+            refresh_join_view(engine, tables, view.name, concurrently=False)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("ANALYZE")
+    finally:
+        engine.dispose()
+    elapsed = time.perf_counter() - started
+    log_event(f"Сгенерированы данные (seed={spec.seed}): " + ", ".join(f"{t} {n}" for t, n in loaded.items()),
+              op="generate", rows=sum(loaded.values()), elapsed=elapsed)
+    return loaded
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0], parents=[connection_arguments()])
+    parser.add_argument("--tasks", type=int, default=GeneratorSpec.tasks)
+    parser.add_argument("--employees", type=int, help="по умолчанию tasks / 10")
+    parser.add_argument("--projects", type=int, help="по умолчанию tasks / 100")
+    parser.add_argument("--seed", type=int, default=GeneratorSpec.seed)
+    parser.add_argument("--processes", type=int, help="по умолчанию — число ядер")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--reset", action="store_true", help="пересоздать схему перед загрузкой")
+    args = parser.parse_args(argv)
+
+    spec = GeneratorSpec(tasks=args.tasks, employees=args.employees, projects=args.projects, seed=args.seed)
+
+    def progress(table: str, rows: int):
+        print(f"\r{table}: {rows}", end="", file=sys.stderr, flush=True)
+
+    started = time.perf_counter()
+    try:
+        loaded = generate(config_from_args(args), spec, args.processes, args.reset, args.chunk_rows, progress)
+    except (SQLAlchemyError, RuntimeError, OSError) as e:
+        print(f"\nОшибка: {e}", file=sys.stderr)
+        return 1
+    print(f"\n{', '.join(f'{t}: {n}' for t, n in loaded.items())} за {time.perf_counter() - started:.1f} c")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app_base import PgConfig  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def schema():
+    from app_schema import build_metadata
+    return build_metadata()
+
+
+@pytest.fixture(scope="session")
+def tables(schema):
+    return schema[1]
+
+
+@pytest.fixture
+def pg_config():
+    """Параметры подключения к OUTSOURCE_TEST_DB; без переменной тесты с базой пропускаются."""
+    dbname = os.environ.get("OUTSOURCE_TEST_DB")
+    if not dbname:
+        pytest.skip("OUTSOURCE_TEST_DB не задана")
+    return PgConfig(host=os.environ.get("PGHOST", "localhost"), port=int(os.environ.get("PGPORT", 5432)),
+                    user=os.environ.get("PGUSER", "postgres"), password=os.environ.get("PGPASSWORD", ""),
+                    dbname=dbname)
+
+
+@pytest.fixture
+def pg_engine(schema, pg_config):
+    """Движок на пустой схеме в OUTSOURCE_TEST_DB; схема пересоздаётся."""
+    from sqlalchemy.exc import SQLAlchemyError
+    from app_engine import make_engine
+    from app_schema import drop_and_create_schema_sa
+    engine = make_engine(pg_config)
+    try:
+        engine.connect().close()
+    except SQLAlchemyError as e:
+        engine.dispose()
+        pytest.skip(f"нет подключения к {pg_config.dbname}: {e}")
+    md, _ = schema
+    assert drop_and_create_schema_sa(engine, md)
+    yield engine
+    engine.dispose()
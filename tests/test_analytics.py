@@ -0,0 +1,145 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, insert, text, update
+
+import app_analytics
+from app_analytics import EMPLOYEE_CUBE_COLUMNS, PROJECT_CUBE_COLUMNS, AnalyticsCube, AnalyticsSnapshot, \
+    analytics_report, load_analytics, payroll_rollup
+from app_models import ColumnStore
+from app_schema import DONE_STATUS
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    """Свёртки считаются и через numpy, и без него — результат одинаковый."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(app_analytics, "np", None)
+    return request.param
+
+
+def _store(typecodes, rows):
+    store = ColumnStore(typecodes)
+    store.extend_rows(rows)
+    return store
+
+
+def _snapshot():
+    employees = _store(["q", None, None, "q", "q", "q", "q"], [
+        (1, "Анна #1", "HR", 100, 2, 1, 0),
+        (2, "Борис #2", "PM", 300, 1, 0, 4),
+        (3, "Вера #3", "HR", 50, 0, 0, 1),
+    ])
+    projects = _store(["q", None, None, None, "q", "q", "q", "q"], [
+        (10, "P10 #10", "ООО А", False, 1000, 2, 1, 3),
+        (11, "P11 #11", "ООО А", True, 500, 1, 0, 2),
+        (12, "P12 #12", None, False, 70, 0, 0, 0),
+    ])
+    staff = _store(["q", "q"], [(10, 1), (11, 1), (11, 2), (12, 3)])
+    return AnalyticsSnapshot(AnalyticsCube(employees, EMPLOYEE_CUBE_COLUMNS),
+                             AnalyticsCube(projects, PROJECT_CUBE_COLUMNS), staff, date.today(), datetime.now())
+
+
+def test_cube_rollup(backend):
+    cube = _snapshot().employees
+    assert sorted(cube.rollup("duty", ["salary", "open_tasks", "done_tasks"])) == [("HR", 150, 2, 1), ("PM", 300, 1, 4)]
+    assert sorted(cube.rollup("employee", ["overdue_tasks"]))[0] == ("Анна #1", 1)
+
+
+def test_cube_rollup_groups_missing_values(backend):
+    rows = sorted(_snapshot().projects.rollup("customer", ["prize", "open_tasks"]))
+    assert rows == [("", 70, 0), ("ООО А", 1500, 3)]
+
+
+def test_payroll_counts_each_employee_once_per_group(backend):
+    rows = sorted(payroll_rollup(_snapshot(), "customer"))
+    assert rows == [("", 70, 50, 1), ("ООО А", 1500, 400, 2)]
+    by_project = {r[0]: r[1:] for r in payroll_rollup(_snapshot(), "project")}
+    assert by_project["P11 #11"] == (500, 400, 2)
+
+
+def test_analytics_report_sorted_and_formatted(backend):
+    headers, formatters, rows = analytics_report(_snapshot(), "overdue", "finished")
+    assert headers == ["Проект завершён", "Просроченные", "Открытые", "Завершённые"]
+    assert [tuple(f(v) for f, v in zip(formatters, r)) for r in rows] == [("Нет", "1", "2", "3"),
+                                                                           ("Да", "0", "1", "2")]
+
+
+# -------------------------------
+# Сводки, которые ведут триггеры
+# -------------------------------
+def _summaries(conn) -> dict:
+    """Сводки без нулевых строк: триггеры оставляют обнулившиеся строки, пересчёт их не создаёт."""
+    return {
+        "employee": set(conn.execute(text(
+            "SELECT employee_id, open_tasks, overdue_tasks, done_tasks FROM employee_summary "
+            "WHERE open_tasks <> 0 OR overdue_tasks <> 0 OR done_tasks <> 0")).all()),
+        "project": set(conn.execute(text(
+            "SELECT project_id, open_tasks, overdue_tasks, done_tasks FROM project_summary "
+            "WHERE open_tasks <> 0 OR overdue_tasks <> 0 OR done_tasks <> 0")).all()),
+        "staff": set(conn.execute(text(
+            "SELECT project_id, employee_id, open_tasks FROM project_staff WHERE open_tasks <> 0")).all()),
+    }
+
+
+def _recomputed(conn) -> dict:
+    counts = ("count(*) FILTER (WHERE t.status <> :done), "
+              "count(*) FILTER (WHERE t.status <> :done AND t.deadline < current_date), "
+              "count(*) FILTER (WHERE t.status = :done)")
+    params = {"done": DONE_STATUS}
+    return {
+        "employee": set(conn.execute(text(
+            f"SELECT t.employee_id, {counts} FROM task t GROUP BY t.employee_id"), params).all()),
+        "project": set(conn.execute(text(
+            f"SELECT l.project_id, {counts} FROM project_task l JOIN task t ON t.task_id = l.task_id "
+            f"GROUP BY l.project_id"), params).all()),
+        "staff": set(conn.execute(text(
+            "SELECT l.project_id, t.employee_id, count(*) FROM project_task l JOIN task t ON t.task_id = l.task_id "
+            "WHERE t.status <> :done GROUP BY l.project_id, t.employee_id"), params).all()),
+    }
+
+
+def test_summary_triggers_match_group_by(pg_engine, tables):
+    task, link = tables["task"], tables["project_task"]
+    past, future = date.today() - timedelta(days=3), date.today() + timedelta(days=3)
+    with pg_engine.begin() as conn:
+        conn.execute(insert(tables["employee"]), [{"full_name": n, "age": 30, "salary": 100, "duty": "HR"}
+                                                  for n in ("A", "B", "C")])
+        conn.execute(insert(tables["project"]), [{"name": n, "prize": 10, "finished": False} for n in ("P", "Q")])
+        conn.execute(insert(task), [
+            {"employee_id": 1, "name": "t1", "status": "Новая", "deadline": past},
+            {"employee_id": 1, "name": "t2", "status": "В работе", "deadline": future},
+            {"employee_id": 2, "name": "t3", "status": DONE_STATUS, "deadline": past},
+            {"employee_id": 2, "name": "t4", "status": "Новая", "deadline": None},
+            {"employee_id": 3, "name": "t5", "status": "Можно проверять", "deadline": past},
+        ])
+        conn.execute(insert(link), [{"project_id": p, "task_id": t} for p, t in
+                                    ((1, 1), (1, 2), (1, 3), (2, 3), (2, 4), (2, 5))])
+    with pg_engine.connect() as conn:
+        assert _summaries(conn) == _recomputed(conn)
+
+    with pg_engine.begin() as conn:
+        conn.execute(update(task).where(task.c.task_id == 1).values(status=DONE_STATUS))
+        conn.execute(update(task).where(task.c.task_id == 2).values(employee_id=3, deadline=past))
+        conn.execute(update(task).where(task.c.task_id.in_([4, 5])).values(status="В работе", deadline=future))
+    with pg_engine.begin() as conn:
+        conn.execute(update(link).where(link.c.task_id == 2).values(project_id=2))
+        conn.execute(delete(link).where(link.c.task_id == 3))
+        conn.execute(delete(task).where(task.c.task_id == 3))
+        conn.execute(insert(task).values(employee_id=1, name="t6", status="Новая", deadline=past))
+    with pg_engine.connect() as conn:
+        assert _summaries(conn) == _recomputed(conn)
+
+
+def test_load_analytics_reads_summaries(pg_engine, tables):
+    with pg_engine.begin() as conn:
+        conn.execute(insert(tables["employee"]).values(full_name="A", age=30, salary=100, duty="HR"))
+        conn.execute(insert(tables["project"]).values(name="P", customer="C", prize=10, finished=False))
+        conn.execute(insert(tables["task"]), [{"employee_id": 1, "name": "t", "status": s} for s in
+                                              ("Новая", "В работе", DONE_STATUS)])
+        conn.execute(insert(tables["project_task"]), [{"project_id": 1, "task_id": t} for t in (1, 2, 3)])
+    snapshot = load_analytics(pg_engine)
+    assert snapshot.employees.rollup("duty", ["open_tasks", "done_tasks"]) == [("HR", 2, 1)]
+    assert payroll_rollup(snapshot, "customer") == [("C", 10, 100, 1)]
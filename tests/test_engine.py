@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from app_engine import QueryStats
+
+
+@pytest.fixture
+def stats_engine():
+    engine = create_engine("sqlite://")
+    stats = QueryStats()
+    stats.attach(engine)
+    yield engine, stats
+    engine.dispose()
+
+
+def test_successful_statement_is_timed(stats_engine):
+    engine, stats = stats_engine
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    timing = stats.timings()[-1]
+    assert timing.statement == "SELECT 1"
+    assert timing.error == ""
+    assert timing.elapsed >= 0
+
+
+def test_failed_statement_is_recorded_with_error(stats_engine):
+    engine, stats = stats_engine
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM   missing_table"))
+        conn.execute(text("SELECT 2"))
+        assert "query_started" not in conn.info
+    failed, ok = stats.timings()[-2:]
+    assert failed.statement == "SELECT * FROM missing_table"
+    assert failed.error == "OperationalError"
+    assert failed.elapsed >= 0
+    assert ok.statement == "SELECT 2" and ok.error == ""
+    summary = {r["statement"]: r for r in stats.slowest()}
+    assert summary["SELECT * FROM missing_table"]["errors"] == 1
+    assert summary["SELECT 2"]["errors"] == 0
+
+
+def test_statement_timeout_is_recorded(pg_engine):
+    stats = QueryStats()
+    stats.attach(pg_engine)
+    with pg_engine.connect() as conn:
+        conn.execute(text("SET statement_timeout = 50"))
+        with pytest.raises(DBAPIError):
+            conn.execute(text("SELECT pg_sleep(1)"))
+    failed = stats.timings()[-1]
+    assert failed.statement == "SELECT pg_sleep(1)"
+    assert failed.error
+    assert 0.04 <= failed.elapsed < 1
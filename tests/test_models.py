@@ -0,0 +1,185 @@
+import threading
+from array import array
+from datetime import date
+
+from PySide6.QtCore import Qt
+from sqlalchemy import delete, insert, select, update
+
+from app_base import CancelToken
+from app_models import ChangeFeed, ChangeListener, ColumnStore, SnapshotStore, _typecodes, column_formatter, \
+    merge_change
+from app_schema import NOTIFY_MAX_PKS
+
+
+def test_typecodes_pack_only_not_null_integers(tables):
+    assert _typecodes(tables["employee"].columns) == ["q", None, "q", "q", None, None]
+    assert _typecodes(tables["task"].columns) == ["q", "q", None, None, None, None]
+
+
+def test_column_store_rows_and_columns():
+    store = ColumnStore(["q", None])
+    store.extend_rows([(1, "a"), (2, "b")])
+    store.append_row((3, None))
+    assert len(store) == 3
+    assert isinstance(store.columns[0], array)
+    assert [store.row(i) for i in range(3)] == [(1, "a"), (2, "b"), (3, None)]
+
+    store.set_row(1, (20, "B"))
+    assert store.value(1, 0) == 20 and store.value(1, 1) == "B"
+
+    taken = store.take([2, 0])
+    assert [taken.row(i) for i in range(len(taken))] == [(3, None), (1, "a")]
+    assert isinstance(taken.columns[0], array)
+
+
+def test_column_store_falls_back_to_list_on_null():
+    store = ColumnStore(["q"])
+    store.extend_rows([(1,), (2,)])
+    store.extend_rows([(None,)])
+    assert store.columns[0] == [1, 2, None]
+
+    other = ColumnStore(["q"])
+    other.extend_rows([(5,)])
+    other.set_row(0, ("x",))
+    assert other.columns[0] == ["x"]
+
+
+def test_column_store_extend():
+    first, second = ColumnStore(["q", None]), ColumnStore(["q", None])
+    first.extend_rows([(1, "a")])
+    second.extend_rows([(2, "b"), (3, "c")])
+    first.extend(second)
+    assert len(first) == 3 and first.row(2) == (3, "c")
+
+
+def test_column_formatter(tables):
+    employee, project, task = tables["employee"].c, tables["project"].c, tables["task"].c
+    assert column_formatter(employee.salary)(1234567) == "1 234 567 ₽"
+    assert column_formatter(employee.skills)(["sql", "python"]) == "#sql #python"
+    assert column_formatter(task.deadline)(date(2025, 1, 31)) == "2025-01-31"
+    assert column_formatter(project.finished)(False) == "Нет"
+    assert column_formatter(task.description)(None) == ""
+
+
+def _server_rows(engine, table):
+    with engine.connect() as conn:
+        return [tuple(r) for r in conn.execute(select(table).order_by(*table.primary_key.columns))]
+
+
+def _snapshot_rows(store, name):
+    _, rows = store.load(name)
+    return [rows.row(i) for i in range(len(rows))]
+
+
+def test_snapshot_delta_sync(pg_engine, tables, tmp_path):
+    employee = tables["employee"]
+    with pg_engine.begin() as conn:
+        conn.execute(insert(employee), [{"full_name": f"E{i}", "age": 20 + i, "salary": 100, "duty": "HR",
+                                         "skills": ["sql"] if i % 2 else None} for i in range(10)])
+    store = SnapshotStore(tmp_path / "snapshot.sqlite3", tables, 1 << 30)
+    assert store.load("employee") is None
+
+    first = store.sync(pg_engine, "employee", CancelToken())
+    assert first.reload and first.rows == {} and first.deleted == set()
+    assert _snapshot_rows(store, "employee") == _server_rows(pg_engine, employee)
+
+    with pg_engine.begin() as conn:
+        conn.execute(update(employee).where(employee.c.employee_id == 2).values(salary=500, skills=["Go"]))
+        conn.execute(delete(employee).where(employee.c.employee_id == 5))
+        conn.execute(insert(employee).values(full_name="New", age=40, salary=1, duty="PM"))
+    delta = store.sync(pg_engine, "employee", CancelToken())
+
+    assert not delta.reload
+    assert sorted(delta.rows) == [2, 11] and delta.deleted == {5}
+    assert delta.rows[2][employee.c.keys().index("skills")] == ["go"]
+    assert _snapshot_rows(store, "employee") == _server_rows(pg_engine, employee)
+
+
+def test_snapshot_evicts_least_recently_opened(pg_engine, tables, tmp_path):
+    with pg_engine.begin() as conn:
+        conn.execute(insert(tables["project"]), [{"name": "P" * 200, "prize": 1, "finished": False}] * 200)
+    store = SnapshotStore(tmp_path / "snapshot.sqlite3", tables, 1 << 30)
+    store.sync(pg_engine, "project", CancelToken())
+    store.sync(pg_engine, "employee", CancelToken())
+    store.max_bytes = 1
+
+    assert store.sync(pg_engine, "task", CancelToken()).evicted == ["project", "employee", "task"]
+    assert store.load("project") is None and store.synced_at("employee") is None
+
+
+def test_merge_change_later_action_wins():
+    changes = {}
+    merge_change(changes, {"table": "task", "op": "INSERT", "pks": [1, 2]})
+    merge_change(changes, {"table": "task", "op": "DELETE", "pks": [2, 3]})
+    merge_change(changes, {"table": "task", "op": "UPDATE", "pks": [3]})
+    assert changes == {"task": {"upsert": {1, 3}, "delete": {2}}}
+
+
+def test_merge_change_without_pks_reloads_table():
+    changes = {}
+    merge_change(changes, {"table": "task", "op": "UPDATE", "pks": [1]})
+    merge_change(changes, {"table": "task", "op": "UPDATE", "pks": None})
+    merge_change(changes, {"table": "task", "op": "DELETE", "pks": [2]})
+    merge_change(changes, {"table": "project", "op": "INSERT", "pks": [7]})
+    assert changes == {"task": None, "project": {"upsert": {7}, "delete": set()}}
+
+
+def _poll_all(feed, expected: int):
+    notices = []
+    for _ in range(20):
+        notices += feed.poll(0.1)
+        if len(notices) >= expected:
+            break
+    return notices
+
+
+def test_change_feed_receives_trigger_notices(pg_engine, tables):
+    employee = tables["employee"]
+    feed = ChangeFeed(pg_engine)
+    try:
+        with pg_engine.begin() as conn:
+            conn.execute(insert(employee), [{"full_name": f"E{i}", "age": 30, "salary": 1, "duty": "HR"}
+                                            for i in range(3)])
+            conn.execute(update(employee).where(employee.c.employee_id == 2).values(salary=2))
+        with pg_engine.begin() as conn:
+            conn.execute(delete(employee).where(employee.c.employee_id.in_([1, 3])))
+            conn.execute(update(employee).where(employee.c.employee_id == 99).values(salary=3))  # ни одной строки
+        notices = _poll_all(feed, 3)
+    finally:
+        feed.close()
+    assert [(n["table"], n["op"], sorted(n["pks"])) for n in notices] == [
+        ("employee", "INSERT", [1, 2, 3]), ("employee", "UPDATE", [2]), ("employee", "DELETE", [1, 3])]
+
+
+def test_change_feed_drops_pks_of_large_statements(pg_engine, tables):
+    feed = ChangeFeed(pg_engine)
+    try:
+        with pg_engine.begin() as conn:
+            conn.execute(insert(tables["project"]), [{"name": "P", "prize": 1, "finished": False}]
+                         * (NOTIFY_MAX_PKS + 1))
+        notices = _poll_all(feed, 1)
+    finally:
+        feed.close()
+    assert notices == [{"table": "project", "op": "INSERT", "pks": None}]
+
+
+def test_change_listener_emits_merged_batch(pg_engine, tables):
+    listener = ChangeListener(pg_engine, interval=0.3)
+    batches, received = [], threading.Event()
+    listener.changed.connect(lambda changes: (batches.append(changes), received.set()), Qt.DirectConnection)
+    listener.start()
+    try:
+        for _ in range(20):  # LISTEN выполняется в потоке слушателя — ждём подписки
+            with pg_engine.connect() as conn:
+                if conn.exec_driver_sql("SELECT count(*) FROM pg_stat_activity "
+                                        "WHERE query LIKE 'LISTEN%%'").scalar():
+                    break
+            threading.Event().wait(0.1)
+        with pg_engine.begin() as conn:
+            conn.execute(insert(tables["project"]).values(name="P", prize=1, finished=False))
+        with pg_engine.begin() as conn:
+            conn.execute(delete(tables["project"]))
+        assert received.wait(5)
+    finally:
+        listener.stop()
+    assert batches[0] == {"project": {"upsert": set(), "delete": {1}}}
@@ -0,0 +1,78 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import app_query
+from app_query import Condition, FilterError, cached_filter_select, filter_headers, parse_filter
+
+
+def sql(stmt) -> str:
+    return " ".join(str(stmt.compile(dialect=postgresql.dialect())).split())
+
+
+def test_parse_where_converts_values(tables):
+    q = parse_filter(tables["task"], where="status = Новая; deadline < 2025-01-01; employee_id in 1, 2")
+    assert q.where == (Condition("status", "=", ("Новая",)), Condition("deadline", "<", (date(2025, 1, 1),)),
+                       Condition("employee_id", "in", (1, 2)))
+    assert q.params() == {"w0": "Новая", "w1": date(2025, 1, 1), "w2": [1, 2]}
+
+
+def test_values_may_contain_and(tables):
+    q = parse_filter(tables["task"], where="name ~ Tom and Jerry; description = rock AND roll")
+    assert q.where == (Condition("name", "~", ("%Tom and Jerry%",)),
+                       Condition("description", "=", ("rock AND roll",)))
+
+
+def test_parse_substring_escapes_like(tables):
+    q = parse_filter(tables["task"], where="name ~ 100%_done")
+    assert q.where[0].values == ("%100\\%\\_done%",)
+
+
+def test_parse_group_having_order(tables):
+    q = parse_filter(tables["task"], group_by="status", having="count > 5", order_by="count desc, status")
+    assert q.group == ("status",)
+    assert q.order == (("count()", True), ("status", False))
+    text = sql(cached_filter_select(q))
+    assert "GROUP BY task.status HAVING count(*) > %(h0)s" in text
+    assert filter_headers(q)[0] == ["status", "count"]
+
+
+@pytest.mark.parametrize("fields, message", [
+    ({"where": "nope = 1"}, "нет столбца 'nope'"),
+    ({"where": "employee_id = abc"}, "employee_id:"),
+    ({"where": "deadline ~ 2025"}, "только по текстовым"),
+    ({"where": "status"}, "не понято условие"),
+    ({"where": "count > 1"}, "агрегаты допустимы только в HAVING"),
+    ({"having": "count > 1"}, "HAVING без GROUP BY"),
+    ({"order_by": "name sideways"}, "ORDER BY: не понято"),
+    ({"group_by": "status", "order_by": "name"}, "сортировать можно по группам"),
+    ({"column": "name", "group_by": "status"}, "выберите пустой столбец"),
+])
+def test_parse_errors(tables, fields, message):
+    with pytest.raises(FilterError, match=message):
+        parse_filter(tables["task"], **fields)
+
+
+def test_cache_reuses_statement_for_same_shape(tables, monkeypatch):
+    monkeypatch.setattr(app_query, "_filter_cache", app_query.OrderedDict())
+    first = cached_filter_select(parse_filter(tables["task"], where="status = Новая"))
+    second = cached_filter_select(parse_filter(tables["task"], where="status = Завершена"))
+    other = cached_filter_select(parse_filter(tables["task"], where="status != Новая"))
+    assert first is second
+    assert other is not first
+    in_two = cached_filter_select(parse_filter(tables["task"], where="employee_id in 1, 2"))
+    assert cached_filter_select(parse_filter(tables["task"], where="employee_id in 1, 2, 3")) is in_two
+
+
+def test_cache_evicts_least_recently_used(tables, monkeypatch):
+    monkeypatch.setattr(app_query, "_filter_cache", app_query.OrderedDict())
+    monkeypatch.setattr(app_query, "FILTER_CACHE_SIZE", 2)
+    task = tables["task"]
+    by_status = cached_filter_select(parse_filter(task, where="status = Новая"))
+    by_name = cached_filter_select(parse_filter(task, where="name = a"))
+    assert cached_filter_select(parse_filter(task, where="status = Новая")) is by_status  # теперь самый свежий
+    cached_filter_select(parse_filter(task, where="deadline is null"))
+    assert len(app_query._filter_cache) == 2
+    assert cached_filter_select(parse_filter(task, where="status = Новая")) is by_status
+    assert cached_filter_select(parse_filter(task, where="name = a")) is not by_name
@@ -0,0 +1,36 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql
+
+from app_query import skill_dictionary
+from app_schema import TagArray, normalize_tag, normalize_tags
+
+
+def test_normalize_tag():
+    assert normalize_tag("  Machine \t Learning ") == "machine learning"
+    assert normalize_tag("C++") == "c++"
+
+
+def test_normalize_tags_drops_empty_and_repeats():
+    assert normalize_tags(["Python", " python", "", "  ", "SQL", "PYTHON"]) == ["python", "sql"]
+
+
+def test_tag_array_normalizes_on_bind():
+    bind = TagArray().process_bind_param
+    assert bind([" Go", "go ", "Rust"], postgresql.dialect()) == ["go", "rust"]
+    assert bind(None, postgresql.dialect()) is None
+
+
+def test_skill_dictionary_follows_employee_skills(pg_engine, tables):
+    employee = tables["employee"]
+    people = [{"full_name": name, "age": 30, "salary": 100, "duty": "Backend", "skills": skills}
+              for name, skills in (("A", ["Python", "SQL "]), ("B", ["python", "Go"]), ("C", None))]
+    with pg_engine.begin() as conn:
+        conn.execute(insert(employee), people)
+    with pg_engine.connect() as conn:
+        stored = conn.execute(select(employee.c.skills).order_by(employee.c.full_name)).scalars().all()
+    assert stored == [["python", "sql"], ["python", "go"], None]
+    assert skill_dictionary(pg_engine, tables) == [("python", 2), ("go", 1), ("sql", 1)]
+
+    with pg_engine.begin() as conn:
+        conn.execute(update(employee).where(employee.c.full_name == "B").values(skills=["SQL"]))
+    assert skill_dictionary(pg_engine, tables) == [("sql", 2), ("python", 1)]
@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+import app_service
+from app_query import FilterError
+from app_service import MAX_LINE, DataService, HttpError, Request, Response, ServiceConfig
+from app_transfer import RowRejected
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data: bytes):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+@pytest.fixture
+def service(tables):
+    return DataService(None, tables, ServiceConfig(), pool_limit=4)
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    events = []
+    monkeypatch.setattr(app_service, "log_event", lambda message, *args, **fields: events.append(message))
+    return events
+
+
+def call(service, method, path, query=None, body=b""):
+    """(статус, тело ответа) одного запроса к dispatch."""
+    writer = FakeWriter()
+    request = Request(method, path.strip("/").split("/"), query or {}, {}, body, True)
+    asyncio.run(service.dispatch(request, Response(writer, True)))
+    head, _, payload = bytes(writer.data).partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    if b"Transfer-Encoding: chunked" in head:
+        chunks, rest = [], payload
+        while True:
+            size, _, rest = rest.partition(b"\r\n")
+            if int(size, 16) == 0:
+                break
+            chunks.append(rest[:int(size, 16)])
+            rest = rest[int(size, 16) + 2:]
+        payload = b"".join(chunks)
+    return status, json.loads(payload)
+
+
+@pytest.mark.parametrize("error, status", [
+    (HttpError(404, "нет"), 404),
+    (HttpError(503, "занято"), 503),
+    (FilterError("плохой фильтр"), 400),
+    (RowRejected("age: NOT NULL"), 400),
+    (ValueError("не число"), 400),
+    (IntegrityError("INSERT", {}, Exception("duplicate key")), 409),
+    (OperationalError("SELECT", {}, Exception("server closed")), 500),
+    (KeyError("x"), 500),
+    (TypeError("int() argument"), 500),
+])
+def test_error_status(error, status):
+    assert DataService._error_status(error)[0] == status
+
+
+def test_unknown_route_and_method(service, logged):
+    assert call(service, "GET", "/nothing/here")[0] == 404
+    assert call(service, "DELETE", "/task") == (405, {"error": "метод DELETE не поддерживается"})
+    assert logged == []
+
+
+def test_bad_filter_is_client_error(service):
+    status, body = call(service, "GET", "/task/filter", {"where": "nope = 1"})
+    assert status == 400 and "nope" in body["error"]
+
+
+def test_bad_records_are_client_errors(service):
+    assert call(service, "POST", "/task", body=b"{not json")[0] == 400
+    assert call(service, "POST", "/task", body=b"[1, 2]")[0] == 400
+    status, body = call(service, "POST", "/task",
+                        body=json.dumps([{"employee_id": 1, "name": "x", "status": "Новая",
+                                          "project_id": {"id": 1}}]).encode())
+    assert status == 400 and body["error"].startswith("запись 0:")
+
+
+def test_unexpected_error_answers_500_and_is_logged(service, logged, monkeypatch):
+    async def broken(request, response):
+        raise KeyError("project")
+    monkeypatch.setattr(service, "route", broken)
+
+    assert call(service, "GET", "/task") == (500, {"error": "внутренняя ошибка службы"})
+    assert len(logged) == 1 and "KeyError: 'project'" in logged[0]
+
+
+def test_unexpected_error_after_headers_ends_stream(service, logged, monkeypatch):
+    async def broken(request, response):
+        await response.begin()
+        await response.write('{"rows": [[1]')
+        raise TypeError("boom")
+    monkeypatch.setattr(service, "route", broken)
+
+    assert call(service, "GET", "/task/filter") == (200, {"rows": [[1]], "error": "внутренняя ошибка службы"})
+    assert "TypeError: boom" in logged[0]
+
+
+def test_client_disconnect_is_not_answered(service, logged, monkeypatch):
+    async def gone(request, response):
+        raise ConnectionResetError()
+    monkeypatch.setattr(service, "route", gone)
+
+    with pytest.raises(ConnectionResetError):
+        call(service, "GET", "/task")
+    assert logged == []
+
+
+def serve(service, data: bytes):
+    """(статус, тело) ответа serve_connection на сырые байты запроса."""
+    async def run():
+        reader = asyncio.StreamReader(limit=MAX_LINE)
+        reader.feed_data(data)
+        reader.feed_eof()
+        writer = FakeWriter()
+        await service.serve_connection(reader, writer)
+        return writer
+    head, _, payload = bytes(asyncio.run(run()).data).partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+@pytest.mark.parametrize("data, status", [
+    (b"GET /" + b"a" * MAX_LINE + b" HTTP/1.1\r\n\r\n", 414),
+    (b"GET / HTTP/1.1\r\nX-Long: " + b"a" * MAX_LINE + b"\r\n\r\n", 431),
+    (b"GET / HTTP/1.1\r\nX-Long: " + b"a" * (MAX_LINE * 3), 431),  # без конца строки
+    (b"NONSENSE\r\n\r\n", 400),
+])
+def test_malformed_request_is_answered(service, data, status):
+    assert serve(service, data)[0] == status
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("PySide6")
+
+from benchmark import STARTUP_DEFERRED, STARTUP_PROBE  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+OFFSCREEN = {**os.environ, "QT_QPA_PLATFORM": "offscreen"}
+
+
+@pytest.fixture(scope="module")
+def offscreen():
+    probe = "from PySide6.QtWidgets import QApplication; QApplication([])"
+    if subprocess.run([sys.executable, "-c", probe], env=OFFSCREEN, capture_output=True, timeout=60).returncode:
+        pytest.skip("нет платформы Qt offscreen")
+
+
+def test_data_modules_are_not_loaded_before_first_paint(offscreen):
+    proc = subprocess.run([sys.executable, "-c", STARTUP_PROBE, *STARTUP_DEFERRED], env=OFFSCREEN, cwd=ROOT,
+                          capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    painted, *loaded = proc.stdout.split()
+    assert float(painted) > 0
+    assert loaded == []
@@ -0,0 +1,135 @@
+import json
+from dataclasses import replace
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app_base import WRITE_DRIVERS
+from app_engine import make_engine
+from app_transfer import TASK_PROJECT_KEY, RowRejected, WriteRepository, parse_tags, convert_value, import_file, \
+    validate_record
+
+
+def test_validate_record_converts_types(tables):
+    row = validate_record(tables["task"], {"employee_id": "7", "name": "Отчёт", "deadline": "2025-03-01",
+                                           "status": "Новая", "description": ""})
+    assert row == {"employee_id": 7, "name": "Отчёт", "deadline": date(2025, 3, 1), "status": "Новая",
+                   "description": None}
+
+
+@pytest.mark.parametrize("record, reason", [
+    ({"full_name": "A", "age": "0", "salary": "1", "duty": "HR"}, "CHECK (age > 0)"),
+    ({"full_name": "A", "age": "x", "salary": "1", "duty": "HR"}, "age:"),
+    ({"full_name": "A", "age": "30", "salary": "1", "duty": "Cook"}, "CHECK (duty IN"),
+    ({"age": "30", "salary": "1", "duty": "HR"}, "full_name: NOT NULL"),
+    ({"full_name": "x" * 301, "age": "30", "salary": "1", "duty": "HR"}, "длиннее 300"),
+])
+def test_validate_record_rejects(tables, record, reason):
+    with pytest.raises(RowRejected, match=reason.replace("(", r"\(").replace(")", r"\)")):
+        validate_record(tables["employee"], record)
+
+
+def test_parse_tags_formats():
+    assert parse_tags("#SQL# Python #sql") == ["sql", "python"]
+    assert parse_tags('{SQL,"C++","Machine  Learning"}') == ["sql", "c++", "machine learning"]
+    assert parse_tags("{}") == []
+    assert parse_tags(["Go", " go "]) == ["go"]
+
+
+def test_convert_value_bool(tables):
+    finished = tables["project"].c.finished
+    assert convert_value(finished, "да") is True
+    assert convert_value(finished, "0") is False
+    with pytest.raises(ValueError):
+        convert_value(finished, "может быть")
+
+
+def test_import_rejects_bad_project_id(pg_engine, tables, tmp_path):
+    with pg_engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO employee (full_name, age, salary, duty) VALUES ('A', 30, 100, 'HR')")
+        conn.exec_driver_sql("INSERT INTO project (name, prize, finished) VALUES ('P', 10, false)")
+    good = {"employee_id": 1, "status": "Новая"}
+    records = [
+        {**good, "name": "linked", "project_id": "1"},
+        {**good, "name": "unlinked"},
+        {**good, "name": "letters", "project_id": "abc"},
+        {**good, "name": "list", "project_id": [1]},
+        {**good, "name": "missing project", "project_id": 999},
+        {**good, "name": "missing employee", "employee_id": 999},
+    ]
+    path = tmp_path / "task.jsonl"
+    path.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records), encoding="utf-8")
+
+    result = import_file(pg_engine, tables, "task", str(path), reject_path=str(tmp_path / "rejected.jsonl"))
+
+    assert (result.inserted, result.linked, result.rejected) == (2, 1, 4)
+    rejects = {r["record"]["name"]: r["error"]
+               for r in map(json.loads, (tmp_path / "rejected.jsonl").read_text(encoding="utf-8").splitlines())}
+    assert rejects["letters"].startswith("project_id: invalid literal")
+    assert rejects["list"].startswith("project_id: int() argument")
+    assert rejects["missing project"] == "project_id: нет записи project с id 999"
+    assert rejects["missing employee"] == "employee_id: нет записи employee с id 999"
+    with pg_engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(tables["task"])).scalar() == 2
+        assert conn.execute(select(tables["project_task"].c.project_id)).scalars().all() == [1]
+
+
+@pytest.fixture(params=WRITE_DRIVERS)
+def write_repo(request, pg_engine, pg_config, tables):
+    """WriteRepository на каждом драйвере записи (psycopg — режим конвейера); в базе сотрудник и два проекта."""
+    if request.param == "psycopg":
+        pytest.importorskip("psycopg")
+    with pg_engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO employee (full_name, age, salary, duty) VALUES ('A', 30, 100, 'HR')")
+        conn.exec_driver_sql("INSERT INTO project (name, prize, finished) VALUES ('P1', 10, false), ('P2', 20, false)")
+    engine = make_engine(replace(pg_config, write_driver=request.param))
+    yield WriteRepository(engine, tables, batch_rows=2)
+    engine.dispose()
+
+
+def test_insert_tasks_returns_links_in_record_order(write_repo):
+    projects = [2, None, 1, 2, 1]
+    records = [{"employee_id": 1, "name": f"t{i}", "status": "Новая", TASK_PROJECT_KEY: p}
+               for i, p in enumerate(projects)]
+    tasks, links = write_repo.insert_tasks(records)
+    assert [t.name for t in tasks] == [r["name"] for r in records]
+    expected = [(p, t.task_id) for p, t in zip(projects, tasks) if p is not None]
+    assert [(r.project_id, r.task_id) for r in links] == expected
+
+
+def test_insert_task_with_link_is_one_statement(write_repo, tables):
+    sql = str(write_repo._task_with_link({"employee_id": 1, "name": "t", "status": "Новая"}, 2)
+              .compile(dialect=write_repo.engine.dialect))
+    assert sql.count("INSERT INTO task") == 1 and sql.count("INSERT INTO project_task") == 1
+
+    task_row, link_row = write_repo.insert_task({"employee_id": 1, "name": "t", "status": "Новая"}, 2)
+    assert link_row[1:] == (2, task_row[0])
+    task_row, link_row = write_repo.insert_task({"employee_id": 1, "name": "free", "status": "Новая"})
+    assert link_row is None and task_row.name == "free"
+
+
+def test_insert_task_rolls_back_task_without_link(write_repo, tables):
+    with pytest.raises(IntegrityError):
+        write_repo.insert_task({"employee_id": 1, "name": "t", "status": "Новая"}, 999)
+    with write_repo.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(tables["task"])).scalar() == 0
+
+
+def test_insert_many_returns_rows_in_record_order(write_repo):
+    names = [f"E{i}" for i in (3, 1, 4, 1, 5)]
+    rows = write_repo.insert_many("employee", [{"full_name": n, "age": 30, "salary": 1, "duty": "HR"}
+                                               for n in names])
+    assert [r.full_name for r in rows] == names
+    assert [r.employee_id for r in rows] == sorted(r.employee_id for r in rows)
+    assert write_repo.insert_many("employee", []) == []
+
+
+def test_insert_tasks_is_atomic(write_repo, tables):
+    records = [{"employee_id": 1, "name": "ok", "status": "Новая", TASK_PROJECT_KEY: 1},
+               {"employee_id": 1, "name": "bad link", "status": "Новая", TASK_PROJECT_KEY: 999}]
+    with pytest.raises(IntegrityError):
+        write_repo.insert_tasks(records)
+    with write_repo.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(tables["task"])).scalar() == 0
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects import postgresql
+
+from app_views import JOIN_VIEW_TABLE, PROJECT_TASK_JOIN, JoinError, JoinSpec, build_join_select, join_columns, \
+    join_view_table, refresh_due_join_views
+
+
+def test_join_columns_labels(tables):
+    labels = [label for label, _ in join_columns(tables, PROJECT_TASK_JOIN)]
+    assert labels == ["project_task_id", "project_name", "project_customer", "project_deadline", "project_finished",
+                      "task_name", "task_status", "task_deadline", "employee_full_name"]
+
+
+def test_build_join_select_left_joins_by_foreign_keys(tables):
+    sql = " ".join(str(build_join_select(tables, PROJECT_TASK_JOIN).compile(dialect=postgresql.dialect())).split())
+    assert "FROM project_task LEFT OUTER JOIN project ON project_task.project_id = project.project_id" in sql
+    assert "LEFT OUTER JOIN task ON project_task.task_id = task.task_id" in sql
+    assert "LEFT OUTER JOIN employee ON task.employee_id = employee.employee_id" in sql
+    assert "employee.full_name AS employee_full_name" in sql
+
+
+def test_join_through_intermediate_table(tables):
+    spec = JoinSpec("x", "X", "project_task", ("employee",), ("employee.full_name",))
+    sql = str(build_join_select(tables, spec).compile(dialect=postgresql.dialect()))
+    assert "JOIN task ON" in sql and "JOIN project ON" not in sql
+    view = join_view_table(tables, spec)
+    assert [c.name for c in view.primary_key.columns] == ["project_task_id"]
+
+
+@pytest.mark.parametrize("spec, message", [
+    (JoinSpec("x", "X", "employee", ("task",)), "не связана внешним ключом"),
+    (JoinSpec("x", "X", "task", ("employee",), ("project.name",)), "нет столбца project.name"),
+    (JoinSpec("x", "X", "task", (), ("task.missing",)), "нет столбца task.missing"),
+])
+def test_join_errors(tables, spec, message):
+    with pytest.raises(JoinError, match=message):
+        join_columns(tables, spec)
+
+
+def _make_due(conn, name):
+    conn.execute(text(f"UPDATE {JOIN_VIEW_TABLE} SET refreshed_at = now() - interval '1 day' WHERE name = :name"),
+                 {"name": name})
+
+
+def test_refresh_due_join_views(pg_engine, tables):
+    with pg_engine.begin() as conn:
+        conn.execute(insert(tables["employee"]).values(full_name="A", age=30, salary=1, duty="HR"))
+        conn.execute(insert(tables["task"]).values(employee_id=1, name="t", status="Новая"))
+    assert refresh_due_join_views(pg_engine, tables) == []  # только что созданы — срок не подошёл
+
+    with pg_engine.begin() as conn:
+        _make_due(conn, "task_assignee")
+    assert refresh_due_join_views(pg_engine, tables) == ["task_assignee"]
+    assert refresh_due_join_views(pg_engine, tables) == []
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT task_id, employee_full_name FROM jv_task_assignee")).all() == [(1, "A")]
+        assert conn.execute(text("SELECT count(*) FROM jv_project_task")).scalar() == 0
+
+
+def test_refresh_due_join_views_claims_each_view_once(pg_engine, tables):
+    with pg_engine.begin() as conn:
+        for spec_name in ("task_assignee", "project_task"):
+            _make_due(conn, spec_name)
+    results, barrier = [], threading.Barrier(2)
+
+    def run():
+        barrier.wait()
+        results.append(refresh_due_join_views(pg_engine, tables))
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert sorted(name for names in results for name in names) == ["project_task", "task_assignee"]
+    registry = tables["task"].metadata.tables[JOIN_VIEW_TABLE]
+    with pg_engine.connect() as conn:
+        assert conn.execute(select(registry.c.name).where(
+            registry.c.refreshed_at < text("now() - interval '1 hour'"))).all() == []